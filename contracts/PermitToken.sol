@@ -0,0 +1,23 @@
+// SPDX-License-Identifier: MIT
+
+pragma solidity ^0.8.17;
+
+import "@openzeppelin/contracts/token/ERC20/extensions/draft-ERC20Permit.sol";
+
+/**
+    @title EIP-2612 capable test token
+    @notice Used by the tests to stake through permits instead of approve
+ */
+contract PermitToken is ERC20Permit {
+
+    constructor(
+        string memory _name,
+        string memory _symbol,
+        uint256 _totalSupply
+    )
+        ERC20(_name, _symbol)
+        ERC20Permit(_name)
+    {
+        _mint(msg.sender, _totalSupply);
+    }
+}
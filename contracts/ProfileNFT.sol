@@ -0,0 +1,18 @@
+// SPDX-License-Identifier: MIT
+
+pragma solidity ^0.8.17;
+
+import "@openzeppelin/contracts/token/ERC721/ERC721.sol";
+
+/**
+    @title Lens Hub stand-in
+    @notice Used by the tests as the profile NFT for ownership checks
+ */
+contract ProfileNFT is ERC721 {
+
+    constructor() ERC721("Lens Profile", "LPN") {}
+
+    function mint(address to, uint256 profileId) external {
+        _mint(to, profileId);
+    }
+}
@@ -4,6 +4,8 @@ pragma solidity 0.8.17;
 
 import "@openzeppelin/contracts/token/ERC20/utils/SafeERC20.sol";
 import "@openzeppelin/contracts/token/ERC20/IERC20.sol";
+import "@openzeppelin/contracts/token/ERC20/extensions/draft-IERC20Permit.sol";
+import "@openzeppelin/contracts/utils/cryptography/ECDSA.sol";
 import "@openzeppelin/contracts/token/ERC721/IERC721.sol";
 import "@openzeppelin/contracts-upgradeable/proxy/utils/Initializable.sol";
 
@@ -20,6 +22,7 @@ contract Stake2Follow is Initializable {
     address public walletAddress;
     address public appAddress;
     bool private stopped;
+    // address(0) for a pool in the native currency, staked with msg.value
     IERC20 public currency;
 
     // contract deployed time
@@ -48,9 +51,10 @@ contract Stake2Follow is Initializable {
     // when round duration changed, this factor will used to keep roundId persistent
     uint256 public roundCompensate;
 
-    // roundId => qualify info
+    // roundId => qualify info, keyed by round key, see roundKeyOf
     // qualify-bits   exclude-bits   claimed bits
     //  [0 --- 49]    [50------99]  [100------149]
+    // flags: 150 materialized, 151 fee withdrawn, 152 archived
     mapping(uint256 => uint256) roundToQualify;
 
     /// roundId => profiles
@@ -65,13 +69,106 @@ contract Stake2Follow is Initializable {
     // share reward weight = profilesInvited
     mapping(uint256 => mapping(uint256 => uint256)) inviteBonus;
 
+    // prefunded participation in consecutive rounds
+    struct Subscription {
+        address profileAddress;
+        // rounds left to join
+        uint64 rounds;
+        // credit claimed rewards to the balance instead of paying out
+        bool rollover;
+        uint256 refId;
+        // prefunded stakes and fees not spent yet
+        uint256 balance;
+    }
+
+    // profileId => subscription
+    mapping(uint256 => Subscription) subscriptions;
+
+    // active subscribed profiles, in subscription order
+    uint256[] subscribers;
+
+    // signer => next intent nonce
+    mapping(address => uint256) nonces;
+
+    // fee sweep cursor, platform fees of rounds below it are withdrawn
+    uint256 nextFeeRound;
+
+    // roundId => hash of the reclaimed round data, see archiveRound
+    mapping(uint256 => bytes32) roundSummaries;
+
+    // roundId => last opened shard, see stake
+    mapping(uint256 => uint256) roundShards;
+
+    // shards a round can spill over into when full, 0 or 1 means no spillover
+    uint256 public maxShards;
+
+    // round key => app commitment to the qualify and exclude bits, see commitQualify
+    mapping(uint256 => bytes32) qualifyCommits;
+
+    // time after settle the app has to reveal a commitment
+    uint256 public ROUND_REVEAL_LENGTH;
+
+    // Lens Hub, binding a profile to an address checks ownerOf when set
+    IERC721 public lensHub;
+
+    // stop writing profileToRounds, the history is then derived from ProfileStake events
+    bool public profileHistoryDisabled;
+
+    // profileId => last joined round + 1
+    mapping(uint256 => uint256) profileLastRound;
+
+    // round key => winners summary written by the app, see updateSettlement
+    // profileNum [0 --- 63]  qualifyNum [64 --- 127]  shares [128 --- 255]
+    mapping(uint256 => uint256) roundSettlements;
+
+    // round boundaries in one word, written when the durations change, see packRoundTiming
+    // origin (int64) [0 --- 63]  gap [64 --- 95]  open [96 --- 127]  freeze [128 --- 159]
+    uint256 roundTiming;
+
+    // EIP-712 signed intents, submitted in bulk by a relayer
+    bytes32 private constant DOMAIN_TYPEHASH = keccak256("EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)");
+    bytes32 private constant STAKE_TYPEHASH = keccak256("Stake(uint256 roundId,uint256 profileId,address profileAddress,uint256 refId,uint256 nonce,uint256 deadline)");
+    // subscribers only join shard 0, the ones past maxProfiles wait for a later round
+    uint256 public constant MAXIMAL_SUBSCRIBERS = 100;
+
+    bytes32 private constant CLAIM_TYPEHASH = keccak256("Claim(uint256 roundId,uint256 profileIndex,uint256 profileId,uint256 nonce,uint256 deadline)");
+
+    // EIP-2612 approval of the currency, skipped when deadline is zero
+    struct Permit {
+        uint256 value;
+        uint256 deadline;
+        uint8 v;
+        bytes32 r;
+        bytes32 s;
+    }
+
+    struct StakeIntent {
+        uint256 roundId;
+        uint256 profileId;
+        address profileAddress;
+        uint256 refId;
+        uint256 deadline;
+        Permit permit;
+        bytes signature;
+    }
+
+    struct ClaimIntent {
+        uint256 roundId;
+        uint256 profileIndex;
+        uint256 profileId;
+        uint256 deadline;
+        bytes signature;
+    }
+
     // Events
-    event ProfileStake(uint256 roundId, address profileAddress, uint256 stake, uint256 fees, uint256 refId);
-    event ProfileQualify(uint256 roundId, uint256 qualify);
-    event ProfileExclude(uint256 roundId, uint256 exclude);
-    event ProfileClaim(uint256 roundId, uint256 profileId, uint256 fund);
-    event AppSet(address app, address sender);
-    event WalletSet(address wallet, address sender);
+    // topic layout is shared by the profile events so one eth_getLogs can
+    // filter by round (topic 1), profile (topic 2) or address (topic 3)
+    event ProfileStake(uint256 indexed roundId, uint256 indexed profileId, address indexed profileAddress, uint256 stake, uint256 fees, uint256 refId);
+    event ProfileQualify(uint256 indexed roundId, uint256 qualify);
+    event ProfileExclude(uint256 indexed roundId, uint256 exclude);
+    event ProfileClaim(uint256 indexed roundId, uint256 indexed profileId, address indexed profileAddress, uint256 fund);
+    event AppSet(address indexed app, address indexed sender);
+    event WalletSet(address indexed wallet, address indexed sender);
     event CircuitBreak(bool stop);
     event SetGasFee(uint256 fee);
     event SetRewardFee(uint256 fee);
@@ -79,8 +176,25 @@ contract Stake2Follow is Initializable {
     event SetStakeValue(uint256 value);
     event SetFirstNFree(uint256 n);
     event SetInviteFee(uint256 n);
+    event Subscribe(uint256 indexed roundId, uint256 indexed profileId, address indexed profileAddress, uint256 rounds, uint256 amount, bool rollover);
+    event Unsubscribe(uint256 indexed roundId, uint256 indexed profileId, address indexed profileAddress, uint256 refund);
+    event SubscriptionsMaterialize(uint256 indexed roundId, uint256 profiles);
+    event RelaySkip(uint256 indexed roundId, uint256 indexed profileId, uint256 index, string reason);
+    event SubscriptionRefund(uint256 indexed roundId, uint256 indexed profileId, address indexed profileAddress, uint256 refund);
     event ResetRoundDuration(uint256 openLength, uint256 freezeLength, uint256 gapLength, uint256 roundCompensate);
-    event WithdrawRoundFee(uint256 roundId, uint256 fee);
+    event WithdrawRoundFee(uint256 indexed roundId, uint256 fee);
+    event WithdrawFees(uint256 fromRound, uint256 toRound, uint256 fee);
+    event SetNextFeeRound(uint256 roundId);
+    event QualifyCommit(uint256 indexed roundId, bytes32 commitment);
+    event QualifyReveal(uint256 indexed roundId, uint256 qualify, uint256 exclude);
+    event SetRevealLength(uint256 revealLength);
+    event ProfileRegister(uint256 indexed profileId, address indexed profileAddress);
+    event SetLensHub(address lensHub);
+    event SetProfileHistory(bool enabled);
+    event RoundSettlement(uint256 indexed roundId, uint256 qualifyNum, uint256 shares);
+    event RoundShardOpen(uint256 indexed roundId, uint256 shard);
+    event SetMaxShards(uint256 shards);
+    event RoundArchived(uint256 indexed roundId, bytes32 summary, uint256 qualify, uint256[] profiles, uint256[] invites);
     event Withdraw(uint256 balance);
 
     function initialize(
@@ -105,15 +219,18 @@ contract Stake2Follow is Initializable {
         firstNFree = 3;
         inviteFee = 200;
         MAXIMAL_PROFILES = 50;
+        maxShards = 1;
         ROUND_OPEN_LENGTH = 3 hours;
         ROUND_FREEZE_LENGTH = 50 minutes;
         ROUND_GAP_LENGTH = 4 hours;
+        ROUND_REVEAL_LENGTH = 2 hours;
 
         roundCompensate = 0;
 
         stopped = false;
         owner = msg.sender;
         genesis = block.timestamp;
+        roundTiming = packRoundTiming();
     }
 
     modifier onlyOwner() {
@@ -170,13 +287,181 @@ contract Stake2Follow is Initializable {
         roundToQualify[roundId] |= (1 << profileIndex);
     }
 
-    // global round to local round
-    function compensateRound(uint256 roundId) internal view returns (uint256) {
-        if (((roundCompensate >> 255) & 1) == 1) {
-            return (roundId - (((1 << 255) - 1) & roundCompensate));
+    // bit 150: subscribers joined the round
+    function isMaterialized(uint256 roundId) internal view returns (bool) {
+        return (((roundToQualify[roundId] >> 150) & 1) == 1);
+    }
+
+    function setMaterialized(uint256 roundId) internal {
+        roundToQualify[roundId] |= (1 << 150);
+    }
+
+    // bit 151: platform fee withdrawn by withdrawRoundFee
+    function isFeeWithdrawn(uint256 roundId) internal view returns (bool) {
+        return baseRound(roundId) < nextFeeRound || (((roundToQualify[roundId] >> 151) & 1) == 1);
+    }
+
+    function setFeeWithdrawn(uint256 roundId) internal {
+        roundToQualify[roundId] |= (1 << 151);
+    }
+
+    // bit 152: per-round storage reclaimed by archiveRound
+    function isArchived(uint256 roundId) internal view returns (bool) {
+        return (((roundToQualify[roundId] >> 152) & 1) == 1);
+    }
+
+    function setArchived(uint256 roundId) internal {
+        roundToQualify[roundId] |= (1 << 152);
+    }
+
+    // shard s of round r is stored under the round key r | s << 128,
+    // shard 0 is the round itself so unsharded rounds keep their storage
+    function roundKeyOf(uint256 roundId, uint256 shard) internal pure returns (uint256) {
+        return roundId | (shard << 128);
+    }
+
+    function baseRound(uint256 roundKey) internal pure returns (uint256) {
+        return roundKey & ((1 << 128) - 1);
+    }
+
+    function shardOf(uint256 roundKey) internal pure returns (uint256) {
+        return roundKey >> 128;
+    }
+
+    // profiles join rounds in time order, so the last joined round tells it, in any shard
+    function isParticipant(uint256 roundId, uint256 profileId) internal view returns (bool) {
+        if (profileLastRound[profileId] != 0) {
+            return profileLastRound[profileId] == baseRound(roundId) + 1;
+        }
+        // joined before profileLastRound was tracked
+        uint256 rounds = profileToRounds[profileId].length;
+        return rounds > 0 && baseRound(profileToRounds[profileId][rounds - 1]) == baseRound(roundId);
+    }
+
+    // bind address to profile, only written when it changes
+    function bindProfile(uint256 profileId, address profileAddress) internal {
+        address bound = profileToAddress[profileId];
+        if (bound == profileAddress) {
+            return;
+        }
+        if (address(lensHub) != address(0)) {
+            require(lensHub.ownerOf(profileId) == profileAddress, "Not the Lens profile owner");
+        } else {
+            // nothing proves a new owner, the first binding stays
+            require(bound == address(0), "Profile already registered");
+        }
+        profileToAddress[profileId] = profileAddress;
+        emit ProfileRegister(profileId, profileAddress);
+    }
+
+    // stake fee of the profile joining at position `profileIndex`
+    function stakeFeeAt(uint256 profileIndex) internal view returns (uint256) {
+        if (profileIndex < firstNFree) {
+            return 0;
+        }
+        return (stakeValue / 1000) * gasFee;
+    }
+
+    function addProfile(uint256 roundId, uint256 profileId, uint256 refId) internal {
+        // add profile
+        roundToProfiles[roundId].push(profileId);
+
+        // add round
+        profileLastRound[profileId] = baseRound(roundId) + 1;
+        if (!profileHistoryDisabled) {
+            profileToRounds[profileId].push(roundId);
+        }
+
+        // set invite bonus, refId 0 is no referrer
+        if (refId != 0) {
+            inviteBonus[roundId][refId] += 1;
+        }
+    }
+
+    /**
+     * @dev subscribers that join the round when it is first touched, in order,
+     *      while the round has room and the subscription can pay stake and fee
+     */
+    function pendingSubscribers(uint256 roundId) internal view returns (uint256[] memory profiles, uint256 count) {
+        profiles = new uint256[](subscribers.length);
+        // subscribers only join shard 0 of a started round, so they join rounds in time order
+        if (subscribers.length == 0 || shardOf(roundId) > 0 || isMaterialized(roundId) || !isStarted(roundId) || isSettle(roundId)) {
+            return (profiles, 0);
+        }
+
+        uint256 profileNum = roundToProfiles[roundId].length;
+        for (uint256 i = 0; i < subscribers.length && profileNum + count < maxProfiles; i++) {
+            uint256 profileId = subscribers[i];
+            if (subscriptions[profileId].balance >= stakeValue + stakeFeeAt(profileNum + count) && !isParticipant(roundId, profileId)) {
+                profiles[count] = profileId;
+                count += 1;
+            }
+        }
+    }
+
+    /**
+     * @dev join the subscribers to the round, called by the first stake,
+     *      qualify or exclude that touches the round
+     */
+    function materializeSubscriptions(uint256 roundId) internal {
+        if (subscribers.length == 0 || shardOf(roundId) > 0 || isMaterialized(roundId) || !isStarted(roundId)) {
+            return;
+        }
+        (uint256[] memory profiles, uint256 count) = pendingSubscribers(roundId);
+        setMaterialized(roundId);
+
+        uint256 fees = 0;
+        for (uint256 i = 0; i < count; i++) {
+            Subscription storage sub = subscriptions[profiles[i]];
+            uint256 stakeFee = stakeFeeAt(roundToProfiles[roundId].length);
+
+            sub.balance -= stakeValue + stakeFee;
+            sub.rounds -= 1;
+            fees += stakeFee;
+
+            emit ProfileStake(roundId, profiles[i], sub.profileAddress, stakeValue, stakeFee, sub.refId);
+            addProfile(roundId, profiles[i], sub.refId);
+        }
+
+        // drop finished subscriptions, keeping the order
+        uint256 kept = 0;
+        for (uint256 i = 0; i < subscribers.length; i++) {
+            if (subscriptions[subscribers[i]].rounds > 0) {
+                subscribers[kept] = subscribers[i];
+                kept += 1;
+            }
+        }
+        while (subscribers.length > kept) {
+            subscribers.pop();
+        }
+
+        if (fees > 0) {
+            payCurrency(walletAddress, fees);
+        }
+        emit SubscriptionsMaterialize(roundId, count);
+
+        // the last round refunds what the free slots left in the balance
+        for (uint256 i = 0; i < count; i++) {
+            if (subscriptions[profiles[i]].rounds == 0 && subscriptions[profiles[i]].balance > 0) {
+                refundSubscription(roundId, profiles[i]);
+            }
+        }
+    }
+
+    function refundSubscription(uint256 roundId, uint256 profileId) internal {
+        Subscription storage sub = subscriptions[profileId];
+        uint256 refund = sub.balance;
+        sub.balance = 0;
+        if (isNative()) {
+            // paid inside someone else's call, a failed refund stays for unsubscribe
+            if (!payable(sub.profileAddress).send(refund)) {
+                sub.balance = refund;
+                return;
+            }
         } else {
-            return (roundId + roundCompensate);
+            currency.safeTransfer(sub.profileAddress, refund);
         }
+        emit SubscriptionRefund(roundId, profileId, sub.profileAddress, refund);
     }
 
     // local round to global round
@@ -188,34 +473,147 @@ contract Stake2Follow is Initializable {
         }
     }
 
+    /**
+     * @dev round r starts at origin + r * gap, origin folds genesis and roundCompensate
+     *      together so a phase check is one load and no compensation arithmetic
+     */
+    function packRoundTiming() internal view returns (uint256) {
+        int256 origin = int256(genesis);
+        uint256 compensate = ((1 << 255) - 1) & roundCompensate;
+        if (((roundCompensate >> 255) & 1) == 1) {
+            origin -= int256(compensate * ROUND_GAP_LENGTH);
+        } else {
+            origin += int256(compensate * ROUND_GAP_LENGTH);
+        }
+        return uint256(uint64(int64(origin))) | (ROUND_GAP_LENGTH << 64) | (ROUND_OPEN_LENGTH << 96) | (ROUND_FREEZE_LENGTH << 128);
+    }
+
+    function loadRoundTiming() internal view returns (uint256 timing) {
+        timing = roundTiming;
+        if (timing == 0) {
+            // upgraded proxy not synced yet, see syncRoundTiming
+            timing = packRoundTiming();
+        }
+    }
+
+    function timingOrigin(uint256 timing) internal pure returns (int256) {
+        return int256(int64(uint64(timing)));
+    }
+
+    function timingField(uint256 timing, uint256 offset) internal pure returns (uint256) {
+        return (timing >> offset) & ((1 << 32) - 1);
+    }
+
+    function roundStart(uint256 timing, uint256 roundId) internal pure returns (uint256) {
+        return uint256(timingOrigin(timing) + int256(baseRound(roundId) * timingField(timing, 64)));
+    }
+
+    function isStarted(uint256 roundId) internal view returns (bool) {
+        return block.timestamp > roundStart(loadRoundTiming(), roundId);
+    }
+
     function isOpen(uint256 roundId) internal view returns (bool) {
-        uint256 startTime = genesis + compensateRound(roundId) * ROUND_GAP_LENGTH;
-        return (block.timestamp > startTime && block.timestamp < (startTime + ROUND_OPEN_LENGTH));
+        uint256 timing = loadRoundTiming();
+        uint256 startTime = roundStart(timing, roundId);
+        return (block.timestamp > startTime && block.timestamp < (startTime + timingField(timing, 96)));
+    }
+
+    function settleTime(uint256 roundId) internal view returns (uint256) {
+        uint256 timing = loadRoundTiming();
+        return roundStart(timing, roundId) + timingField(timing, 96) + timingField(timing, 128);
     }
 
     function isSettle(uint256 roundId) internal view returns (bool) {
-        return (block.timestamp > (genesis + compensateRound(roundId) * ROUND_GAP_LENGTH + ROUND_OPEN_LENGTH + ROUND_FREEZE_LENGTH));
+        return (block.timestamp > settleTime(roundId));
+    }
+
+    // a committed qualify that can still be revealed, the round outcome is not final yet
+    function isRevealPending(uint256 roundId) internal view returns (bool) {
+        return qualifyCommits[roundId] != 0 && block.timestamp <= settleTime(roundId) + ROUND_REVEAL_LENGTH;
+    }
+
+    // winners and their invite shares, the loop the claims would otherwise run
+    function countWinners(uint256 roundId) internal view returns (uint256 qualifyNum, uint256 shares) {
+        uint256 profileNum = roundToProfiles[roundId].length;
+        for (uint256 i = 0; i < profileNum; i++) {
+            if (isClaimable(roundId, i) && !isExcluded(roundId, i)) {
+                qualifyNum += 1;
+                shares += inviteBonus[roundId][roundToProfiles[roundId][i]];
+            }
+        }
+    }
+
+    /**
+     * @dev store the winners summary, called whenever the app sets qualify or exclude bits
+     *      so the claims and the fee withdrawal of the round cost the same for any round size
+     */
+    function updateSettlement(uint256 roundId) internal {
+        (uint256 qualifyNum, uint256 shares) = countWinners(roundId);
+        roundSettlements[roundId] = roundToProfiles[roundId].length | (qualifyNum << 64) | (shares << 128);
+        emit RoundSettlement(roundId, qualifyNum, shares);
+    }
+
+    // stored summary while it covers every profile, else counted as before
+    function settlement(uint256 roundId) internal view returns (uint256 qualifyNum, uint256 shares) {
+        uint256 summary = roundSettlements[roundId];
+        if (summary != 0 && (summary & ((1 << 64) - 1)) == roundToProfiles[roundId].length) {
+            return ((summary >> 64) & ((1 << 64) - 1), summary >> 128);
+        }
+        return countWinners(roundId);
+    }
+
+    // native MATIC pool when currency is address(0), the ERC20 otherwise
+    function isNative() internal view returns (bool) {
+        return address(currency) == address(0);
     }
 
     function payCurrency(address to, uint256 amount) internal {
         require(amount > 0, "Invalid amount");
-        currency.safeTransfer(to, amount);
+        if (isNative()) {
+            (bool sent, ) = payable(to).call{value: amount}("");
+            require(sent, "Native transfer failed");
+        } else {
+            currency.safeTransfer(to, amount);
+        }
+    }
+
+    function pullCurrency(address from, uint256 amount) internal {
+        if (isNative()) {
+            // paid with the call itself, so relayed stakes can not use the native pool
+            require(from == msg.sender && msg.value == amount, "Invalid stake value");
+        } else {
+            require(msg.value == 0, "Invalid stake value");
+            currency.safeTransferFrom(from, address(this), amount);
+        }
+    }
+
+    function currencyBalance() internal view returns (uint256) {
+        if (isNative()) {
+            return address(this).balance;
+        }
+        return currency.balanceOf(address(this));
     }
 
     /**
      * @dev profile claim and transfer fund back
-     * @param roundId round id
+     * @param roundId round key of the profile's shard, get by getProfileRounds
      * @param profileIndex The index in the profiles array, get by getRoundData
      * @param profileId profile id
      */
     function profileClaim(uint256 roundId, uint256 profileIndex, uint256 profileId) external stopInEmergency {
+        claim(roundId, profileIndex, profileId, msg.sender);
+    }
+
+    function claim(uint256 roundId, uint256 profileIndex, uint256 profileId, address sender) internal {
         // ensure round is settle
         require(isSettle(roundId), "Round is not settle");
+        // wait for the committed qualify
+        require(!isRevealPending(roundId), "Qualify not revealed");
         // out-of-bound check
         require(profileIndex < roundToProfiles[roundId].length, "index out of bound");
         require(profileId == roundToProfiles[roundId][profileIndex], "Profile invalid");
         // check address legal
-        require(msg.sender == profileToAddress[profileId], "Address not match profile");
+        require(sender == profileToAddress[profileId], "Address not match profile");
         // Check the profile has qualify to claim
         require(isClaimable(roundId, profileIndex), "Profile not qualify to claimed");
         // Check the profile is not exclude
@@ -226,14 +624,7 @@ contract Stake2Follow is Initializable {
         // calculate reward && pay
 
         uint256 profileNum = roundToProfiles[roundId].length;
-        uint256 qualifyNum = 0;
-        uint256 shares = 0;
-        for (uint256 i = 0; i < profileNum; i++) {
-            if (isClaimable(roundId, i) && !isExcluded(roundId, i)) {
-                qualifyNum += 1;
-                shares += inviteBonus[roundId][roundToProfiles[roundId][i]];
-            }
-        }
+        (uint256 qualifyNum, uint256 shares) = settlement(roundId);
 
         // adition fee to divide
         uint256 reward = stakeValue * (profileNum - qualifyNum);
@@ -251,120 +642,430 @@ contract Stake2Follow is Initializable {
             claimValue = claimValue + inviteReward * inviteBonus[roundId][profileId] / shares;
         }
 
-        // Transfer the fund to profile
-        payCurrency(profileToAddress[profileId], claimValue);
-        
-        // Set the flag indicating that the profile has already claimed
+        // Set the flag indicating that the profile has already claimed,
+        // before a native payout can call back into the contract
         setClaimed(roundId, profileIndex);
 
-        emit ProfileClaim(roundId, profileId, claimValue);
+        Subscription storage sub = subscriptions[profileId];
+        if (sub.rollover && sub.rounds > 0 && sub.profileAddress == profileToAddress[profileId]) {
+            // roll the winnings forward into the subscription
+            sub.balance += claimValue;
+        } else {
+            // Transfer the fund to profile
+            payCurrency(profileToAddress[profileId], claimValue);
+        }
+
+        emit ProfileClaim(roundId, profileId, profileToAddress[profileId], claimValue);
     }
 
     /**
-     * @dev Each participant stake the fund to the round.
+     * @dev Each participant stake the fund to the round. When the round is full
+     *      the stake goes to a new shard of it, up to maxShards.
      * @param roundId the round id.
      * @param profileId The ID of len profile.
      * @param profileAddress The address of the profile that staking.
      * @param refId The id that invite this profile
      */
-    function profileStake(uint256 roundId, uint256 profileId, address profileAddress, uint256 refId) external stopInEmergency {
+    function profileStake(uint256 roundId, uint256 profileId, address profileAddress, uint256 refId) external payable stopInEmergency {
+        stake(roundId, profileId, profileAddress, refId, msg.sender);
+    }
+
+    /**
+     * @dev stake with an EIP-2612 permit instead of a prior approve
+     */
+    function profileStakeWithPermit(uint256 roundId, uint256 profileId, address profileAddress, uint256 refId, Permit calldata permit) external stopInEmergency {
+        usePermit(profileAddress, permit);
+        stake(roundId, profileId, profileAddress, refId, msg.sender);
+    }
+
+    /**
+     * @dev stake for many profiles from their signed intents, the relayer pays the gas
+     */
+    function relayStakes(StakeIntent[] calldata intents) external stopInEmergency {
+        for (uint256 i = 0; i < intents.length; i++) {
+            // an invalid intent is skipped, the rest of the batch still goes through
+            try this.relayStake(intents[i]) {
+            } catch Error(string memory reason) {
+                emit RelaySkip(intents[i].roundId, intents[i].profileId, i, reason);
+            } catch {
+                emit RelaySkip(intents[i].roundId, intents[i].profileId, i, "");
+            }
+        }
+    }
+
+    /**
+     * @dev one intent of relayStakes, called by the contract itself so a revert
+     *      only undoes this intent and leaves its signer nonce unused
+     */
+    function relayStake(StakeIntent calldata intent) external {
+        require(msg.sender == address(this), "Only relay batch");
+        bytes32 structHash = keccak256(abi.encode(
+            STAKE_TYPEHASH,
+            intent.roundId,
+            intent.profileId,
+            intent.profileAddress,
+            intent.refId,
+            nonces[intent.profileAddress],
+            intent.deadline
+        ));
+        address signer = useSignature(structHash, intent.deadline, intent.signature);
+        usePermit(signer, intent.permit);
+        stake(intent.roundId, intent.profileId, intent.profileAddress, intent.refId, signer);
+    }
+
+    /**
+     * @dev claim for many profiles from their signed intents, the relayer pays the gas
+     */
+    function relayClaims(ClaimIntent[] calldata intents) external stopInEmergency {
+        for (uint256 i = 0; i < intents.length; i++) {
+            // an invalid intent is skipped, the rest of the batch still goes through
+            try this.relayClaim(intents[i]) {
+            } catch Error(string memory reason) {
+                emit RelaySkip(intents[i].roundId, intents[i].profileId, i, reason);
+            } catch {
+                emit RelaySkip(intents[i].roundId, intents[i].profileId, i, "");
+            }
+        }
+    }
+
+    /**
+     * @dev one intent of relayClaims, see relayStake
+     */
+    function relayClaim(ClaimIntent calldata intent) external {
+        require(msg.sender == address(this), "Only relay batch");
+        address profileAddress = profileToAddress[intent.profileId];
+        bytes32 structHash = keccak256(abi.encode(
+            CLAIM_TYPEHASH,
+            intent.roundId,
+            intent.profileIndex,
+            intent.profileId,
+            nonces[profileAddress],
+            intent.deadline
+        ));
+        address signer = useSignature(structHash, intent.deadline, intent.signature);
+        claim(intent.roundId, intent.profileIndex, intent.profileId, signer);
+    }
+
+    function domainSeparator() internal view returns (bytes32) {
+        // computed per call, an upgradeable contract can not cache it in the constructor
+        return keccak256(abi.encode(DOMAIN_TYPEHASH, keccak256("Stake2Follow"), keccak256("1"), block.chainid, address(this)));
+    }
+
+    // recover the signer and consume its nonce
+    function useSignature(bytes32 structHash, uint256 deadline, bytes calldata signature) internal returns (address) {
+        require(block.timestamp <= deadline, "Signature expired");
+        address signer = ECDSA.recover(keccak256(abi.encodePacked("\x19\x01", domainSeparator(), structHash)), signature);
+        nonces[signer] += 1;
+        return signer;
+    }
+
+    function usePermit(address profileAddress, Permit calldata permit) internal {
+        if (permit.deadline == 0 || isNative()) {
+            return;
+        }
+        // a front-run permit has already set the allowance, let transferFrom decide
+        try IERC20Permit(address(currency)).permit(profileAddress, address(this), permit.value, permit.deadline, permit.v, permit.r, permit.s) {
+        } catch {
+        }
+    }
+
+    function stake(uint256 roundId, uint256 profileId, address profileAddress, uint256 refId, address sender) internal {
         // Check if the msg.sender is the profile owner
-        require(msg.sender == profileAddress, "Sender is not the profile owner");
+        require(sender == profileAddress, "Sender is not the profile owner");
         // Check if the profile address is valid
         require(profileAddress != address(0), "Invalid profile address");
+        // stake picks the shard
+        require(shardOf(roundId) == 0, "Invalid round");
         // Check round is in open stage
         require(isOpen(roundId), "Round is not in open stage");
+        // subscribers come first
+        materializeSubscriptions(roundId);
+        // check not staked before, in any shard
+        require(!isParticipant(roundId, profileId), "profile already paticipant");
+
+        // spill over into a new shard when the current one is full
+        uint256 shard = roundShards[roundId];
+        if (roundToProfiles[roundKeyOf(roundId, shard)].length >= maxProfiles && shard + 1 < maxShards) {
+            shard += 1;
+            roundShards[roundId] = shard;
+            emit RoundShardOpen(roundId, shard);
+        }
+        roundId = roundKeyOf(roundId, shard);
         // Check profile count
         require(roundToProfiles[roundId].length < maxProfiles, "Maximum profile limit reached");
-        // check not staked before
-        // total profiles is small, so this loop is ok
-        bool alreadyIn = false;
-        for (uint32 i = 0; i < roundToProfiles[roundId].length; i += 1) {
-            if (roundToProfiles[roundId][i] ==  profileId) {
-                alreadyIn = true;
-                break;
-            }
+
+        bindProfile(profileId, profileAddress);
+
+        // free of fee for the first firstNFree profiles
+        uint256 stakeFee = stakeFeeAt(roundToProfiles[roundId].length);
+
+        // Transfer funds to stake contract
+        pullCurrency(profileAddress, stakeValue + stakeFee);
+        emit ProfileStake(roundId, profileId, profileAddress, stakeValue, stakeFee, refId);
+
+        addProfile(roundId, profileId, refId);
+
+        // transfer fees once the profile is in, a native payout can call back
+        if (stakeFee > 0) {
+            payCurrency(walletAddress, stakeFee);
         }
-        require(!alreadyIn, "profile already paticipant");
+    }
 
-        // bind address to profile
-        profileToAddress[profileId] = profileAddress;
+    /**
+     * @dev Bind the profile to the sender once, later stakes from the same
+     *      address skip the write. With lensHub set the sender must own the profile.
+     */
+    function registerProfile(uint256 profileId, address profileAddress) external stopInEmergency {
+        require(msg.sender == profileAddress, "Sender is not the profile owner");
+        require(profileAddress != address(0), "Invalid profile address");
+        bindProfile(profileId, profileAddress);
+    }
+
+    /**
+     * @dev Prefund the stakes of the next `rounds` rounds. The profile joins each round
+     *      when the round is first touched, no transaction per round is needed.
+     * @param profileId The ID of len profile.
+     * @param profileAddress The address of the profile that staking.
+     * @param rounds number of rounds to join
+     * @param refId The id that invite this profile
+     * @param rollover credit claimed rewards to the subscription instead of paying out
+     */
+    function subscribe(uint256 profileId, address profileAddress, uint256 rounds, uint256 refId, bool rollover) external payable stopInEmergency {
+        require(msg.sender == profileAddress, "Sender is not the profile owner");
+        require(profileAddress != address(0), "Invalid profile address");
+        require(rounds > 0 && rounds <= type(uint64).max, "Invalid rounds");
 
-        // free of fee ?
-        if (roundToProfiles[roundId].length < firstNFree) {
-            // Transfer funds to stake contract
-            currency.safeTransferFrom(
-                profileAddress,
-                address(this),
-                stakeValue
-            );
-            emit ProfileStake(roundId, profileAddress, stakeValue, 0, refId);
+        Subscription storage sub = subscriptions[profileId];
+        if (sub.rounds == 0) {
+            require(sub.balance == 0 || sub.profileAddress == profileAddress, "Address not match profile");
+            require(subscribers.length < MAXIMAL_SUBSCRIBERS, "Maximum subscriber limit reached");
+            subscribers.push(profileId);
         } else {
-            // Calculate fee
-            uint256 stakeFee = (stakeValue / 1000) * gasFee;
-
-            // Transfer funds to stake contract
-            currency.safeTransferFrom(
-                profileAddress,
-                address(this),
-                stakeValue + stakeFee
-            );
-
-            // transfer fees
-            if (stakeFee > 0) {
-                payCurrency(walletAddress, stakeFee);
+            require(sub.profileAddress == profileAddress, "Address not match profile");
+        }
+
+        // fee is charged at join time, free slots leave it in the balance
+        uint256 amount = rounds * (stakeValue + stakeFeeAt(firstNFree));
+        pullCurrency(profileAddress, amount);
+
+        sub.profileAddress = profileAddress;
+        sub.rounds += uint64(rounds);
+        sub.rollover = rollover;
+        sub.refId = refId;
+        sub.balance += amount;
+
+        bindProfile(profileId, profileAddress);
+
+        (uint256 roundId, ) = getCurrentRound();
+        emit Subscribe(roundId, profileId, profileAddress, rounds, amount, rollover);
+    }
+
+    /**
+     * @dev cancel the remaining rounds and refund the balance
+     */
+    function unsubscribe(uint256 profileId) external {
+        Subscription storage sub = subscriptions[profileId];
+        require(msg.sender == sub.profileAddress, "Address not match profile");
+
+        if (sub.rounds > 0) {
+            for (uint256 i = 0; i < subscribers.length; i++) {
+                if (subscribers[i] == profileId) {
+                    for (uint256 j = i + 1; j < subscribers.length; j++) {
+                        subscribers[j - 1] = subscribers[j];
+                    }
+                    subscribers.pop();
+                    break;
+                }
             }
-            emit ProfileStake(roundId, profileAddress, stakeValue, stakeFee, refId);
         }
-        
-        // add profile
-        roundToProfiles[roundId].push(profileId);
 
-        // add round
-        profileToRounds[profileId].push(roundId);
+        uint256 refund = sub.balance;
+        address profileAddress = sub.profileAddress;
+        delete subscriptions[profileId];
+        if (refund > 0) {
+            payCurrency(profileAddress, refund);
+        }
 
-        // set invite bonus
-        inviteBonus[roundId][refId] += 1;
+        (uint256 roundId, ) = getCurrentRound();
+        emit Unsubscribe(roundId, profileId, profileAddress, refund);
     }
 
     /**
      * @dev qualify profile
+     * @param roundId round key, each shard is qualified on its own
      */
     function profileQualify(uint256 roundId, uint256 qualify) external stopInEmergency onlyApp {
         require(!isOpen(roundId), "Round is open");
         // ensure round is not settle
         require(!isSettle(roundId), "Round is settle");
         require(qualify > 0, "qualify should not be zero");
+        materializeSubscriptions(roundId);
         require(roundToProfiles[roundId].length > 0, "profiles is empty");
         // set last #profiles bits
         roundToQualify[roundId] |= (((1 << roundToProfiles[roundId].length) - 1) & qualify);
+        updateSettlement(roundId);
         emit ProfileQualify(roundId, qualify);
     }
 
     /**
      * @dev exclude profiles which is illegal
-     * @param roundId current round id
+     * @param roundId round key, each shard is excluded on its own
      * @param illegals Bit array to indicate profile qualification of claim
      */
     function profileExclude(uint256 roundId, uint256 illegals) external stopInEmergency onlyApp {
         // round not settle
         require(!isSettle(roundId), "Round is settle");
         require(illegals > 0, "qualify should not be zero");
+        materializeSubscriptions(roundId);
         require(roundToProfiles[roundId].length > 0, "profiles is empty");
 
         roundToQualify[roundId] |= ((((1 << roundToProfiles[roundId].length) - 1) & illegals) << 50);
+        updateSettlement(roundId);
+        emit ProfileExclude(roundId, illegals);
+    }
+
+    /**
+     * @dev Commit to the qualify and exclude bits of a round before it settles,
+     *      they are applied by revealQualify until ROUND_REVEAL_LENGTH after settle.
+     *      Claims of the round wait for the reveal or its deadline.
+     * @param roundId round key
+     * @param commitment keccak256(abi.encode(roundId, qualify, illegals, salt))
+     */
+    function commitQualify(uint256 roundId, bytes32 commitment) external stopInEmergency onlyApp {
+        require(!isSettle(roundId), "Round is settle");
+        require(commitment != 0, "Invalid commitment");
+        qualifyCommits[roundId] = commitment;
+        emit QualifyCommit(roundId, commitment);
+    }
+
+    /**
+     * @dev apply a committed qualify, same effect as profileQualify and profileExclude
+     */
+    function revealQualify(uint256 roundId, uint256 qualify, uint256 illegals, bytes32 salt) external stopInEmergency onlyApp {
+        require(qualifyCommits[roundId] != 0, "No qualify commit");
+        require(!isOpen(roundId), "Round is open");
+        require(block.timestamp <= settleTime(roundId) + ROUND_REVEAL_LENGTH, "Reveal is over");
+        require(keccak256(abi.encode(roundId, qualify, illegals, salt)) == qualifyCommits[roundId], "Commit not match");
+        materializeSubscriptions(roundId);
+        require(roundToProfiles[roundId].length > 0, "profiles is empty");
+
+        delete qualifyCommits[roundId];
+        uint256 mask = (1 << roundToProfiles[roundId].length) - 1;
+        roundToQualify[roundId] |= (mask & qualify) | ((mask & illegals) << 50);
+        updateSettlement(roundId);
+
+        emit ProfileQualify(roundId, qualify);
         emit ProfileExclude(roundId, illegals);
+        emit QualifyReveal(roundId, qualify, illegals);
+    }
+
+    function getQualifyCommit(uint256 roundId) public view returns (bytes32 commitment, uint256 deadline) {
+        return (qualifyCommits[roundId], settleTime(roundId) + ROUND_REVEAL_LENGTH);
     }
 
     function getCurrentRound() public view returns (uint256 roundId, uint256 startTime) {
-        uint256 localRoundId = (block.timestamp - genesis) / ROUND_GAP_LENGTH;
-        return (compensateRoundReverse(localRoundId), genesis + localRoundId * ROUND_GAP_LENGTH);
+        uint256 timing = loadRoundTiming();
+        roundId = uint256(int256(block.timestamp) - timingOrigin(timing)) / timingField(timing, 64);
+        return (roundId, roundStart(timing, roundId));
     }
 
+    function getRoundTiming() public view returns (int256 origin, uint256 gapLength, uint256 openLength, uint256 freezeLength) {
+        uint256 timing = loadRoundTiming();
+        return (timingOrigin(timing), timingField(timing, 64), timingField(timing, 96), timingField(timing, 128));
+    }
+
+    /**
+     * @dev the shard the next stake of the current round goes to
+     * @return roundKey key of that shard, for getRoundData/profileQualify/profileClaim
+     */
+    function getCurrentShard() public view returns (uint256 roundId, uint256 shard, uint256 roundKey, uint256 startTime) {
+        (roundId, startTime) = getCurrentRound();
+        shard = roundShards[roundId];
+        if (roundToProfiles[roundKeyOf(roundId, shard)].length >= maxProfiles && shard + 1 < maxShards) {
+            shard += 1;
+        }
+        return (roundId, shard, roundKeyOf(roundId, shard), startTime);
+    }
+
+    // number of opened shards of the round, at least 1
+    function getRoundShards(uint256 roundId) public view returns (uint256 shards) {
+        return roundShards[baseRound(roundId)] + 1;
+    }
+
+    function getRoundShardData(uint256 roundId, uint256 shard) public view returns (uint256 roundKey, uint256 qualify, uint256[] memory profiles) {
+        roundKey = roundKeyOf(baseRound(roundId), shard);
+        (qualify, profiles) = getRoundData(roundKey);
+    }
+
+    // takes a round key, shard 0 is the round id itself
+    // archived rounds keep only their round word, profiles are in RoundArchived
     function getRoundData(uint256 roundId) public view returns (uint256 qualify, uint256[] memory profiles) {
-        return (roundToQualify[roundId], roundToProfiles[roundId]);
+        (uint256[] memory pending, uint256 count) = pendingSubscribers(roundId);
+        if (count == 0) {
+            return (roundToQualify[roundId], roundToProfiles[roundId]);
+        }
+
+        // subscribers that will join when the round is first touched
+        uint256 profileNum = roundToProfiles[roundId].length;
+        profiles = new uint256[](profileNum + count);
+        for (uint256 i = 0; i < profileNum; i++) {
+            profiles[i] = roundToProfiles[roundId][i];
+        }
+        for (uint256 i = 0; i < count; i++) {
+            profiles[profileNum + i] = pending[i];
+        }
+        return (roundToQualify[roundId], profiles);
+    }
+
+    /**
+     * @dev summary hash of an archived round,
+     *      keccak256(abi.encode(roundId, qualify, profiles, invites)) of its RoundArchived event
+     */
+    function getRoundSummary(uint256 roundId) public view returns (bytes32 summary, bool archived) {
+        return (roundSummaries[roundId], isArchived(roundId));
+    }
+
+    // winners summary the claims use, stored false until the app qualifies or excludes the round
+    function getRoundSettlement(uint256 roundId) public view returns (bool stored, uint256 qualifyNum, uint256 shares) {
+        uint256 summary = roundSettlements[roundId];
+        stored = summary != 0 && (summary & ((1 << 64) - 1)) == roundToProfiles[roundId].length;
+        (qualifyNum, shares) = settlement(roundId);
+    }
+
+    function getSubscription(uint256 profileId) public view returns (address profileAddress, uint256 rounds, uint256 balance, bool rollover) {
+        Subscription storage sub = subscriptions[profileId];
+        return (sub.profileAddress, sub.rounds, sub.balance, sub.rollover);
+    }
+
+    function getSubscribers() public view returns (uint256[] memory profiles) {
+        return subscribers;
+    }
+
+    function getNonce(address signer) public view returns (uint256) {
+        return nonces[signer];
+    }
+
+    function getDomainSeparator() public view returns (bytes32) {
+        return domainSeparator();
     }
 
+    function getProfileAddress(uint256 profileId) public view returns (address) {
+        return profileToAddress[profileId];
+    }
+
+    // last round the profile joined, if any
+    function getProfileLastRound(uint256 profileId) public view returns (bool joined, uint256 roundId) {
+        if (profileLastRound[profileId] != 0) {
+            return (true, profileLastRound[profileId] - 1);
+        }
+        uint256 rounds = profileToRounds[profileId].length;
+        if (rounds > 0) {
+            return (true, baseRound(profileToRounds[profileId][rounds - 1]));
+        }
+        return (false, 0);
+    }
+
+    // complete while the profile history is enabled, ProfileStake events have it all
     function getProfileRounds(uint256 profileId) public view returns (uint256[] memory roundIds) {
         return profileToRounds[profileId];
     }
@@ -421,6 +1122,16 @@ contract Stake2Follow is Initializable {
         return maxProfiles;
     }
 
+    function setMaxShards(uint256 shards) public onlyOwner {
+        require(shards > 0, "max shards invalid");
+        maxShards = shards;
+        emit SetMaxShards(shards);
+    }
+
+    function getMaxShards() public view returns (uint256) {
+        return maxShards;
+    }
+
     function setFirstNFree(uint256 n) public onlyOwner {
         require(n <= maxProfiles, "invalid input");
         firstNFree = n;
@@ -456,7 +1167,7 @@ contract Stake2Follow is Initializable {
     }
 
     function resetRoundDuration(uint256 openLength, uint256 freezeLength, uint256 gapLength) public onlyInEmergency onlyOwner {
-        require(openLength + freezeLength <= gapLength, "Invalid round duration");
+        require(openLength + freezeLength <= gapLength && gapLength < (1 << 32), "Invalid round duration");
 
         uint256 oldRoundId = compensateRoundReverse((block.timestamp - genesis) / ROUND_GAP_LENGTH);
         uint256 newRoundId = (block.timestamp - genesis) / gapLength;
@@ -471,30 +1182,60 @@ contract Stake2Follow is Initializable {
         ROUND_OPEN_LENGTH = openLength;
         ROUND_FREEZE_LENGTH = freezeLength;
         ROUND_GAP_LENGTH = gapLength;
+        roundTiming = packRoundTiming();
 
         emit ResetRoundDuration(openLength, freezeLength, gapLength, roundCompensate);
     }
 
+    // write the packed round timing of a proxy upgraded from a version without it
+    function syncRoundTiming() public onlyOwner {
+        roundTiming = packRoundTiming();
+    }
+
+    function setLensHub(address _lensHub) public onlyOwner {
+        lensHub = IERC721(_lensHub);
+        emit SetLensHub(_lensHub);
+    }
+
+    function setProfileHistory(bool enabled) public onlyOwner {
+        profileHistoryDisabled = !enabled;
+        emit SetProfileHistory(enabled);
+    }
+
+    function setRevealLength(uint256 revealLength) public onlyOwner {
+        require(revealLength <= ROUND_GAP_LENGTH, "Invalid reveal length");
+        ROUND_REVEAL_LENGTH = revealLength;
+        emit SetRevealLength(revealLength);
+    }
+
+    function getStopped() public view returns (bool) {
+        return stopped;
+    }
+
     function circuitBreaker() public onlyOwner {
         stopped = !stopped;
         emit CircuitBreak(stopped);
     }
 
+    // platform fee of a settled round
+    function roundFee(uint256 roundId) internal view returns (uint256) {
+        uint256 profileNum = roundToProfiles[roundId].length;
+        (uint256 qualifyNum, ) = settlement(roundId);
+
+        uint256 reward = stakeValue * (profileNum - qualifyNum);
+        return (reward / 1000) * rewardFee;
+    }
+
+    // takes a round key, the fee of each shard is withdrawn on its own
     function withdrawRoundFee(uint256 roundId) public onlyOwner {
         // ensure round is settle
         require(isSettle(roundId), "Round is not settle");
+        require(!isRevealPending(roundId), "Qualify not revealed");
+        require(!isFeeWithdrawn(roundId), "Fee already withdrawn");
 
         // calculate reward && pay
-        uint256 profileNum = roundToProfiles[roundId].length;
-        uint256 qualifyNum = 0;
-        for (uint256 i = 0; i < profileNum; i++) {
-            if (isClaimable(roundId, i) && !isExcluded(roundId, i)) {
-                qualifyNum += 1;
-            }
-        }
-
-        uint256 reward = stakeValue * (profileNum - qualifyNum);
-        uint256 fee = (reward / 1000) * rewardFee;
+        uint256 fee = roundFee(roundId);
+        setFeeWithdrawn(roundId);
 
         // Transfer the fund to profile
         if (fee > 0) {
@@ -504,8 +1245,89 @@ contract Stake2Follow is Initializable {
         emit WithdrawRoundFee(roundId, fee);
     }
 
+    /**
+     * @dev withdraw the platform fees of every settled round up to `roundId` in one transfer
+     * @param roundId last round to sweep, must be settled
+     */
+    function withdrawFeesUpTo(uint256 roundId) public onlyOwner {
+        require(shardOf(roundId) == 0, "Invalid round");
+        require(isSettle(roundId), "Round is not settle");
+        require(roundId >= nextFeeRound, "Fee already withdrawn");
+
+        uint256 fromRound = nextFeeRound;
+        uint256 fee = 0;
+        for (uint256 r = fromRound; r <= roundId; r++) {
+            for (uint256 shard = 0; shard <= roundShards[r]; shard++) {
+                // skip shards withdrawn one by one
+                uint256 roundKey = roundKeyOf(r, shard);
+                require(!isRevealPending(roundKey), "Qualify not revealed");
+                if (((roundToQualify[roundKey] >> 151) & 1) == 0) {
+                    fee += roundFee(roundKey);
+                }
+            }
+        }
+        nextFeeRound = roundId + 1;
+
+        if (fee > 0) {
+            payCurrency(walletAddress, fee);
+        }
+
+        emit WithdrawFees(fromRound, roundId, fee);
+    }
+
+    /**
+     * @dev move the fee cursor past the rounds whose fees were withdrawn before
+     *      the cursor existed, once after upgrading the proxy. It only moves forward.
+     * @param roundId first round withdrawFeesUpTo will sweep
+     */
+    function setNextFeeRound(uint256 roundId) public onlyOwner {
+        require(shardOf(roundId) == 0, "Invalid round");
+        require(roundId > nextFeeRound, "Fee round only moves forward");
+        nextFeeRound = roundId;
+        emit SetNextFeeRound(roundId);
+    }
+
+    function getNextFeeRound() public view returns (uint256) {
+        return nextFeeRound;
+    }
+
+    /**
+     * @dev Delete the profiles and invite counters of a finished round: settled,
+     *      fee withdrawn and every winner claimed. The data moves to the
+     *      RoundArchived event and only its hash stays in storage. Anyone can
+     *      call it, the storage refund goes to the caller's transaction.
+     * @param roundId round key to archive
+     */
+    function archiveRound(uint256 roundId) external stopInEmergency {
+        require(isSettle(roundId), "Round is not settle");
+        require(isFeeWithdrawn(roundId), "Fee not withdrawn");
+        require(!isRevealPending(roundId), "Qualify not revealed");
+        require(!isArchived(roundId), "Round already archived");
+        uint256 profileNum = roundToProfiles[roundId].length;
+        require(profileNum > 0, "profiles is empty");
+
+        uint256[] memory profiles = roundToProfiles[roundId];
+        uint256[] memory invites = new uint256[](profileNum);
+        for (uint256 i = 0; i < profileNum; i++) {
+            require(!isClaimable(roundId, i) || isExcluded(roundId, i) || isClaimed(roundId, i), "Round has unclaimed rewards");
+            invites[i] = inviteBonus[roundId][profiles[i]];
+            delete inviteBonus[roundId][profiles[i]];
+        }
+        // rounds staked before refId 0 was skipped counted it
+        delete inviteBonus[roundId][0];
+        delete roundToProfiles[roundId];
+        delete roundSettlements[roundId];
+
+        setArchived(roundId);
+        uint256 qualify = roundToQualify[roundId];
+        bytes32 summary = keccak256(abi.encode(roundId, qualify, profiles, invites));
+        roundSummaries[roundId] = summary;
+
+        emit RoundArchived(roundId, summary, qualify, profiles, invites);
+    }
+
     function withdraw() public onlyInEmergency onlyOwner {
-        uint256 balance = currency.balanceOf(address(this));
+        uint256 balance = currencyBalance();
         // Check that there is enough funds to withdraw
         require(balance > 0, "The fund is empty");
 
@@ -10,6 +10,10 @@ const config: HardhatUserConfig = {
   networks: {
     hardhat: {
     },
+    // node started by scripts/differential.py
+    differential: {
+      url: process.env.DIFFERENTIAL_URL || "http://127.0.0.1:8545",
+    },
     polygon_mumbai: {
       url: API_URL,
       accounts: [`0x${OWNER_PRIVATE_KEY}`]
@@ -0,0 +1,165 @@
+# Columnar round archive for analytics.
+# Rounds are rebuilt from the event log and written as NumPy arrays,
+# partitioned by round range. Exports are incremental: only partitions with
+# rounds touched by new events are rewritten, and reads are memory-mapped.
+
+import json
+import os
+import pickle
+
+import numpy as np
+
+from brownie import web3, stake2Follow
+from scripts.indexer import RoundIndexer, fetch_events
+from scripts.rounds import CLAIMED_OFFSET, EXCLUDE_OFFSET, MATERIALIZED_BIT, base_round, shard_of
+
+MASK = (1 << 50) - 1
+
+# one row per round shard, the 256 bit round word is split in its 50 bit fields
+ROUND_DTYPE = np.dtype([
+  ('roundId', '<u8'),
+  ('shard', '<u2'),
+  ('profileNum', '<u2'),
+  ('qualify', '<u8'),
+  ('exclude', '<u8'),
+  ('claimed', '<u8'),
+  # bits 150+ of the round word
+  ('flags', '<u8'),
+  # first row of the round in the profiles array
+  ('offset', '<u8'),
+])
+
+# one row per participant, payouts may exceed 64 bits so are kept as two limbs
+PROFILE_DTYPE = np.dtype([
+  ('roundId', '<u8'),
+  ('shard', '<u2'),
+  ('profileIndex', '<u2'),
+  ('profileId', '<u8'),
+  ('invites', '<u4'),
+  ('payoutHi', '<u8'),
+  ('payoutLo', '<u8'),
+])
+
+
+def unpack_masks(masks):
+  # uint64 masks -> (n, 50) bool matrix, bit i is profile index i
+  bits = np.unpackbits(np.ascontiguousarray(masks, dtype='<u8').view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+  return bits[:, :50].astype(bool)
+
+
+def profile_bits(rounds, profiles, field):
+  # per participant flag of the given round field, e.g. 'qualify',
+  # for the rounds and profiles of one partition
+  index = np.repeat(np.arange(len(rounds)), rounds['profileNum'])
+  return ((rounds[field][index] >> profiles['profileIndex'].astype('<u8')) & np.uint64(1)).astype(bool)
+
+
+def payouts(profiles):
+  # exact payouts as Python ints in an object array, float64 rounds above 2**53 wei
+  return np.array([(int(hi) << 64) | int(lo) for hi, lo in zip(profiles['payoutHi'], profiles['payoutLo'])], dtype=object)
+
+
+class RoundArchive:
+
+  def __init__(self, path, partitionSize=1024):
+    self.path = path
+    self.manifestPath = os.path.join(path, 'manifest.json')
+    self.statePath = os.path.join(path, 'indexer.pkl')
+    self.manifest = {'partitionSize': partitionSize, 'lastBlock': -1, 'partitions': []}
+    if os.path.exists(self.manifestPath):
+      with open(self.manifestPath) as f:
+        self.manifest = json.load(f)
+    self.partitionSize = self.manifest['partitionSize']
+
+  def partition_dir(self, start):
+    return os.path.join(self.path, 'rounds_{:010d}_{:010d}'.format(start, start + self.partitionSize - 1))
+
+  def export(self, sf, toBlock=None):
+    # append events after the last exported block, rewrite touched partitions
+    if toBlock is None:
+      toBlock = web3.eth.block_number
+    fromBlock = self.manifest['lastBlock'] + 1
+    if fromBlock > toBlock:
+      return []
+
+    if os.path.exists(self.statePath):
+      with open(self.statePath, 'rb') as f:
+        indexer = pickle.load(f)
+    else:
+      indexer = RoundIndexer.from_contract(sf)
+
+    touched = set()
+    for log in fetch_events(sf, fromBlock, toBlock):
+      indexer.apply(log['event'], dict(log['args']))
+      roundId = log['args'].get('roundId')
+      if roundId is not None and roundId in indexer.rounds:
+        touched.add(base_round(roundId) // self.partitionSize * self.partitionSize)
+
+    os.makedirs(self.path, exist_ok=True)
+    for start in sorted(touched):
+      self.write_partition(indexer, start)
+      if start not in self.manifest['partitions']:
+        self.manifest['partitions'].append(start)
+    self.manifest['partitions'].sort()
+    self.manifest['lastBlock'] = toBlock
+
+    with open(self.statePath, 'wb') as f:
+      pickle.dump(indexer, f)
+    with open(self.manifestPath, 'w') as f:
+      json.dump(self.manifest, f)
+    return sorted(touched)
+
+  def write_partition(self, indexer, start):
+    # shards of a round are adjacent rows
+    roundIds = sorted(
+      (r for r in indexer.rounds if start <= base_round(r) < start + self.partitionSize),
+      key=lambda r: (base_round(r), shard_of(r))
+    )
+    rounds = np.zeros(len(roundIds), dtype=ROUND_DTYPE)
+    profiles = np.zeros(sum(len(indexer.rounds[r].profiles) for r in roundIds), dtype=PROFILE_DTYPE)
+
+    offset = 0
+    for i, roundId in enumerate(roundIds):
+      state = indexer.rounds[roundId]
+      rounds[i] = (
+        base_round(roundId),
+        shard_of(roundId),
+        len(state.profiles),
+        state.qualify & MASK,
+        (state.qualify >> EXCLUDE_OFFSET) & MASK,
+        (state.qualify >> CLAIMED_OFFSET) & MASK,
+        state.qualify >> MATERIALIZED_BIT,
+        offset,
+      )
+      for profileIndex, profileId in enumerate(state.profiles):
+        payout = state.payouts.get(profileId, 0)
+        profiles[offset] = (base_round(roundId), shard_of(roundId), profileIndex, profileId, state.invites.get(profileId, 0), payout >> 64, payout & ((1 << 64) - 1))
+        offset += 1
+
+    directory = self.partition_dir(start)
+    os.makedirs(directory, exist_ok=True)
+    # write then rename so concurrent readers never map a partial file
+    for name, array in (('rounds', rounds), ('profiles', profiles)):
+      tmp = os.path.join(directory, name + '.tmp.npy')
+      np.save(tmp, array)
+      os.replace(tmp, os.path.join(directory, name + '.npy'))
+
+  def load(self, start):
+    directory = self.partition_dir(start)
+    return (
+      np.load(os.path.join(directory, 'rounds.npy'), mmap_mode='r'),
+      np.load(os.path.join(directory, 'profiles.npy'), mmap_mode='r'),
+    )
+
+  def scan(self, fromRound=0, toRound=None):
+    # (rounds, profiles) of every partition overlapping the range
+    for start in self.manifest['partitions']:
+      if start + self.partitionSize <= fromRound or (toRound is not None and start > toRound):
+        continue
+      yield self.load(start)
+
+
+def main():
+  archive = RoundArchive('archive')
+  touched = archive.export(stake2Follow[-1])
+  print('rewrote partitions: {}'.format(touched))
@@ -0,0 +1,101 @@
+# Read-through cache for Stake2Follow views.
+# getRoundData of a settled round only changes when a claim flips a claimed
+# bit and getConfig only changes on the Set*/ResetRoundDuration events, so
+# both are memoized and evicted exactly when the matching event is seen.
+# WithdrawFees leaves the round words alone: rounds it sweeps are read as
+# withdrawn through getNextFeeRound, which is not cached.
+
+from collections import OrderedDict
+
+from brownie import chain
+from scripts.indexer import EventHandler
+from scripts.metrics import REGISTRY
+from scripts.rounds import RoundSchedule
+
+CONFIG_EVENTS = (
+  'SetGasFee',
+  'SetRewardFee',
+  'SetMaxProfiles',
+  'SetStakeValue',
+  'SetFirstNFree',
+  'SetInviteFee',
+  'ResetRoundDuration',
+)
+
+ROUND_EVENTS = (
+  'ProfileStake',
+  'ProfileQualify',
+  'ProfileExclude',
+  'ProfileClaim',
+  'QualifyReveal',
+  'WithdrawRoundFee',
+  'SubscriptionsMaterialize',
+  'RoundArchived',
+)
+
+
+class LRUCache:
+
+  def __init__(self, name, maxsize, registry=REGISTRY):
+    self.name = name
+    self.maxsize = maxsize
+    self.entries = OrderedDict()
+    self.hits = registry.counter('stake2follow_cache_hits_total', 'Cache lookups served from memory')
+    self.misses = registry.counter('stake2follow_cache_misses_total', 'Cache lookups that read the chain')
+    self.evictions = registry.counter('stake2follow_cache_evictions_total', 'Entries dropped by size bound')
+    self.invalidations = registry.counter('stake2follow_cache_invalidations_total', 'Entries dropped by contract events')
+    self.size = registry.gauge('stake2follow_cache_entries', 'Entries held in cache')
+
+  def get(self, key, load):
+    if key in self.entries:
+      self.entries.move_to_end(key)
+      self.hits.inc(cache=self.name)
+      return self.entries[key]
+
+    self.misses.inc(cache=self.name)
+    value = load()
+    self.entries[key] = value
+    if len(self.entries) > self.maxsize:
+      self.entries.popitem(last=False)
+      self.evictions.inc(cache=self.name)
+    self.size.set(len(self.entries), cache=self.name)
+    return value
+
+  def invalidate(self, key):
+    if self.entries.pop(key, None) is not None:
+      self.invalidations.inc(cache=self.name)
+      self.size.set(len(self.entries), cache=self.name)
+
+  def clear(self):
+    if self.entries:
+      self.invalidations.inc(len(self.entries), cache=self.name)
+      self.entries.clear()
+      self.size.set(0, cache=self.name)
+
+
+class ContractCache(EventHandler):
+
+  def __init__(self, sf, maxRounds=4096, registry=REGISTRY):
+    self.sf = sf
+    self.configs = LRUCache('config', 1, registry)
+    self.rounds = LRUCache('round', maxRounds, registry)
+
+  def get_config(self):
+    return self.configs.get('config', lambda: tuple(self.sf.getConfig()))
+
+  def get_round_data(self, roundId, now=None):
+    if now is None:
+      now = chain.time()
+    # open and freezing rounds still change on every stake and qualify
+    if not RoundSchedule.from_config(self.get_config()).is_settle(roundId, now):
+      return self.sf.getRoundData(roundId)
+    return self.rounds.get(roundId, lambda: self.sf.getRoundData(roundId))
+
+  def apply(self, name, args):
+    if name in ROUND_EVENTS:
+      self.rounds.invalidate(args['roundId'])
+    if name in CONFIG_EVENTS:
+      self.configs.clear()
+    if name == 'ResetRoundDuration':
+      # round ids are remapped to new start times
+      self.rounds.clear()
@@ -0,0 +1,397 @@
+# Demand-driven capacity control for Stake2Follow.
+# maxProfiles caps every shard of a round, so a popular round fills early and
+# later stakers are turned away with "Maximum profile limit reached", while a
+# quiet round runs with empty slots. The demand of a round is what it would
+# have taken without the cap: its stakes when it never filled, else the larger
+# of its stakes plus the stakes refused once it was full, and its stake rate
+# before filling extrapolated over the open window. Refused profileStake and
+# profileStakeWithPermit transactions revert, so they are found by reading the
+# blocks from the fill to the end of the open window of the rounds that filled;
+# relayStakes skips a refused intent with a RelaySkip event instead.
+#
+# CapacityController keeps an exponentially weighted forecast of that demand
+# and proposes the next round's maxProfiles (capacity for the forecast plus a
+# margin of its usual error) and firstNFree (free slots only for rounds not
+# expected to sell out), each moved by at most `step` per round and kept
+# within MAXIMAL_PROFILES. backtest replays round history under a set of
+# policies and reports the stakes each one would have served.
+#
+#   brownie run capacity export         # round history to capacity.json
+#   python -m scripts.capacity capacity.json --alpha 0.2 0.5 --margin 0 1
+#   brownie run capacity run            # adjust the live contract between rounds
+
+import argparse
+import json
+import math
+import os
+from collections import namedtuple
+
+from scripts.rounds import RoundSchedule, base_round, shard_of
+
+# staked: profiles staked in every shard, refused: stakes reverted or skipped
+# while every shard was full, fillTime: seconds from the round start
+# to the stake filling its last shard, None when it never filled
+Round = namedtuple('Round', [
+  'roundId',
+  'maxProfiles',
+  'firstNFree',
+  'maxShards',
+  'openLength',
+  'staked',
+  'refused',
+  'fillTime',
+])
+
+# the contract default, read MAXIMAL_PROFILES when a contract is at hand
+MAXIMAL_PROFILES = 50
+
+
+def demand(r):
+  # stakes the round would have taken without the cap
+  if r.fillTime is None:
+    return r.staked
+  # most stakers arriving after the round filled never sent a transaction
+  rate = r.staked * r.openLength / max(r.fillTime, 1)
+  return max(r.staked + r.refused, rate)
+
+
+class DemandForecast:
+  # exponentially weighted demand per round, with the weighted size of its errors
+
+  def __init__(self, alpha=0.3):
+    self.alpha = alpha
+    self.level = None
+    self.spread = 0.0
+
+  def update(self, value):
+    if self.level is None:
+      self.level = float(value)
+      return
+    error = value - self.level
+    self.level += self.alpha * error
+    self.spread += self.alpha * (abs(error) - self.spread)
+
+  def forecast(self, margin=0.0):
+    return self.level + margin * self.spread
+
+
+def clamp(value, low, high):
+  return max(low, min(high, value))
+
+
+class CapacityController:
+
+  def __init__(self, alpha=0.3, margin=1.0, step=5, freeShare=0.1, minProfiles=2, maximal=MAXIMAL_PROFILES):
+    self.forecast = DemandForecast(alpha)
+    # error spreads of headroom over the forecast
+    self.margin = margin
+    # largest change of either setting per round
+    self.step = step
+    # firstNFree over maxProfiles for rounds not expected to fill
+    self.freeShare = freeShare
+    self.minProfiles = minProfiles
+    self.maximal = maximal
+
+  def observe(self, r):
+    self.forecast.update(demand(r))
+
+  def propose(self, maxProfiles, firstNFree, maxShards=1):
+    # (maxProfiles, firstNFree) for the next round
+    if self.forecast.level is None:
+      return maxProfiles, firstNFree
+    expected = self.forecast.forecast(self.margin)
+    want = clamp(math.ceil(expected / max(maxShards, 1)), self.minProfiles, self.maximal)
+    profiles = clamp(want, maxProfiles - self.step, maxProfiles + self.step)
+    # free slots draw stakers to rounds with room, a round selling out needs none
+    freeWant = round(self.freeShare * profiles) if self.forecast.forecast() < profiles * max(maxShards, 1) else 0
+    free = clamp(freeWant, firstNFree - self.step, firstNFree + self.step)
+    return profiles, clamp(free, 0, profiles)
+
+
+def serve(history, maxProfiles, firstNFree, controller=None):
+  # {served, turnedAway, freeSlots, fill} of the history capped by a policy,
+  # a controller only sees rounds before the one it sets
+  report = {'rounds': 0, 'served': 0, 'turnedAway': 0, 'freeSlots': 0, 'fill': 0.0, 'changes': 0}
+  for r in history:
+    if controller is None:
+      maxProfiles, firstNFree = r.maxProfiles, r.firstNFree
+    wanted = demand(r)
+    capacity = maxProfiles * max(r.maxShards, 1)
+    served = int(min(wanted, capacity))
+    report['rounds'] += 1
+    report['served'] += served
+    report['turnedAway'] += wanted - served
+    # firstNFree holds for every shard
+    report['freeSlots'] += min(firstNFree * max(r.maxShards, 1), served)
+    report['fill'] += served / capacity if capacity else 0
+    if controller is not None:
+      controller.observe(r)
+      proposal = controller.propose(maxProfiles, firstNFree, r.maxShards)
+      if proposal != (maxProfiles, firstNFree):
+        report['changes'] += 1
+      maxProfiles, firstNFree = proposal
+  if report['rounds']:
+    report['fill'] /= report['rounds']
+  return report
+
+
+def backtest(history, policies):
+  # {policy name: report}, 'historical' is the settings the rounds ran with
+  reports = {'historical': serve(history, 0, 0)}
+  if not history:
+    return reports
+  for name, params in policies.items():
+    reports[name] = serve(history, history[0].maxProfiles, history[0].firstNFree, CapacityController(**params))
+  return reports
+
+
+def policy_grid(alphas, margins, step, freeShare, maximal=MAXIMAL_PROFILES):
+  return {
+    'ewma alpha={} margin={}'.format(alpha, margin): dict(alpha=alpha, margin=margin, step=step, freeShare=freeShare, maximal=maximal)
+    for alpha in alphas
+    for margin in margins
+  }
+
+
+def print_backtest(reports):
+  base = reports['historical']['served']
+  for name, report in reports.items():
+    gain = report['served'] / base - 1 if base else 0
+    print('{:<32} served {:>8} turned away {:>10.1f} free {:>7} fill {:>5.1%} changes {:>4} gain {:+.1%}'.format(
+      name, report['served'], report['turnedAway'], report['freeSlots'], report['fill'], report['changes'], gain))
+
+
+def save_history(history, path):
+  with open(path, 'w') as f:
+    json.dump([r._asdict() for r in history], f, indent=1)
+
+
+def load_history(path):
+  with open(path) as f:
+    return [Round(**r) for r in json.load(f)]
+
+
+class DemandIndexer:
+  # rounds of the event log with their fill times and refused stakes,
+  # fed in block order with the block time of each item
+
+  def __init__(self, schedule, maxProfiles, firstNFree, maxShards):
+    self.schedule = schedule
+    self.maxProfiles = maxProfiles
+    self.firstNFree = firstNFree
+    self.maxShards = maxShards
+    # base round => Round, settings taken at its first stake
+    self.rounds = {}
+    # round key => profiles staked
+    self.keys = {}
+    # base round => (blockNumber, transactionIndex) of the stake that filled it
+    self.fills = {}
+
+  def round(self, roundId):
+    if roundId not in self.rounds:
+      self.rounds[roundId] = Round(roundId, self.maxProfiles, self.firstNFree, self.maxShards, self.schedule.openLength, 0, 0, None)
+    return self.rounds[roundId]
+
+  def apply(self, name, args, time):
+    handler = getattr(self, '_on_' + name, None)
+    if handler is not None:
+      handler(args, time)
+
+  def refuse(self, roundId, time):
+    # a reverted or skipped stake, counted when every shard of the open round was full
+    r = self.rounds.get(roundId)
+    if r is not None and r.fillTime is not None and self.schedule.is_open(roundId, time):
+      self.rounds[roundId] = r._replace(refused=r.refused + 1)
+
+  def _on_ProfileStake(self, args, time):
+    roundKey = args['roundId']
+    roundId = base_round(roundKey)
+    r = self.round(roundId)
+    self.keys[roundKey] = self.keys.get(roundKey, 0) + 1
+    r = r._replace(staked=r.staked + 1)
+    lastShard = shard_of(roundKey) + 1 >= max(r.maxShards, 1)
+    if r.fillTime is None and lastShard and self.keys[roundKey] >= r.maxProfiles:
+      r = r._replace(fillTime=time - self.schedule.start_time(roundId))
+    self.rounds[roundId] = r
+
+  def _on_RelaySkip(self, args, time):
+    if args['reason'] == 'Maximum profile limit reached':
+      self.refuse(args['roundId'], time)
+
+  def _on_SetMaxProfiles(self, args, time):
+    self.maxProfiles = args['profiles']
+
+  def _on_SetFirstNFree(self, args, time):
+    self.firstNFree = args['n']
+
+  def _on_SetMaxShards(self, args, time):
+    self.maxShards = args['shards']
+
+  def _on_ResetRoundDuration(self, args, time):
+    self.schedule = RoundSchedule(
+      self.schedule.genesis,
+      args['openLength'],
+      args['freezeLength'],
+      args['gapLength'],
+      args['roundCompensate'],
+      self.schedule.revealLength,
+    )
+
+  def history(self, now):
+    # every round from the first staked one to the last one closed at `now`,
+    # rounds nobody staked in have no events and a demand of 0
+    if not self.rounds:
+      return []
+    roundId, startTime = self.schedule.current_round(now)
+    last = roundId if not self.schedule.is_open(roundId, now) else roundId - 1
+    return [self.rounds.get(r) or Round(r, self.maxProfiles, self.firstNFree, self.maxShards, self.schedule.openLength, 0, 0, None)
+            for r in range(min(self.rounds), last + 1)]
+
+
+def refused_stakes(sf, windows, toBlock):
+  # [(blockNumber, transactionIndex, roundId, timestamp)] of reverted profileStake and
+  # profileStakeWithPermit transactions. Each (fromBlock, endTime) window is read
+  # block by block until the block time reaches endTime, with one receipt per
+  # stake sent; a block is read once even if windows overlap
+  from brownie import web3
+
+  selectors = (sf.profileStake.signature, sf.profileStakeWithPermit.signature)
+  refused = []
+  cursor = 0
+  # the block that ended the previous window may start the next one
+  last = (None, None)
+  for fromBlock, endTime in sorted(windows):
+    number = max(fromBlock, cursor)
+    while number <= toBlock:
+      block = last[1] if last[0] == number else web3.eth.get_block(number, full_transactions=True)
+      last = (number, block)
+      if block['timestamp'] >= endTime:
+        break
+      for tx in block['transactions']:
+        data = tx['input'] if isinstance(tx['input'], str) else web3.toHex(tx['input'])
+        if tx['to'] != sf.address or not data.startswith(selectors):
+          continue
+        if web3.eth.get_transaction_receipt(tx['hash'])['status'] == 0:
+          name, args = sf.decode_input(data)
+          refused.append((number, tx['transactionIndex'], args[0], block['timestamp']))
+      number += 1
+    cursor = number
+  return refused
+
+
+def read_history(sf, fromBlock=0, toBlock=None, step=None, indexer=None):
+  # (indexer, last block) with the logs and refused stakes in range applied,
+  # settings before the first Set* event are read at `fromBlock`
+  from brownie import web3
+  from scripts.indexer import contract_config, fetch_events
+
+  if toBlock is None:
+    toBlock = web3.eth.block_number
+  if indexer is None:
+    block = {'block_identifier': fromBlock} if fromBlock else {}
+    indexer = DemandIndexer(
+      RoundSchedule.from_config(contract_config(sf)),
+      sf.maxProfiles.call(**block),
+      sf.firstNFree.call(**block),
+      sf.getMaxShards.call(**block),
+    )
+  times = {}
+  for log in fetch_events(sf, fromBlock, toBlock, step=step):
+    number = log['blockNumber']
+    if number not in times:
+      times[number] = web3.eth.get_block(number)['timestamp']
+    indexer.apply(log['event'], dict(log['args']), times[number])
+    if log['event'] == 'ProfileStake':
+      roundId = base_round(log['args']['roundId'])
+      if indexer.rounds[roundId].fillTime is not None and roundId not in indexer.fills:
+        indexer.fills[roundId] = (number, log['transactionIndex'])
+
+  # reverted stakes only count once the round is full, so only the blocks from
+  # the fill to the end of the open window are read, including rounds that
+  # filled in an earlier range and are still open
+  startTime = times.get(fromBlock) or web3.eth.get_block(fromBlock)['timestamp']
+  windows = []
+  for roundId, (number, index) in indexer.fills.items():
+    endTime = indexer.schedule.freeze_time(roundId)
+    if endTime > startTime:
+      windows.append((max(number, fromBlock), endTime))
+  for number, index, roundId, timestamp in refused_stakes(sf, windows, toBlock):
+    if (number, index) > indexer.fills.get(base_round(roundId), (number, index)):
+      indexer.refuse(roundId, timestamp)
+  return indexer, toBlock
+
+
+def submit(sf, owner, maxProfiles, firstNFree):
+  # setMaxProfiles needs profiles >= firstNFree and setFirstNFree needs n <= maxProfiles,
+  # so the setting that loosens the other one goes first
+  txs = []
+  if firstNFree > sf.maxProfiles():
+    txs.append(sf.setMaxProfiles(maxProfiles, {'from': owner}))
+  if firstNFree != sf.firstNFree():
+    txs.append(sf.setFirstNFree(firstNFree, {'from': owner}))
+  if maxProfiles != sf.maxProfiles():
+    txs.append(sf.setMaxProfiles(maxProfiles, {'from': owner}))
+  return txs
+
+
+def controller_params():
+  return dict(
+    alpha=float(os.environ.get('CAPACITY_ALPHA', 0.3)),
+    margin=float(os.environ.get('CAPACITY_MARGIN', 1.0)),
+    step=int(os.environ.get('CAPACITY_STEP', 5)),
+    freeShare=float(os.environ.get('CAPACITY_FREE_SHARE', 0.1)),
+  )
+
+
+def export():
+  from brownie import chain, stake2Follow
+
+  path = os.environ.get('CAPACITY_HISTORY', 'capacity.json')
+  indexer, lastBlock = read_history(stake2Follow[-1], int(os.environ.get('CAPACITY_FROM_BLOCK', 0)), step=5000)
+  history = indexer.history(chain.time())
+  save_history(history, path)
+  print('{} rounds to {}'.format(len(history), path))
+
+
+def run():
+  # follow the chain and set the next round's capacity once the current round closes
+  import time
+  from brownie import accounts, chain, stake2Follow, web3
+
+  sf = stake2Follow[-1]
+  owner = accounts.load(os.environ.get('CAPACITY_OWNER', 'sf_owner'))
+  interval = float(os.environ.get('CAPACITY_INTERVAL', 60))
+  controller = CapacityController(maximal=sf.MAXIMAL_PROFILES(), **controller_params())
+  indexer, lastBlock = read_history(sf, int(os.environ.get('CAPACITY_FROM_BLOCK', 0)), step=5000)
+  observed = -1
+  while True:
+    if web3.eth.block_number > lastBlock:
+      indexer, lastBlock = read_history(sf, lastBlock + 1, step=5000, indexer=indexer)
+    closed = [r for r in indexer.history(chain.time()) if r.roundId > observed]
+    for r in closed:
+      controller.observe(r)
+      observed = r.roundId
+    if closed:
+      maxProfiles, firstNFree = controller.propose(sf.maxProfiles(), sf.firstNFree(), sf.getMaxShards())
+      print('round {}: demand {:.1f}, next maxProfiles {} firstNFree {}'.format(
+        observed, demand(closed[-1]), maxProfiles, firstNFree))
+      submit(sf, owner, maxProfiles, firstNFree)
+    time.sleep(interval)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Backtest Stake2Follow capacity policies on round history')
+  parser.add_argument('history', help='JSON written by `brownie run capacity export`')
+  parser.add_argument('--alpha', type=float, nargs='+', default=[0.3])
+  parser.add_argument('--margin', type=float, nargs='+', default=[1.0])
+  parser.add_argument('--step', type=int, default=5)
+  parser.add_argument('--free-share', type=float, default=0.1)
+  parser.add_argument('--maximal', type=int, default=MAXIMAL_PROFILES)
+  args = parser.parse_args(argv)
+
+  history = load_history(args.history)
+  print_backtest(backtest(history, policy_grid(args.alpha, args.margin, args.step, args.free_share, args.maximal)))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,322 @@
+# Claim worker for Stake2Follow.
+# Follows the contract logs through the async client and feeds them to a
+# RoundIndexer, so winners come from ProfileQualify/ProfileExclude without any
+# round reads. Rounds are due when the latest block time crosses their settle
+# time (or the reveal deadline while a qualify commitment is pending), computed
+# locally from the schedule, getCurrentRound is never called. Every winner of a
+# due round is notified once. Opted-in profiles hand the worker their claim
+# signer: their claims are signed with locally tracked nonces and relayed in
+# relayClaims batches, sent with pipelined relayer nonces and a cap on the
+# batches in flight. Claims of a failed batch, or skipped by the contract in a
+# landed one, are retried.
+#
+#   CLAIM_RELAYER_KEY=0x... CLAIM_WEBHOOK_URL=https://... brownie run claim_worker
+
+import asyncio
+import heapq
+import json
+import os
+from collections import namedtuple
+
+import aiohttp
+from brownie import accounts, stake2Follow, web3
+from eth_account import Account
+from eth_utils import keccak
+
+from scripts.client import Stake2FollowClient, _decode, abi_type, connect
+from scripts.indexer import RoundIndexer
+from scripts.metrics import REGISTRY
+from scripts.relayer import claim_signature
+from scripts.rounds import config_dict
+
+Claim = namedtuple('Claim', ['roundId', 'profileIndex', 'profileId', 'amount', 'auto'])
+
+# gas budget of a relayClaims batch, fixed so pipelined batches skip eth_estimateGas
+RELAY_GAS = 50000
+CLAIM_GAS = 150000
+
+
+def event_decoders(abi):
+  # topic 0 => (event name, inputs)
+  decoders = {}
+  for item in abi:
+    if item['type'] == 'event':
+      signature = '{}({})'.format(item['name'], ','.join(abi_type(i) for i in item['inputs']))
+      decoders['0x' + keccak(text=signature).hex().replace('0x', '')] = (item['name'], item['inputs'])
+  return decoders
+
+
+def decode_log(decoders, log):
+  # (name, args) of a raw eth_getLogs entry, None for unknown topics
+  if not log['topics'] or log['topics'][0] not in decoders:
+    return None
+  name, inputs = decoders[log['topics'][0]]
+  indexed = [i for i in inputs if i.get('indexed')]
+  data = [i for i in inputs if not i.get('indexed')]
+  values = dict(zip(
+    [i['name'] for i in data],
+    _decode([abi_type(i) for i in data], bytes.fromhex(log['data'][2:]))
+  ))
+  for param, topic in zip(indexed, log['topics'][1:]):
+    values[param['name']] = _decode([abi_type(param)], bytes.fromhex(topic[2:]))[0]
+  return name, values
+
+
+class WebhookNotifier:
+  # posts each claim as JSON
+
+  def __init__(self, url):
+    self.url = url
+
+  async def __call__(self, claim):
+    async with aiohttp.ClientSession() as session:
+      async with session.post(self.url, json=claim._asdict()) as response:
+        response.raise_for_status()
+
+
+class ClaimWorker(RoundIndexer):
+
+  def __init__(self, client, config, relayer=None, notifiers=(), fromBlock=0, batchSize=20, concurrency=4,
+               deadline=3600, maxAttempts=3, registry=REGISTRY):
+    super().__init__(config)
+    self.client = client
+    # eth_account LocalAccount paying the relayClaims gas
+    self.relayer = relayer
+    self.notifiers = list(notifiers)
+    self.lastBlock = fromBlock - 1
+    self.batchSize = batchSize
+    self.concurrency = concurrency
+    self.deadline = deadline
+    self.maxAttempts = maxAttempts
+    self.decoders = event_decoders(client.abi)
+    # profileId => claim signer of opted-in profiles
+    self.signers = {}
+    # signer address => next claim nonce
+    self.signerNonces = {}
+    # (settle time, round key) of rounds not notified yet
+    self.due = []
+    self.scheduled = set()
+    self.notified = set()
+    # claims of opted-in profiles waiting for a relayClaims batch
+    self.queue = []
+    # (round key, profileId) => failed batches
+    self.attempts = {}
+    # (claim, notifier, failed attempts) to notify again on the next tick
+    self.unnotified = []
+    self.notifications = registry.counter('stake2follow_claim_notifications_total', 'Winners notified after settle')
+    self.notifyFailures = registry.counter('stake2follow_claim_notify_failures_total', 'Winner notifications that raised')
+    self.errors = registry.counter('stake2follow_claim_worker_errors_total', 'Worker ticks that raised')
+    self.relayed = registry.counter('stake2follow_relayed_claims_total', 'Claims sent in relayClaims batches')
+
+  @classmethod
+  async def from_client(cls, client, **kwargs):
+    config = config_dict(await client.getConfig())
+    config['ROUND_REVEAL_LENGTH'] = await client.ROUND_REVEAL_LENGTH()
+    return cls(client, config, **kwargs)
+
+  def opt_in(self, profileId, signer):
+    # `signer` is the profile address as a LocalAccount, created by accounts.add()
+    self.signers[profileId] = signer
+
+  def opt_out(self, profileId):
+    self.signers.pop(profileId, None)
+
+  def _on_ProfileStake(self, args):
+    if args['roundId'] not in self.scheduled:
+      self.scheduled.add(args['roundId'])
+      heapq.heappush(self.due, (self.schedule.settle_time(args['roundId']), args['roundId']))
+    super()._on_ProfileStake(args)
+
+  def _on_QualifyReveal(self, args):
+    super()._on_QualifyReveal(args)
+    # the round was waiting for the reveal deadline
+    heapq.heappush(self.due, (self.schedule.settle_time(args['roundId']), args['roundId']))
+
+  def _on_SetRevealLength(self, args):
+    super()._on_SetRevealLength(args)
+    self._reschedule()
+
+  def _on_ResetRoundDuration(self, args):
+    super()._on_ResetRoundDuration(args)
+    self._reschedule()
+
+  def _reschedule(self):
+    self.due = [(self.schedule.settle_time(roundId), roundId) for roundId in self.scheduled - self.notified]
+    heapq.heapify(self.due)
+
+  def due_rounds(self, now):
+    # round keys that crossed settle at `now`, each returned once
+    rounds = []
+    while self.due and self.due[0][0] < now:
+      settleTime, roundId = heapq.heappop(self.due)
+      if roundId in self.notified:
+        continue
+      if self.rounds[roundId].commitment is not None and now <= self.schedule.reveal_deadline(roundId):
+        # claims wait for the reveal
+        heapq.heappush(self.due, (self.schedule.reveal_deadline(roundId), roundId))
+        continue
+      self.notified.add(roundId)
+      rounds.append(roundId)
+    return rounds
+
+  def winners(self, roundId):
+    # [Claim] of the unclaimed winners of a round
+    claims = []
+    for profileIndex, profileId in enumerate(self.rounds[roundId].profiles):
+      if self.pending.get(profileId, {}).get(roundId) == profileIndex:
+        amount = self.claim_amount(roundId, profileId)
+        claims.append(Claim(roundId, profileIndex, profileId, amount, profileId in self.signers))
+    return claims
+
+  async def follow(self):
+    # apply the logs up to the latest block, returns its timestamp
+    block = await self.client.rpc('eth_getBlockByNumber', 'latest', False)
+    number = int(block['number'], 16)
+    if number > self.lastBlock:
+      logs = await self.client.rpc('eth_getLogs', {
+        'address': self.client.address,
+        'fromBlock': hex(self.lastBlock + 1),
+        'toBlock': hex(number),
+      })
+      for log in logs:
+        event = decode_log(self.decoders, log)
+        if event is not None:
+          self.apply(*event)
+      self.lastBlock = number
+    return int(block['timestamp'], 16)
+
+  async def tick(self):
+    # one pass: follow the chain, notify due winners, relay opted-in claims
+    now = await self.follow()
+    claims = [claim for roundId in self.due_rounds(now) for claim in self.winners(roundId)]
+    # relaying does not wait for the notifiers
+    self.queue.extend(claim for claim in claims if claim.auto)
+    await self.notify(claims)
+    receipts = await self.relay(now)
+    return claims, receipts
+
+  async def notify(self, claims):
+    # a failing notifier only misses its claim, which is retried on the next ticks
+    retries, self.unnotified = self.unnotified, []
+    for claim, notify, failures in retries + [(claim, notify, 0) for claim in claims for notify in self.notifiers]:
+      try:
+        await notify(claim)
+      except Exception:
+        self.notifyFailures.inc(auto=str(claim.auto).lower())
+        if failures + 1 < self.maxAttempts:
+          self.unnotified.append((claim, notify, failures + 1))
+        continue
+      self.notifications.inc(auto=str(claim.auto).lower())
+
+  async def run(self, interval=2):
+    # a failing tick (node down, bad response) is counted and the next one starts over
+    while True:
+      try:
+        await self.tick()
+      except Exception:
+        self.errors.inc()
+      await asyncio.sleep(interval)
+
+  async def signer_nonce(self, address):
+    if address not in self.signerNonces:
+      self.signerNonces[address] = await self.client.getNonce(address)
+    nonce = self.signerNonces[address]
+    self.signerNonces[address] += 1
+    return nonce
+
+  async def relay(self, now):
+    # relayClaims receipts of the queued claims
+    # a profile may have claimed itself meanwhile, or opted out
+    queue = [c for c in self.queue if c.roundId in self.pending.get(c.profileId, {}) and c.profileId in self.signers]
+    self.queue = []
+    if not queue or self.relayer is None:
+      return []
+
+    domainSeparator = await self.client.getDomainSeparator()
+    deadline = now + self.deadline
+    intents = []
+    for claim in queue:
+      signer = self.signers[claim.profileId]
+      nonce = await self.signer_nonce(signer.address)
+      signature = claim_signature(signer, domainSeparator, claim.roundId, claim.profileIndex, claim.profileId, nonce, deadline)
+      intents.append((claim.roundId, claim.profileIndex, claim.profileId, deadline, signature))
+
+    batches = [(queue[i:i + self.batchSize], intents[i:i + self.batchSize]) for i in range(0, len(intents), self.batchSize)]
+    # signer nonces run across batches, relayer nonces are taken in batch order so blocks keep that order
+    gasPrice = int(await self.client.rpc('eth_gasPrice'), 16)
+    nonces = [await self.client.next_nonce(self.relayer.address) for batch in batches]
+    inflight = asyncio.Semaphore(self.concurrency)
+
+    async def send(claims, batch, nonce):
+      async with inflight:
+        try:
+          txHash = await self.client.relayClaims(
+            batch,
+            account=self.relayer,
+            gas=RELAY_GAS + CLAIM_GAS * len(batch),
+            gasPrice=gasPrice,
+            nonce=nonce,
+          )
+          receipt = await self.client.wait_for_receipt(txHash)
+        except Exception:
+          receipt = None
+      if receipt is not None and int(receipt['status'], 16) == 1:
+        # the contract skips an invalid intent and lands the rest
+        skipped = self.skipped(receipt)
+        self.relayed.inc(len(batch) - len(skipped))
+        if skipped:
+          self.retry([claims[i] for i in skipped])
+        return receipt
+      self.retry(claims)
+      return receipt
+
+    receipts = await asyncio.gather(*(send(claims, batch, nonce) for (claims, batch), nonce in zip(batches, nonces)))
+    if any(receipt is None for receipt in receipts):
+      # a transaction that was never sent leaves a nonce gap, read the count again
+      self.client.nonces.pop(self.relayer.address, None)
+    return receipts
+
+  def skipped(self, receipt):
+    # batch indexes of the RelaySkip logs of a relayClaims receipt
+    events = filter(None, (decode_log(self.decoders, log) for log in receipt['logs']))
+    return [args['index'] for name, args in events if name == 'RelaySkip']
+
+  def retry(self, claims):
+    # failed or skipped claims did not use their signatures, so every later nonce is off
+    self.signerNonces.clear()
+    for claim in claims:
+      key = (claim.roundId, claim.profileId)
+      self.attempts[key] = self.attempts.get(key, 0) + 1
+      if self.attempts[key] < self.maxAttempts:
+        self.queue.append(claim)
+
+
+def load_signers(path):
+  # {profileId: private key} of opted-in profiles
+  with open(path) as f:
+    return {int(profileId): accounts.add(key) for profileId, key in json.load(f).items()}
+
+
+def main():
+  sf = stake2Follow[-1]
+  interval = float(os.environ.get('CLAIM_WORKER_INTERVAL', 2))
+
+  async def run():
+    client = Stake2FollowClient(connect(web3.provider.endpoint_uri), sf.address, sf.abi)
+    key = os.environ.get('CLAIM_RELAYER_KEY')
+    notifiers = [WebhookNotifier(os.environ['CLAIM_WEBHOOK_URL'])] if os.environ.get('CLAIM_WEBHOOK_URL') else []
+    worker = await ClaimWorker.from_client(
+      client,
+      relayer=Account.from_key(key) if key else None,
+      notifiers=notifiers,
+      fromBlock=int(os.environ.get('CLAIM_WORKER_FROM_BLOCK', 0)),
+    )
+    if os.environ.get('CLAIM_OPT_IN'):
+      for profileId, signer in load_signers(os.environ['CLAIM_OPT_IN']).items():
+        worker.opt_in(profileId, signer)
+    try:
+      await worker.run(interval)
+    finally:
+      await client.close()
+
+  asyncio.run(run())
@@ -0,0 +1,313 @@
+# Asyncio client for Stake2Follow.
+# Contract methods are generated from the compiled ABI. Requests go through
+# one pooled HTTP or WebSocket connection, calls issued in the same tick are
+# sent as one JSON-RPC batch, identical in-flight reads are coalesced and
+# getConfig/getCurrentRound are kept in a short TTL cache.
+
+import asyncio
+import itertools
+import json
+import time
+
+import aiohttp
+import eth_abi
+from eth_utils import keccak, to_checksum_address
+
+_encode = getattr(eth_abi, 'encode', None) or eth_abi.encode_abi
+_decode = getattr(eth_abi, 'decode', None) or eth_abi.decode_abi
+
+# read -> cache ttl in seconds
+DEFAULT_TTL = {
+  'getConfig': 30,
+  'getCurrentRound': 5,
+}
+
+
+class JsonRpcError(Exception):
+
+  def __init__(self, error):
+    super().__init__(error.get('message'))
+    self.code = error.get('code')
+    self.data = error.get('data')
+
+
+class HttpTransport:
+
+  def __init__(self, url, batchSize=100, batchDelay=0, connections=8):
+    self.url = url
+    self.batchSize = batchSize
+    self.batchDelay = batchDelay
+    self.connections = connections
+    self.session = None
+    self.queue = []
+    self.flushing = None
+    self.ids = itertools.count(1)
+
+  async def request(self, method, params):
+    future = asyncio.get_running_loop().create_future()
+    self.queue.append(({'jsonrpc': '2.0', 'id': next(self.ids), 'method': method, 'params': params}, future))
+    if self.flushing is None:
+      self.flushing = asyncio.ensure_future(self._flush())
+    return await future
+
+  async def _flush(self):
+    # let every request of this tick join the batch
+    await asyncio.sleep(self.batchDelay)
+    self.flushing = None
+    queue, self.queue = self.queue, []
+    for i in range(0, len(queue), self.batchSize):
+      asyncio.ensure_future(self._send(queue[i:i + self.batchSize]))
+
+  async def _send(self, batch):
+    try:
+      responses = await self._post([payload for payload, future in batch])
+    except Exception as e:
+      for payload, future in batch:
+        if not future.done():
+          future.set_exception(e)
+      return
+    _resolve(batch, responses)
+
+  async def _post(self, payloads):
+    if self.session is None:
+      self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.connections))
+    async with self.session.post(self.url, json=payloads) as response:
+      response.raise_for_status()
+      return await response.json(content_type=None)
+
+  async def close(self):
+    if self.session is not None:
+      await self.session.close()
+      self.session = None
+
+
+class WebSocketTransport(HttpTransport):
+
+  def __init__(self, url, batchSize=100, batchDelay=0):
+    super().__init__(url, batchSize, batchDelay)
+    self.ws = None
+    self.inflight = {}
+    self.reader = None
+
+  async def _send(self, batch):
+    try:
+      await self._connect()
+      for payload, future in batch:
+        self.inflight[payload['id']] = future
+      await self.ws.send_str(json.dumps([payload for payload, future in batch]))
+    except Exception as e:
+      for payload, future in batch:
+        self.inflight.pop(payload['id'], None)
+        if not future.done():
+          future.set_exception(e)
+
+  async def _connect(self):
+    if self.ws is None:
+      if self.session is None:
+        self.session = aiohttp.ClientSession()
+      self.ws = await self.session.ws_connect(self.url)
+      self.reader = asyncio.ensure_future(self._read())
+
+  async def _read(self):
+    async for message in self.ws:
+      responses = json.loads(message.data)
+      if isinstance(responses, dict):
+        responses = [responses]
+      for response in responses:
+        future = self.inflight.pop(response.get('id'), None)
+        if future is not None and not future.done():
+          _set_result(future, response)
+
+  async def close(self):
+    if self.reader is not None:
+      self.reader.cancel()
+    if self.ws is not None:
+      await self.ws.close()
+      self.ws = None
+    await super().close()
+
+
+def _set_result(future, response):
+  if 'error' in response:
+    future.set_exception(JsonRpcError(response['error']))
+  else:
+    future.set_result(response.get('result'))
+
+
+def _resolve(batch, responses):
+  if isinstance(responses, dict):
+    responses = [responses]
+  byId = {response.get('id'): response for response in responses}
+  for payload, future in batch:
+    response = byId.get(payload['id'])
+    if future.done():
+      continue
+    if response is None:
+      future.set_exception(JsonRpcError({'message': 'missing response for id {}'.format(payload['id'])}))
+    else:
+      _set_result(future, response)
+
+
+def connect(url, **kwargs):
+  if url.startswith('ws'):
+    return WebSocketTransport(url, **kwargs)
+  return HttpTransport(url, **kwargs)
+
+
+def abi_type(param):
+  if param['type'].startswith('tuple'):
+    return '({}){}'.format(','.join(abi_type(c) for c in param['components']), param['type'][5:])
+  return param['type']
+
+
+class ContractFunction:
+
+  def __init__(self, client, abi):
+    self.client = client
+    self.abi = abi
+    self.name = abi['name']
+    self.inputs = [abi_type(i) for i in abi['inputs']]
+    self.outputs = [abi_type(o) for o in abi.get('outputs', [])]
+    self.signature = '{}({})'.format(self.name, ','.join(self.inputs))
+    self.selector = keccak(text=self.signature)[:4]
+    self.view = abi.get('stateMutability') in ('view', 'pure')
+
+  def encode(self, args):
+    return '0x' + (self.selector + _encode(self.inputs, list(args))).hex()
+
+  def decode(self, data):
+    values = _decode(self.outputs, bytes.fromhex(data[2:]))
+    return values[0] if len(values) == 1 else tuple(values)
+
+  async def __call__(self, *args, **kwargs):
+    if self.view:
+      return await self.client.call(self, args, **kwargs)
+    return await self.client.transact(self, args, **kwargs)
+
+
+class Stake2FollowClient:
+
+  def __init__(self, transport, address, abi, ttl=None):
+    self.transport = transport
+    self.address = to_checksum_address(address)
+    self.abi = abi
+    self.ttl = dict(DEFAULT_TTL if ttl is None else ttl)
+    self.cache = {}
+    self.inflight = {}
+    self.nonces = {}
+    self.functions = {}
+    for item in abi:
+      if item['type'] == 'function':
+        self.functions[item['name']] = ContractFunction(self, item)
+
+  @classmethod
+  def from_artifact(cls, url, address, path, **kwargs):
+    # brownie build/contracts/*.json or hardhat artifacts/**/*.json
+    with open(path) as f:
+      abi = json.load(f)['abi']
+    return cls(connect(url), address, abi, **kwargs)
+
+  def __getattr__(self, name):
+    functions = self.__dict__.get('functions', {})
+    if name in functions:
+      return functions[name]
+    raise AttributeError(name)
+
+  async def rpc(self, method, *params):
+    return await self.transport.request(method, list(params))
+
+  async def call(self, fn, args, block='latest'):
+    key = (fn.name, tuple(args), block)
+    ttl = self.ttl.get(fn.name)
+    if ttl is not None and block == 'latest':
+      cached = self.cache.get(key)
+      if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    # identical reads share one request
+    if key not in self.inflight:
+      self.inflight[key] = asyncio.ensure_future(self._call(fn, args, block))
+    try:
+      value = await asyncio.shield(self.inflight[key])
+    finally:
+      if key in self.inflight and self.inflight[key].done():
+        del self.inflight[key]
+
+    if ttl is not None and block == 'latest':
+      self.cache[key] = (time.monotonic() + ttl, value)
+    return value
+
+  async def _call(self, fn, args, block):
+    data = await self.rpc('eth_call', {'to': self.address, 'data': fn.encode(args)}, block)
+    return fn.decode(data)
+
+  def invalidate(self, name=None):
+    if name is None:
+      self.cache.clear()
+    else:
+      self.cache = {key: value for key, value in self.cache.items() if key[0] != name}
+
+  async def transact(self, fn, args, sender=None, account=None, value=0, gas=None, gasPrice=None, nonce=None):
+    # `account` is an eth_account LocalAccount and signs locally,
+    # otherwise the node signs for the unlocked `sender`.
+    # `nonce` is one taken from next_nonce ahead, to fix the order of pipelined transactions
+    tx = {'to': self.address, 'data': fn.encode(args), 'value': value}
+    if account is not None:
+      sender = account.address
+    tx['from'] = to_checksum_address(sender)
+    if gas is None:
+      gas = int(await self.rpc('eth_estimateGas', _hex_tx(tx)), 16)
+    tx['gas'] = gas
+
+    if account is None:
+      return await self.rpc('eth_sendTransaction', _hex_tx(tx))
+
+    if gasPrice is None:
+      gasPrice = int(await self.rpc('eth_gasPrice'), 16)
+    tx['gasPrice'] = gasPrice
+    tx['nonce'] = await self.next_nonce(tx['from']) if nonce is None else nonce
+    tx['chainId'] = int(await self.rpc('eth_chainId'), 16)
+    del tx['from']
+    signed = account.sign_transaction(tx)
+    # eth-account >= 0.13 renamed rawTransaction, and its HexBytes.hex() drops the 0x
+    raw = getattr(signed, 'raw_transaction', None) or signed.rawTransaction
+    try:
+      return await self.rpc('eth_sendRawTransaction', '0x' + bytes(raw).hex())
+    except Exception:
+      self.release_nonce(account.address, tx['nonce'])
+      raise
+
+  async def next_nonce(self, sender):
+    # nonces are tracked locally so transactions can be pipelined
+    if sender not in self.nonces:
+      count = int(await self.rpc('eth_getTransactionCount', sender, 'pending'), 16)
+      # concurrent first calls must not hand out the same nonce twice
+      self.nonces.setdefault(sender, count)
+    nonce = self.nonces[sender]
+    self.nonces[sender] += 1
+    return nonce
+
+  def release_nonce(self, sender, nonce):
+    # a nonce that never reached the node is handed out again, unless later
+    # ones are already out, then the count is read from the node again
+    if self.nonces.get(sender) == nonce + 1:
+      self.nonces[sender] = nonce
+    else:
+      self.nonces.pop(sender, None)
+
+  async def wait_for_receipt(self, txHash, poll=0.1, timeout=120):
+    deadline = time.monotonic() + timeout
+    while True:
+      receipt = await self.rpc('eth_getTransactionReceipt', txHash)
+      if receipt is not None:
+        return receipt
+      if time.monotonic() > deadline:
+        raise TimeoutError(txHash)
+      await asyncio.sleep(poll)
+
+  async def close(self):
+    await self.transport.close()
+
+
+def _hex_tx(tx):
+  return {key: hex(value) if isinstance(value, int) else value for key, value in tx.items()}
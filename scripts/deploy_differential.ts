@@ -0,0 +1,32 @@
+import { ethers, upgrades } from "hardhat";
+
+// Deployment of the hardhat stack for scripts/differential.py,
+// parameters come in DIFFERENTIAL_DEPLOY as JSON of decimal strings
+async function main() {
+  const params = JSON.parse(process.env.DIFFERENTIAL_DEPLOY || '{}');
+  const signers = await ethers.getSigners();
+
+  const Token = await ethers.getContractFactory("Token");
+  const token = await Token.deploy('Wrapped Matic', 'wMATIC', 18, params.supply);
+  await token.deployed();
+
+  const Stake2Follow = await ethers.getContractFactory("Stake2Follow");
+  const sf = await upgrades.deployProxy(Stake2Follow, [
+    params.stakeValue,
+    params.gasFee,
+    params.rewardFee,
+    params.maxProfiles,
+    token.address,
+    signers[Number(params.app)].address,
+    signers[Number(params.wallet)].address
+  ]);
+  await sf.deployed();
+
+  const implementation = await upgrades.erc1967.getImplementationAddress(sf.address);
+  console.log('DIFFERENTIAL ' + JSON.stringify({ sf: sf.address, currency: token.address, implementation }));
+}
+
+main().catch((error) => {
+  console.error(error);
+  process.exitCode = 1;
+});
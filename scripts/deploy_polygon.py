@@ -2,10 +2,14 @@
 from brownie import stake2Follow, accounts
 from brownie import Contract
 import json
+import os
 
 
 def deploy():
   wMaticAddress = '0x0d500B1d8E8eF31E21C99d1Db9A6444d3ADf1270'
+  # STAKE_NATIVE=1 deploys a pool staked in MATIC itself, no wrap and approve
+  if os.environ.get('STAKE_NATIVE'):
+    wMaticAddress = '0x0000000000000000000000000000000000000000'
 
   # hub and sig
   accounts.load('sf_owner')
@@ -0,0 +1,428 @@
+# Differential runner for the two build stacks.
+# A scenario (JSON or YAML) is a list of steps run on both: the brownie build
+# deployed directly on ganache, as the tests do, and the hardhat build deployed
+# behind an OpenZeppelin proxy on a hardhat node. Each step records status,
+# revert reason, events, currency balances and gas. The stacks must agree on
+# everything but gas, which is reported per step and can be checked against a
+# saved baseline. Scenarios are spread over worker processes, each with its own
+# pair of nodes reverted to a snapshot before every scenario.
+#
+#   python -m scripts.differential tests/scenarios/*.json --workers 4
+
+import argparse
+import json
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import util
+
+from web3 import Web3
+
+from scripts.client import JsonRpcError, _encode, abi_type
+from scripts.preflight import revert_reason
+from scripts.rounds import RoundSchedule, config_dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# same node settings brownie uses for its development network
+GANACHE_CMD = 'ganache-cli --accounts 10 --hardfork istanbul --gasLimit 12000000 --mnemonic brownie --port {port}'
+HARDHAT_CMD = 'npx hardhat node --port {port}'
+
+# same as the tests fixture: owner 0, profiles 1-7, app 8, wallet 9
+DEFAULT_DEPLOY = {
+  'stakeValue': 1000,
+  'gasFee': 50,
+  'rewardFee': 100,
+  'maxProfiles': 5,
+  'supply': 10 ** 24,
+  'fund': 10 ** 5,
+  'app': 8,
+  'wallet': 9,
+}
+PROFILE_ACCOUNTS = range(1, 8)
+
+STEP_KINDS = ('call', 'view', 'sleep', 'advance')
+
+# schedule point of a round -> first second it holds
+ADVANCE_POINTS = {
+  'open': lambda schedule, roundId: schedule.start_time(roundId) + 1,
+  'freeze': lambda schedule, roundId: schedule.freeze_time(roundId),
+  'settle': lambda schedule, roundId: schedule.settle_time(roundId) + 1,
+  'reveal': lambda schedule, roundId: schedule.reveal_deadline(roundId) + 1,
+  'next': lambda schedule, roundId: schedule.start_time(roundId) + schedule.gapLength + 1,
+}
+
+
+def load_scenario(path):
+  with open(path) as f:
+    if path.endswith(('.yaml', '.yml')):
+      import yaml
+      scenario = yaml.safe_load(f)
+    else:
+      scenario = json.load(f)
+  scenario.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+  scenario['deploy'] = dict(DEFAULT_DEPLOY, **scenario.get('deploy', {}))
+  for i, step in enumerate(scenario['steps']):
+    kinds = [kind for kind in STEP_KINDS if kind in step]
+    if len(kinds) != 1:
+      raise ValueError('{} step {}: expected one of {}'.format(scenario['name'], i, ', '.join(STEP_KINDS)))
+    if step.get('advance', 'open') not in ADVANCE_POINTS:
+      raise ValueError('{} step {}: unknown advance point {}'.format(scenario['name'], i, step['advance']))
+  return scenario
+
+
+def resolve(value, names):
+  # "$name" -> address or captured value,
+  # {"keccak": [types, values]} -> keccak256(abi.encode(values)), e.g. a qualify commitment
+  if isinstance(value, str) and value.startswith('$'):
+    return names[value[1:]]
+  if isinstance(value, dict) and 'keccak' in value:
+    types, values = value['keccak']
+    values = [bytes.fromhex(v[2:]) if t.startswith('bytes') and isinstance(v, str) else v for t, v in zip(types, resolve(values, names))]
+    return Web3.keccak(_encode(types, values))
+  if isinstance(value, (list, tuple)):
+    return [resolve(v, names) for v in value]
+  return value
+
+
+def normalize(value, labels):
+  # addresses -> names, bytes -> hex, tuples -> lists, so both stacks compare equal
+  if isinstance(value, str) and value.lower() in labels:
+    return labels[value.lower()]
+  if isinstance(value, (bytes, bytearray)):
+    return '0x' + bytes(value).hex()
+  if isinstance(value, (list, tuple)):
+    return [normalize(v, labels) for v in value]
+  if isinstance(value, dict):
+    return {k: normalize(v, labels) for k, v in value.items()}
+  return value
+
+
+def compare(a, b, ignore=()):
+  # fields of two step outcomes that differ, gas aside
+  return sorted(k for k in set(a) | set(b) if k != 'gas' and k not in ignore and a.get(k) != b.get(k))
+
+
+def call_reason(error):
+  # revert string of a failed web3 call, whichever way the node reports it
+  if error.args and isinstance(error.args[0], dict):
+    return revert_reason(JsonRpcError(error.args[0]))
+  message = str(error)
+  if "reason string '" in message:
+    return message.split("reason string '", 1)[1].rstrip("'")
+  for marker in ('reverted: ', 'revert '):
+    if marker in message:
+      return message.split(marker, 1)[1]
+  return message
+
+
+def free_port():
+  with socket.socket() as s:
+    s.bind(('127.0.0.1', 0))
+    return s.getsockname()[1]
+
+
+def load_artifact(path):
+  with open(path) as f:
+    artifact = json.load(f)
+  return artifact['abi'], artifact['bytecode']
+
+
+class Stack(ABC):
+  # one toolchain: its node, its deployment and the address labels
+
+  def __init__(self, name, command):
+    self.name = name
+    self.port = free_port()
+    self.url = 'http://127.0.0.1:{}'.format(self.port)
+    self.process = subprocess.Popen(
+      shlex.split(command.format(port=self.port)),
+      cwd=ROOT,
+      stdout=subprocess.DEVNULL,
+      stderr=subprocess.DEVNULL,
+    )
+    self.w3 = Web3(Web3.HTTPProvider(self.url))
+    deadline = time.time() + 60
+    while not self.w3.isConnected():
+      if time.time() > deadline or self.process.poll() is not None:
+        raise RuntimeError('{} node did not start on {}'.format(name, self.url))
+      time.sleep(0.5)
+    self.accounts = self.w3.eth.accounts
+    self.deployKey = None
+    self.snapshot = None
+    # state before any deployment
+    self.clean = self.rpc('evm_snapshot', [])
+
+  def stop(self):
+    self.process.terminate()
+
+  def rpc(self, method, params):
+    response = self.w3.provider.make_request(method, params)
+    if 'error' in response:
+      raise JsonRpcError(response['error'])
+    return response['result']
+
+  def send(self, fn, sender, value=0):
+    txHash = fn.transact({'from': sender, 'value': value})
+    return self.w3.eth.wait_for_transaction_receipt(txHash)
+
+  def prepare(self, deploy):
+    # fresh deployment, or back to the snapshot taken right after the same one
+    key = json.dumps(deploy, sort_keys=True)
+    if key == self.deployKey:
+      self.rpc('evm_revert', [self.snapshot])
+    else:
+      # a revert drops the snapshot, take it again
+      self.rpc('evm_revert', [self.clean])
+      self.clean = self.rpc('evm_snapshot', [])
+      self.deploy(deploy)
+      owner = self.accounts[0]
+      for i in PROFILE_ACCOUNTS:
+        self.send(self.currency.functions.transfer(self.accounts[i], deploy['fund']), owner)
+        self.send(self.currency.functions.approve(self.sf.address, deploy['fund']), self.accounts[i])
+      self.deployKey = key
+    self.snapshot = self.rpc('evm_snapshot', [])
+
+    self.names = {'account{}'.format(i): a for i, a in enumerate(self.accounts)}
+    self.names.update(owner=self.accounts[0], app=self.accounts[deploy['app']], wallet=self.accounts[deploy['wallet']])
+    self.names.update(sf=self.sf.address, currency=self.currency.address)
+    self.labels = {a.lower(): 'account{}'.format(i) for i, a in enumerate(self.accounts)}
+    self.labels.update({self.sf.address.lower(): 'sf', self.currency.address.lower(): 'currency'})
+    self.tracked = [self.sf.address] + list(self.accounts)
+    # (emitter, topic 0) => (emitter label, event)
+    self.decoders = {}
+    for contract, label in ((self.sf, 'sf'), (self.currency, 'currency')):
+      for item in contract.abi:
+        if item['type'] == 'event':
+          signature = '{}({})'.format(item['name'], ','.join(abi_type(i) for i in item['inputs']))
+          self.decoders[(contract.address.lower(), Web3.keccak(text=signature).hex())] = (label, contract.events[item['name']]())
+
+  @abstractmethod
+  def deploy(self, deploy):
+    # each stack deploys its own build here and sets self.currency and self.sf
+    pass
+
+  def now(self):
+    return self.w3.eth.get_block('latest')['timestamp']
+
+  def schedule(self):
+    config = config_dict(self.sf.functions.getConfig().call())
+    config['ROUND_REVEAL_LENGTH'] = self.sf.functions.ROUND_REVEAL_LENGTH().call()
+    return RoundSchedule.from_config(config)
+
+  def sleep(self, seconds):
+    if seconds > 0:
+      self.rpc('evm_increaseTime', [seconds])
+    self.rpc('evm_mine', [])
+
+  def balances(self):
+    return {self.labels[a.lower()]: self.currency.functions.balanceOf(a).call() for a in self.tracked}
+
+  def events(self, receipt):
+    # [emitter, name, args] in log order
+    events = []
+    for log in receipt['logs']:
+      if not log['topics']:
+        continue
+      decoder = self.decoders.get((log['address'].lower(), log['topics'][0].hex()))
+      if decoder is not None:
+        label, event = decoder
+        decoded = event.processLog(log)
+        events.append([label, decoded['event'], normalize(dict(decoded['args']), self.labels)])
+    return events
+
+  def run_step(self, step, names):
+    # outcome of one step, names collects the values captured with "as"
+    if 'sleep' in step:
+      self.sleep(resolve(step['sleep'], names))
+      return {}
+    if 'advance' in step:
+      roundId = resolve(step.get('round', '$round'), names)
+      self.sleep(ADVANCE_POINTS[step['advance']](self.schedule(), roundId) - self.now())
+      return {}
+
+    contract = self.currency if step.get('to') == 'currency' else self.sf
+    name = step['call'] if 'call' in step else step['view']
+    fn = contract.functions[name](*resolve(step.get('args', []), names))
+    sender = resolve(step.get('from', '$owner'), names)
+
+    if 'view' in step:
+      result = fn.call({'from': sender})
+      if 'as' in step:
+        names[step['as']] = result[step['index']] if 'index' in step else result
+      return {'result': normalize(result, self.labels)}
+
+    value = step.get('value', 0)
+    try:
+      fn.call({'from': sender, 'value': value})
+    except ValueError as e:
+      return {'status': 'revert', 'reason': call_reason(e), 'balances': self.balances()}
+    receipt = self.send(fn, sender, value)
+    return {
+      'status': 'ok' if receipt['status'] == 1 else 'revert',
+      'events': self.events(receipt),
+      'balances': self.balances(),
+      'gas': receipt['gasUsed'],
+    }
+
+  def run(self, scenario):
+    self.prepare(scenario['deploy'])
+    names = dict(self.names)
+    return [self.run_step(step, names) for step in scenario['steps']]
+
+
+class BrownieStack(Stack):
+  # brownie build, implementation deployed and initialized directly
+
+  def deploy(self, deploy):
+    owner = self.accounts[0]
+    abi, bytecode = load_artifact(os.path.join(ROOT, 'build', 'contracts', 'Token.json'))
+    receipt = self.send(self.w3.eth.contract(abi=abi, bytecode=bytecode).constructor('Wrapped Matic', 'wMATIC', 18, deploy['supply']), owner)
+    self.currency = self.w3.eth.contract(address=receipt['contractAddress'], abi=abi)
+
+    abi, bytecode = load_artifact(os.path.join(ROOT, 'build', 'contracts', 'Stake2Follow.json'))
+    receipt = self.send(self.w3.eth.contract(abi=abi, bytecode=bytecode).constructor(), owner)
+    self.sf = self.w3.eth.contract(address=receipt['contractAddress'], abi=abi)
+    self.send(self.sf.functions.initialize(
+      deploy['stakeValue'],
+      deploy['gasFee'],
+      deploy['rewardFee'],
+      deploy['maxProfiles'],
+      self.currency.address,
+      self.accounts[deploy['app']],
+      self.accounts[deploy['wallet']],
+    ), owner)
+
+
+class HardhatStack(Stack):
+  # hardhat build behind the OpenZeppelin upgrades proxy, see deploy_differential.ts
+
+  def deploy(self, deploy):
+    output = subprocess.run(
+      ['npx', 'hardhat', 'run', 'scripts/deploy_differential.ts', '--network', 'differential'],
+      cwd=ROOT,
+      env=dict(os.environ, DIFFERENTIAL_URL=self.url, DIFFERENTIAL_DEPLOY=json.dumps({k: str(v) for k, v in deploy.items()})),
+      capture_output=True,
+      text=True,
+      check=True,
+    ).stdout
+    addresses = json.loads(next(line for line in output.splitlines() if line.startswith('DIFFERENTIAL '))[len('DIFFERENTIAL '):])
+    artifacts = os.path.join(ROOT, 'artifacts', 'contracts')
+    abi, bytecode = load_artifact(os.path.join(artifacts, 'Token.sol', 'Token.json'))
+    self.currency = self.w3.eth.contract(address=addresses['currency'], abi=abi)
+    abi, bytecode = load_artifact(os.path.join(artifacts, 'Stake2Follow.sol', 'Stake2Follow.json'))
+    self.sf = self.w3.eth.contract(address=addresses['sf'], abi=abi)
+
+
+# nodes of the current worker process
+_stacks = None
+
+
+def _start_worker(ganacheCmd, hardhatCmd):
+  global _stacks
+  _stacks = [BrownieStack('brownie', ganacheCmd), HardhatStack('hardhat', hardhatCmd)]
+  # multiprocessing workers skip atexit, finalizers still run
+  util.Finalize(None, _stop_worker, exitpriority=10)
+
+
+def _stop_worker():
+  for stack in _stacks:
+    stack.stop()
+
+
+def run_scenario(path):
+  scenario = load_scenario(path)
+  outcomes = {stack.name: stack.run(scenario) for stack in _stacks}
+  return report(scenario, outcomes)
+
+
+def report(scenario, outcomes):
+  # {'name', 'ok', 'steps': [{'step', 'diff', 'gas', 'outcomes'}]}, outcomes by stack name
+  steps = []
+  ok = True
+  for i, step in enumerate(scenario['steps']):
+    stepOutcomes = {name: o[i] for name, o in outcomes.items()}
+    a, b = [stepOutcomes[name] for name in sorted(stepOutcomes)]
+    diff = compare(a, b, step.get('ignore', ()))
+    if 'revert' in step and any(o.get('reason') != step['revert'] for o in stepOutcomes.values()):
+      # the scenario expects this revert string on both stacks
+      diff.append('reason')
+    ok = ok and not diff
+    steps.append({
+      'step': i,
+      'diff': sorted(set(diff)),
+      'gas': {name: o['gas'] for name, o in stepOutcomes.items() if o.get('gas') is not None},
+      'outcomes': stepOutcomes,
+    })
+  return {'name': scenario['name'], 'ok': ok, 'steps': steps}
+
+
+def gas_table(reports):
+  # scenario => step => stack => gas used
+  return {r['name']: {str(s['step']): s['gas'] for s in r['steps'] if s['gas']} for r in reports}
+
+
+def gas_regressions(reports, baseline, tolerance):
+  # [(scenario, step, stack, before, after)] that grew by more than `tolerance`
+  regressions = []
+  for name, steps in gas_table(reports).items():
+    for step, gas in steps.items():
+      for stack, used in gas.items():
+        before = baseline.get(name, {}).get(step, {}).get(stack)
+        if before is not None and used > before * (1 + tolerance):
+          regressions.append((name, int(step), stack, before, used))
+  return regressions
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Run scenarios on the brownie and hardhat stacks and compare them')
+  parser.add_argument('scenarios', nargs='+')
+  parser.add_argument('--workers', type=int, default=os.cpu_count())
+  parser.add_argument('--no-compile', action='store_true')
+  parser.add_argument('--ganache', default=os.environ.get('DIFFERENTIAL_GANACHE', GANACHE_CMD))
+  parser.add_argument('--hardhat', default=os.environ.get('DIFFERENTIAL_HARDHAT', HARDHAT_CMD))
+  parser.add_argument('--save-gas', help='write gas per step to this file')
+  parser.add_argument('--gas-baseline', help='fail on steps using more gas than in this file')
+  parser.add_argument('--gas-tolerance', type=float, default=0.0)
+  args = parser.parse_args(argv)
+
+  if not args.no_compile:
+    # once here, workers would race on the build directories
+    subprocess.run(['brownie', 'compile'], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(['npx', 'hardhat', 'compile'], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+
+  workers = max(1, min(args.workers, len(args.scenarios)))
+  with ProcessPoolExecutor(workers, initializer=_start_worker, initargs=(args.ganache, args.hardhat)) as pool:
+    reports = list(pool.map(run_scenario, args.scenarios))
+
+  failed = False
+  for r in reports:
+    print('{} {}'.format('ok  ' if r['ok'] else 'FAIL', r['name']))
+    for s in r['steps']:
+      if s['diff']:
+        failed = True
+        print('  step {}: {} differ'.format(s['step'], ', '.join(s['diff'])))
+        for field in s['diff']:
+          print('    {}: {}'.format(field, ', '.join('{}={}'.format(name, o.get(field)) for name, o in sorted(s['outcomes'].items()))))
+      if s['gas']:
+        print('  step {} gas: {}'.format(s['step'], ', '.join('{} {}'.format(k, v) for k, v in sorted(s['gas'].items()))))
+
+  if args.gas_baseline:
+    with open(args.gas_baseline) as f:
+      baseline = json.load(f)
+    for name, step, stack, before, after in gas_regressions(reports, baseline, args.gas_tolerance):
+      failed = True
+      print('gas regression {} step {} on {}: {} -> {}'.format(name, step, stack, before, after))
+  if args.save_gas:
+    with open(args.save_gas, 'w') as f:
+      json.dump(gas_table(reports), f, indent=2, sort_keys=True)
+  return 1 if failed else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,188 @@
+# Prometheus exporter for Stake2Follow.
+# Each poll applies only the events since the last polled block and makes three
+# view calls (getConfig, getCurrentRound, currency balance), so a scrape just
+# renders the registry. Per-round series are kept for the last `window` rounds.
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from brownie import web3, stake2Follow
+from scripts.client import abi_type
+from scripts.indexer import RoundIndexer, contract_config, fetch_events
+from scripts.metrics import REGISTRY
+from scripts.replay import pool_balance
+from scripts.rounds import RoundSchedule, base_round, claim_value, config_dict, shard_of
+
+
+class Exporter(RoundIndexer):
+
+  def __init__(self, sf, registry=REGISTRY, window=24, step=None):
+    super().__init__(contract_config(sf))
+    self.sf = sf
+    self.window = window
+    self.step = step
+    self.lastBlock = -1
+    self.block = None
+    self.blockTimes = {}
+    self.lock = threading.Lock()
+    # roundId => unclaimed rewards of its winners
+    self.liability = {}
+    # rounds with per-round series
+    self.labeled = set()
+    self.currency = sf.currency()
+    self.selectors = {}
+    for item in sf.abi:
+      if item['type'] == 'function':
+        signature = '{}({})'.format(item['name'], ','.join(abi_type(i) for i in item['inputs']))
+        self.selectors[web3.keccak(text=signature).hex()[:10]] = item['name']
+
+    self.stakes = registry.gauge('stake2follow_round_stakes', 'Profiles staked in the round')
+    self.fillRatio = registry.gauge('stake2follow_round_fill_ratio', 'Profiles staked over maxProfiles')
+    self.qualifyRate = registry.gauge('stake2follow_round_qualify_rate', 'Winners over profiles staked')
+    self.stakesTotal = registry.counter('stake2follow_stakes_total', 'Profiles staked')
+    self.claimsTotal = registry.counter('stake2follow_claims_total', 'Rewards claimed')
+    self.claimLatency = registry.counter('stake2follow_claim_latency_seconds_sum', 'Seconds from settle to claim, summed')
+    self.claimLatencyCount = registry.counter('stake2follow_claim_latency_seconds_count', 'Claims in the latency sum')
+    self.unclaimed = registry.gauge('stake2follow_unclaimed_liability', 'Rewards owed to winners not claimed yet')
+    self.stakeFees = registry.counter('stake2follow_stake_fees_total', 'Stake fees paid to the wallet')
+    self.platformFees = registry.counter('stake2follow_platform_fees_total', 'Platform fees withdrawn')
+    self.gasUsed = registry.counter('stake2follow_gas_used_total', 'Gas used by transactions with contract events')
+    self.transactions = registry.counter('stake2follow_transactions_total', 'Transactions with contract events')
+    self.balance = registry.gauge('stake2follow_contract_balance', 'Currency held by the contract')
+    self.currentRound = registry.gauge('stake2follow_current_round', 'Current round id')
+    self.maxProfiles = registry.gauge('stake2follow_max_profiles', 'Configured maxProfiles')
+    self.lastBlockGauge = registry.gauge('stake2follow_exporter_last_block', 'Last block applied by the exporter')
+
+  def poll(self):
+    toBlock = web3.eth.block_number
+    with self.lock:
+      if toBlock > self.lastBlock:
+        logs = fetch_events(self.sf, self.lastBlock + 1, toBlock, step=self.step)
+        for log in logs:
+          self.block = log['blockNumber']
+          self.apply(log['event'], dict(log['args']))
+        self.record_gas(logs)
+        self.lastBlock = toBlock
+        self.lastBlockGauge.set(toBlock)
+      self.refresh_views()
+
+  def refresh_views(self):
+    self.config.update(config_dict(self.sf.getConfig()))
+    self.schedule = RoundSchedule.from_config(self.config)
+    roundId, startTime = self.sf.getCurrentRound()
+    self.currentRound.set(roundId)
+    self.maxProfiles.set(self.config['maxProfiles'])
+    self.balance.set(pool_balance(self.sf.address, self.currency))
+
+    # drop per-round series that left the window
+    for roundKey in [r for r in self.labeled if base_round(r) + self.window < roundId]:
+      labels = self.labels(roundKey)
+      for metric in (self.stakes, self.fillRatio, self.qualifyRate):
+        metric.remove(**labels)
+      self.labeled.discard(roundKey)
+
+  def record_gas(self, logs):
+    # one receipt per transaction, however many events it emitted
+    seen = set()
+    for log in logs:
+      txHash = log['transactionHash']
+      if txHash in seen:
+        continue
+      seen.add(txHash)
+      receipt = web3.eth.get_transaction_receipt(txHash)
+      tx = web3.eth.get_transaction(txHash)
+      name = self.selectors.get(web3.toHex(tx['input'])[:10], 'unknown')
+      self.gasUsed.inc(receipt['gasUsed'], function=name)
+      self.transactions.inc(function=name)
+
+  def block_time(self, blockNumber):
+    if blockNumber not in self.blockTimes:
+      self.blockTimes[blockNumber] = web3.eth.get_block(blockNumber)['timestamp']
+    return self.blockTimes[blockNumber]
+
+  def labels(self, roundKey):
+    return {'round': base_round(roundKey), 'shard': shard_of(roundKey)}
+
+  def update_round(self, roundKey):
+    state = self.rounds[roundKey]
+    profileNum = len(state.profiles)
+    labels = self.labels(roundKey)
+    self.labeled.add(roundKey)
+    self.stakes.set(profileNum, **labels)
+    self.fillRatio.set(profileNum / self.config['maxProfiles'], **labels)
+    self.qualifyRate.set(state.qualifyNum / profileNum if profileNum else 0, **labels)
+
+    owed = 0
+    for profileId in state.profiles:
+      if roundKey in self.pending.get(profileId, {}):
+        owed += claim_value(self.config, profileNum, state.qualifyNum, state.shares, state.invites.get(profileId, 0))
+    self.unclaimed.set(self.unclaimed.get() + owed - self.liability.get(roundKey, 0))
+    self.liability[roundKey] = owed
+
+  def _on_ProfileStake(self, args):
+    super()._on_ProfileStake(args)
+    self.stakesTotal.inc()
+    self.stakeFees.inc(args['fees'])
+    self.update_round(args['roundId'])
+
+  def _on_ProfileQualify(self, args):
+    super()._on_ProfileQualify(args)
+    self.update_round(args['roundId'])
+
+  def _on_ProfileExclude(self, args):
+    super()._on_ProfileExclude(args)
+    self.update_round(args['roundId'])
+
+  def _on_ProfileClaim(self, args):
+    super()._on_ProfileClaim(args)
+    self.claimsTotal.inc()
+    if self.block is not None:
+      self.claimLatency.inc(max(0, self.block_time(self.block) - self.schedule.settle_time(args['roundId'])))
+      self.claimLatencyCount.inc()
+    self.update_round(args['roundId'])
+
+  def _on_WithdrawRoundFee(self, args):
+    super()._on_WithdrawRoundFee(args)
+    self.platformFees.inc(args['fee'])
+
+  def _on_WithdrawFees(self, args):
+    super()._on_WithdrawFees(args)
+    self.platformFees.inc(args['fee'])
+
+
+def serve(exporter, registry=REGISTRY, port=9108):
+  # /metrics on a background thread, rendered under the poll lock
+
+  class Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+      if self.path != '/metrics':
+        self.send_error(404)
+        return
+      with exporter.lock:
+        body = registry.render().encode()
+      self.send_response(200)
+      self.send_header('Content-Type', 'text/plain; version=0.0.4')
+      self.send_header('Content-Length', str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    def log_message(self, format, *args):
+      pass
+
+  server = ThreadingHTTPServer(('', port), Handler)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server
+
+
+def main():
+  exporter = Exporter(stake2Follow[-1], step=5000)
+  port = int(os.environ.get('EXPORTER_PORT', 9108))
+  interval = float(os.environ.get('EXPORTER_INTERVAL', 15))
+  serve(exporter, port=port)
+  print('serving metrics on :{}/metrics'.format(port))
+  while True:
+    exporter.poll()
+    time.sleep(interval)
@@ -0,0 +1,285 @@
+# Fee rounding audit for Stake2Follow.
+# Three fee formulas truncate differently: stake fees are (stakeValue / 1000) *
+# gasFee, profileClaim holds back reward * rewardFee / 1000 for the platform and
+# withdrawRoundFee pays out (reward / 1000) * rewardFee. Whatever the winners'
+# claims and the round fee leave behind stays in the contract for good.
+#
+# audit_case works out the flows of one round with the same integer math as
+# the contract (scripts/rounds.py). screen runs it over random cases, which is
+# fast enough for millions of rounds, and search lets hypothesis steer towards
+# the cases stranding the most. spot_check plays a case on a development chain
+# and compares the contract balance left behind.
+#
+#   python -m scripts.fee_audit --cases 1000000 --search 2000
+#   brownie run fee_audit spot
+
+import argparse
+import heapq
+import random
+from collections import Counter, namedtuple
+
+from scripts.rounds import claim_value, round_fee
+
+# one round: the config it runs under, its size and the invite counts of the
+# winners that invited someone (the other winners have none)
+Case = namedtuple('Case', [
+  'stakeValue',
+  'gasFee',
+  'rewardFee',
+  'inviteFee',
+  'firstNFree',
+  'profileNum',
+  'qualifyNum',
+  'inviters',
+])
+
+# staked: stakes held for the round, claims: paid to each winner (inviters
+# first), roundFee: paid by withdrawRoundFee, stranded: left in the contract,
+# feeGap: held back by the claims but not paid as round fee, feeShortfall: stake
+# fees not charged against stakeValue * gasFee / 1000
+Flows = namedtuple('Flows', ['staked', 'claims', 'roundFee', 'stranded', 'feeGap', 'feeShortfall'])
+
+MAX_PROFILES = 50
+
+
+def case_config(case):
+  return {
+    'stakeValue': case.stakeValue,
+    'gasFee': case.gasFee,
+    'rewardFee': case.rewardFee,
+    'inviteFee': case.inviteFee,
+    'firstNFree': case.firstNFree,
+  }
+
+
+def audit_case(case):
+  config = case_config(case)
+  profileNum = case.profileNum
+  qualifyNum = case.qualifyNum
+  shares = sum(case.inviters)
+  # winners with the same invite count are paid the same
+  counts = Counter(case.inviters)
+  counts[0] += qualifyNum - len(case.inviters)
+  values = {n: claim_value(config, profileNum, qualifyNum, shares, n) for n in counts}
+  claims = tuple(values[n] for n in case.inviters) + (values[0],) * counts[0]
+
+  staked = case.stakeValue * profileNum
+  fee = round_fee(config, profileNum, qualifyNum)
+  reward = case.stakeValue * (profileNum - qualifyNum)
+  feeGap = reward * case.rewardFee // 1000 - fee
+  feePayers = max(0, profileNum - case.firstNFree)
+  feeShortfall = feePayers * (case.stakeValue * case.gasFee // 1000 - (case.stakeValue // 1000) * case.gasFee)
+  return Flows(staked, claims, fee, staked - sum(claims) - fee, feeGap, feeShortfall)
+
+
+def ppm(amount, total):
+  return amount * 10 ** 6 // total if total else 0
+
+
+def stake_value(rng):
+  # whole units of 0, 6 and 18 decimal tokens, odd values, and values just off 1000
+  kind = rng.randrange(3)
+  if kind == 0:
+    return rng.randrange(1, 10 ** 4) * 10 ** rng.choice((0, 6, 18))
+  if kind == 1:
+    return rng.randrange(1, 10 ** rng.randrange(1, 22))
+  return rng.randrange(1, 10 ** 6) * 1000 + rng.randrange(1, 1000)
+
+
+def random_case(rng, maxProfiles=MAX_PROFILES):
+  rewardFee = rng.randrange(1000)
+  profileNum = rng.randrange(1, maxProfiles + 1)
+  qualifyNum = rng.randrange(1, profileNum + 1)
+  inviters = []
+  if profileNum > 1 and rng.random() < 0.5:
+    # each invited profile names one referrer among the winners
+    invited = rng.randrange(1, profileNum)
+    counts = Counter(rng.randrange(qualifyNum) for i in range(invited))
+    inviters = sorted(counts.values(), reverse=True)
+  return Case(
+    stake_value(rng),
+    rng.randrange(1000),
+    rewardFee,
+    rng.randrange(1000 - rewardFee),
+    rng.randrange(profileNum + 1),
+    profileNum,
+    qualifyNum,
+    tuple(inviters),
+  )
+
+
+def random_cases(count, seed=0, maxProfiles=MAX_PROFILES):
+  rng = random.Random(seed)
+  for i in range(count):
+    yield random_case(rng, maxProfiles)
+
+
+def screen(cases, top=10):
+  # summary of the cases, with the `top` stranding most relative to the stakes
+  report = {
+    'cases': 0,
+    'stranding': 0,
+    'stranded': 0,
+    'maxStranded': 0,
+    'feeGaps': 0,
+    'feeGap': 0,
+    'feeShortfalls': 0,
+    'feeShortfall': 0,
+    'negative': [],
+  }
+  worst = []
+  for case in cases:
+    flows = audit_case(case)
+    report['cases'] += 1
+    if flows.stranded < 0:
+      # paying out more than was staked would be a contract bug, keep them all
+      report['negative'].append(case)
+      continue
+    if flows.stranded:
+      report['stranding'] += 1
+      report['stranded'] += flows.stranded
+      report['maxStranded'] = max(report['maxStranded'], flows.stranded)
+      item = (ppm(flows.stranded, flows.staked), flows.stranded, case)
+      if len(worst) < top:
+        heapq.heappush(worst, item)
+      elif item > worst[0]:
+        heapq.heapreplace(worst, item)
+    if flows.feeGap:
+      report['feeGaps'] += 1
+      report['feeGap'] += flows.feeGap
+    if flows.feeShortfall:
+      report['feeShortfalls'] += 1
+      report['feeShortfall'] += flows.feeShortfall
+  report['worst'] = sorted(worst, reverse=True)
+  return report
+
+
+def search(maxExamples=2000, maxProfiles=MAX_PROFILES):
+  # cases hypothesis found while maximizing the stranded share of the stakes
+  from hypothesis import HealthCheck, given, settings, target, strategies as st
+
+  @st.composite
+  def cases(draw):
+    rewardFee = draw(st.integers(0, 999))
+    profileNum = draw(st.integers(1, maxProfiles))
+    qualifyNum = draw(st.integers(1, profileNum))
+    invited = draw(st.integers(0, profileNum - 1))
+    referrers = draw(st.lists(st.integers(0, qualifyNum - 1), min_size=invited, max_size=invited))
+    return Case(
+      draw(st.one_of(
+        st.integers(1, 10 ** 4).map(lambda k: k * 10 ** 6),
+        st.integers(1, 10 ** 24),
+        st.integers(1, 10 ** 6).map(lambda k: k * 1000 + 999),
+      )),
+      draw(st.integers(0, 999)),
+      rewardFee,
+      draw(st.integers(0, 999 - rewardFee)),
+      draw(st.integers(0, profileNum)),
+      profileNum,
+      qualifyNum,
+      tuple(sorted(Counter(referrers).values(), reverse=True)),
+    )
+
+  found = []
+
+  @settings(max_examples=maxExamples, database=None, derandomize=True, deadline=None,
+            suppress_health_check=list(HealthCheck))
+  @given(cases())
+  def run(case):
+    flows = audit_case(case)
+    target(float(ppm(flows.stranded, flows.staked)), label='stranded ppm')
+    found.append(case)
+
+  run()
+  return screen(found)
+
+
+def spot_check(sf, owner, app, wallets, case, firstProfileId):
+  # (expected flows, contract balance left by the round) of one case played on chain,
+  # wallets must hold approved currency
+  from scripts.indexer import contract_config
+  from scripts.scenario import wait_until
+  from scripts.replay import pool_balance
+  from scripts.rounds import RoundSchedule
+
+  currency = sf.currency()
+  sf.setMaxProfiles(MAX_PROFILES, {'from': owner})
+  sf.setFirstNFree(case.firstNFree, {'from': owner})
+  sf.setStakeValue(case.stakeValue, {'from': owner})
+  sf.setGasFee(case.gasFee, {'from': owner})
+  sf.setRewardFee(case.rewardFee, {'from': owner})
+  sf.setInviteFee(case.inviteFee, {'from': owner})
+
+  schedule = RoundSchedule.from_config(contract_config(sf))
+  roundId, startTime = sf.getCurrentRound()
+  wait_until(startTime + schedule.gapLength + 1)
+  roundId, startTime = sf.getCurrentRound()
+
+  # the first qualifyNum profiles win, invited profiles are staked last
+  profileIds = [firstProfileId + i for i in range(case.profileNum)]
+  refIds = [0] * case.profileNum
+  referrers = [profileIds[w] for w, n in enumerate(case.inviters) for i in range(n)]
+  for i, refId in enumerate(referrers):
+    refIds[case.profileNum - len(referrers) + i] = refId
+
+  balance = pool_balance(sf.address, currency)
+  for i, profileId in enumerate(profileIds):
+    wallet = wallets[i % len(wallets)]
+    sf.profileStake(roundId, profileId, wallet, refIds[i], {'from': wallet})
+  wait_until(schedule.freeze_time(roundId))
+  sf.profileQualify(roundId, (1 << case.qualifyNum) - 1, {'from': app})
+  wait_until(schedule.settle_time(roundId) + 1)
+  for i in range(case.qualifyNum):
+    sf.profileClaim(roundId, i, profileIds[i], {'from': wallets[i % len(wallets)]})
+  sf.withdrawRoundFee(roundId, {'from': owner})
+  return audit_case(case), pool_balance(sf.address, currency) - balance
+
+
+def print_report(report):
+  print('{} cases, {} strand funds, {} wei in total, at most {} wei in one round'.format(
+    report['cases'], report['stranding'], report['stranded'], report['maxStranded']))
+  print('{} hold back more platform fee than withdrawRoundFee pays, {} wei in total'.format(report['feeGaps'], report['feeGap']))
+  print('{} undercharge stake fees, {} wei in total'.format(report['feeShortfalls'], report['feeShortfall']))
+  for case in report['negative']:
+    print('pays out more than staked: {}'.format(case))
+  for share, stranded, case in report['worst']:
+    print('{} ppm ({} wei) {}'.format(share, stranded, case))
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description='Fee rounding audit for Stake2Follow')
+  parser.add_argument('--cases', type=int, default=10 ** 6)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--top', type=int, default=10)
+  parser.add_argument('--search', type=int, default=0, help='hypothesis examples to run after the screen')
+  args = parser.parse_args(argv)
+
+  print_report(screen(random_cases(args.cases, args.seed), args.top))
+  if args.search:
+    print_report(search(args.search))
+
+
+def spot(cases=10 ** 5, top=5):
+  # screen, then replay the worst cases on a fresh development deployment
+  from brownie import accounts, stake2Follow
+  from brownie_tokens import ERC20
+
+  currency = ERC20()
+  owner, app, wallet = accounts[0], accounts[8], accounts[9]
+  sf = stake2Follow.deploy(1000, 50, 100, 5, currency.address, app, wallet, {'from': owner})
+  wallets = accounts[1:8]
+  for w in wallets:
+    currency._mint_for_testing(w, 10 ** 30)
+    currency.approve(sf.address, 2 ** 256 - 1, {'from': w})
+
+  report = screen(random_cases(cases), top)
+  print_report(report)
+  firstProfileId = 1
+  for share, stranded, case in report['worst']:
+    flows, left = spot_check(sf, owner, app, wallets, case, firstProfileId)
+    firstProfileId += case.profileNum
+    print('{} on chain: {} wei left, {} expected'.format('ok' if left == flows.stranded else 'MISMATCH', left, flows.stranded))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,281 @@
+# Event indexer for Stake2Follow.
+# Keeps a pending-claims view per profile, updated incrementally from
+# ProfileQualify, ProfileExclude and ProfileClaim, so answering
+# "what can I claim?" costs O(pending) instead of walking every round.
+
+from brownie import chain, web3, stake2Follow
+from scripts.rounds import (
+  ARCHIVED_BIT,
+  CLAIMED_OFFSET,
+  EXCLUDE_OFFSET,
+  FEE_WITHDRAWN_BIT,
+  MATERIALIZED_BIT,
+  RoundSchedule,
+  base_round,
+  claim_value,
+  config_dict,
+  is_claimed,
+  is_winner,
+  round_key,
+  round_summary,
+)
+
+
+def contract_config(sf):
+  # getConfig plus the settings it does not return
+  config = config_dict(sf.getConfig())
+  config['ROUND_REVEAL_LENGTH'] = sf.ROUND_REVEAL_LENGTH()
+  return config
+
+
+class RoundState:
+
+  def __init__(self):
+    # profile ids in stake order, same as roundToProfiles[roundId]
+    self.profiles = []
+    self.qualify = 0
+    # refId => invited profiles
+    self.invites = {}
+    self.qualifyNum = 0
+    self.shares = 0
+    # profileId => claimed fund
+    self.payouts = {}
+    # qualify commitment not revealed yet
+    self.commitment = None
+
+
+class EventHandler:
+  # dispatches decoded events to `_on_<EventName>` methods
+
+  def apply(self, name, args):
+    handler = getattr(self, '_on_' + name, None)
+    if handler is not None:
+      handler(args)
+
+  def apply_logs(self, logs):
+    for log in logs:
+      self.apply(log['event'], dict(log['args']))
+
+  def apply_tx(self, tx):
+    for event in tx.events:
+      self.apply(event.name, dict(event))
+
+
+class RoundIndexer(EventHandler):
+
+  def __init__(self, config):
+    self.config = config if isinstance(config, dict) else config_dict(config)
+    self.schedule = RoundSchedule.from_config(self.config)
+    self.rounds = {}
+    # profileId => {roundId: profileIndex} of qualified, unclaimed rounds
+    self.pending = {}
+    # rounds below it had their platform fee swept
+    self.nextFeeRound = 0
+
+  @classmethod
+  def from_contract(cls, sf):
+    return cls(contract_config(sf))
+
+  def round(self, roundId):
+    if roundId not in self.rounds:
+      self.rounds[roundId] = RoundState()
+    return self.rounds[roundId]
+
+  def pending_claims(self, profileId, now=None):
+    # [(roundId, profileIndex, amount)] claimable by profile at `now`
+    if now is None:
+      now = chain.time()
+    claims = []
+    for roundId, profileIndex in self.pending.get(profileId, {}).items():
+      if not self.schedule.is_settle(roundId, now):
+        continue
+      state = self.rounds[roundId]
+      if state.commitment is not None and now <= self.schedule.reveal_deadline(roundId):
+        # claims wait for the reveal
+        continue
+      claims.append((roundId, profileIndex, self.claim_amount(roundId, profileId)))
+    return sorted(claims)
+
+  def claim_amount(self, roundId, profileId):
+    state = self.rounds[roundId]
+    return claim_value(
+      self.config,
+      len(state.profiles),
+      state.qualifyNum,
+      state.shares,
+      state.invites.get(profileId, 0)
+    )
+
+  def archivable_rounds(self, now=None):
+    # round keys archiveRound accepts: settled, fee withdrawn, every winner claimed
+    if now is None:
+      now = chain.time()
+    rounds = []
+    for roundId, state in self.rounds.items():
+      if not state.profiles or (state.qualify >> ARCHIVED_BIT) & 1:
+        continue
+      if base_round(roundId) >= self.nextFeeRound and not (state.qualify >> FEE_WITHDRAWN_BIT) & 1:
+        continue
+      if not self.schedule.is_settle(roundId, now):
+        continue
+      if any(roundId in self.pending.get(profileId, {}) for profileId in state.profiles):
+        continue
+      rounds.append(roundId)
+    return sorted(rounds)
+
+  def _update_pending(self, roundId):
+    state = self.rounds[roundId]
+    profileNum = len(state.profiles)
+    state.qualifyNum, state.shares = round_summary(state.qualify, state.profiles, state.invites)
+    for profileIndex, profileId in enumerate(state.profiles):
+      rounds = self.pending.setdefault(profileId, {})
+      if is_winner(state.qualify, profileNum, profileIndex) and not is_claimed(state.qualify, profileIndex):
+        rounds[roundId] = profileIndex
+      else:
+        rounds.pop(roundId, None)
+
+  def _on_ProfileStake(self, args):
+    roundId = args['roundId']
+    state = self.round(roundId)
+    state.profiles.append(args['profileId'])
+    if args['refId'] != 0:
+      state.invites[args['refId']] = state.invites.get(args['refId'], 0) + 1
+    self._update_pending(roundId)
+
+  def _on_ProfileQualify(self, args):
+    roundId = args['roundId']
+    state = self.round(roundId)
+    state.qualify |= ((1 << len(state.profiles)) - 1) & args['qualify']
+    self._update_pending(roundId)
+
+  def _on_ProfileExclude(self, args):
+    roundId = args['roundId']
+    state = self.round(roundId)
+    state.qualify |= (((1 << len(state.profiles)) - 1) & args['exclude']) << EXCLUDE_OFFSET
+    self._update_pending(roundId)
+
+  def _on_ProfileClaim(self, args):
+    roundId = args['roundId']
+    state = self.round(roundId)
+    profileIndex = state.profiles.index(args['profileId'])
+    state.qualify |= 1 << (CLAIMED_OFFSET + profileIndex)
+    state.payouts[args['profileId']] = args['fund']
+    self.pending.get(args['profileId'], {}).pop(roundId, None)
+
+  def _on_QualifyCommit(self, args):
+    self.round(args['roundId']).commitment = args['commitment']
+
+  def _on_QualifyReveal(self, args):
+    # the bits come with the ProfileQualify and ProfileExclude emitted before
+    self.round(args['roundId']).commitment = None
+
+  def _on_SetRevealLength(self, args):
+    self.config['ROUND_REVEAL_LENGTH'] = args['revealLength']
+    self.schedule = RoundSchedule.from_config(self.config)
+
+  def _on_SubscriptionsMaterialize(self, args):
+    # the joined subscribers come with their own ProfileStake events
+    self.round(args['roundId']).qualify |= 1 << MATERIALIZED_BIT
+
+  def _on_WithdrawRoundFee(self, args):
+    self.round(args['roundId']).qualify |= 1 << FEE_WITHDRAWN_BIT
+
+  def _on_RoundArchived(self, args):
+    # storage is gone on chain, the indexer keeps the round from the events
+    self.round(args['roundId']).qualify |= 1 << ARCHIVED_BIT
+
+  def _on_WithdrawFees(self, args):
+    self.nextFeeRound = args['toRound'] + 1
+
+  def _on_SetNextFeeRound(self, args):
+    self.nextFeeRound = args['roundId']
+
+  def _on_SetStakeValue(self, args):
+    self.config['stakeValue'] = args['value']
+
+  def _on_SetRewardFee(self, args):
+    self.config['rewardFee'] = args['fee']
+
+  def _on_SetInviteFee(self, args):
+    self.config['inviteFee'] = args['n']
+
+  def _on_ResetRoundDuration(self, args):
+    self.config['ROUND_OPEN_LENGTH'] = args['openLength']
+    self.config['ROUND_FREEZE_LENGTH'] = args['freezeLength']
+    self.config['ROUND_GAP_LENGTH'] = args['gapLength']
+    self.config['roundCompensate'] = args['roundCompensate']
+    self.schedule = RoundSchedule.from_config(self.config)
+
+
+def event_topic(abi, name):
+  for item in abi:
+    if item['type'] == 'event' and item['name'] == name:
+      signature = '{}({})'.format(name, ','.join(i['type'] for i in item['inputs']))
+      return web3.keccak(text=signature).hex()
+  raise KeyError(name)
+
+
+def uint_topic(value):
+  return '0x{:064x}'.format(value)
+
+
+def address_topic(address):
+  return '0x' + address[2:].lower().rjust(64, '0')
+
+
+def fetch_events(sf, fromBlock=0, toBlock='latest', topics=None, step=None):
+  # Stake2Follow events in range with a single eth_getLogs,
+  # or one per `step` blocks for providers that cap the range
+  contract = web3.eth.contract(address=sf.address, abi=sf.abi)
+  decoders = {}
+  for item in sf.abi:
+    if item['type'] == 'event':
+      decoders[event_topic(sf.abi, item['name'])] = contract.events[item['name']]()
+
+  ranges = [(fromBlock, toBlock)]
+  if step is not None:
+    if toBlock == 'latest':
+      toBlock = web3.eth.block_number
+    ranges = [(start, min(start + step - 1, toBlock)) for start in range(fromBlock, toBlock + 1, step)]
+
+  events = []
+  for start, end in ranges:
+    params = {'address': sf.address, 'fromBlock': start, 'toBlock': end}
+    if topics is not None:
+      params['topics'] = topics
+    for log in web3.eth.get_logs(params):
+      if log['topics'] and log['topics'][0].hex() in decoders:
+        events.append(decoders[log['topics'][0].hex()].processLog(log))
+  return events
+
+
+def fetch_profile_events(sf, profileId, fromBlock=0, toBlock='latest'):
+  # ProfileStake and ProfileClaim of one profile, profileId is topic 2 of both
+  names = [event_topic(sf.abi, 'ProfileStake'), event_topic(sf.abi, 'ProfileClaim')]
+  return fetch_events(sf, fromBlock, toBlock, [names, None, uint_topic(profileId)])
+
+
+def profile_rounds(sf, profileId, fromBlock=0, toBlock='latest'):
+  # round keys the profile joined, also when the contract keeps no history
+  return [e['args']['roundId'] for e in fetch_profile_events(sf, profileId, fromBlock, toBlock) if e['event'] == 'ProfileStake']
+
+
+def fetch_address_events(sf, address, fromBlock=0, toBlock='latest'):
+  # ProfileStake and ProfileClaim of one wallet, address is topic 3 of both
+  names = [event_topic(sf.abi, 'ProfileStake'), event_topic(sf.abi, 'ProfileClaim')]
+  return fetch_events(sf, fromBlock, toBlock, [names, None, None, address_topic(address)])
+
+
+def fetch_round_events(sf, roundId, fromBlock=0, toBlock='latest', shard=0):
+  # every event of one round shard, the round key is topic 1 of all round events
+  return fetch_events(sf, fromBlock, toBlock, [None, uint_topic(round_key(roundId, shard))])
+
+
+def main():
+  sf = stake2Follow[-1]
+  indexer = RoundIndexer.from_contract(sf)
+  indexer.apply_logs(fetch_events(sf))
+  for profileId in sorted(indexer.pending):
+    claims = indexer.pending_claims(profileId)
+    if claims:
+      print('profile {}: {}'.format(profileId, claims))
@@ -0,0 +1,82 @@
+# Synthetic load for Stake2Follow on a development chain or a fork.
+# Plays full rounds: stakes with referrals, qualify and exclude by the app,
+# claims by most winners and the platform fee of every other round, so storage
+# ends up holding every kind of round state (claimed, unclaimed, excluded,
+# fee withdrawn). Unlike scripts/scenario.py it follows the round keys of the
+# ProfileStake events, so stakes spilling into shard rounds are played too.
+
+import random
+
+from brownie import Contract, chain
+from scripts.indexer import contract_config
+from scripts.rounds import EXCLUDE_OFFSET, RoundSchedule, is_winner
+from scripts.scenario import STAKE_MARGIN, wait_until
+
+# wrapped native currency, e.g. wMATIC
+WRAPPED_ABI = [
+  {'type': 'function', 'name': 'deposit', 'stateMutability': 'payable', 'inputs': [], 'outputs': []},
+  {
+    'type': 'function',
+    'name': 'approve',
+    'stateMutability': 'nonpayable',
+    'inputs': [{'name': 'spender', 'type': 'address'}, {'name': 'amount', 'type': 'uint256'}],
+    'outputs': [{'name': '', 'type': 'bool'}],
+  },
+]
+
+def fund_wrapped(currency, wallets, spender, amount):
+  # wrap native currency for each wallet and approve the spender
+  token = Contract.from_abi('Wrapped', currency, WRAPPED_ABI)
+  for wallet in wallets:
+    token.deposit({'from': wallet, 'value': amount})
+    token.approve(spender, amount, {'from': wallet})
+
+
+def generate(sf, app, owner, wallets, rounds=3, profiles=5, firstProfileId=10 ** 9, seed=0):
+  # {roundKey: [profileId]} of the played rounds, wallets must hold approved currency
+  rng = random.Random(seed)
+  played = {}
+  profileId = firstProfileId
+  for n in range(rounds):
+    schedule = RoundSchedule.from_config(contract_config(sf))
+    roundId, startTime = sf.getCurrentRound()
+    if not schedule.is_open(roundId, chain.time() + STAKE_MARGIN):
+      wait_until(startTime + schedule.gapLength + 1)
+      roundId, startTime = sf.getCurrentRound()
+
+    staked = []
+    for i in range(min(profiles, sf.maxProfiles())):
+      wallet = wallets[i % len(wallets)]
+      refId = rng.choice(staked)[1] if staked and rng.random() < 0.5 else 0
+      tx = sf.profileStake(roundId, profileId, wallet, refId, {'from': wallet})
+      staked.append((tx.events['ProfileStake'][0]['roundId'], profileId, wallet))
+      profileId += 1
+
+    roundKeys = {}
+    for roundKey, stakedId, wallet in staked:
+      roundKeys.setdefault(roundKey, []).append((stakedId, wallet))
+
+    wait_until(schedule.freeze_time(roundId))
+    words = {}
+    for roundKey, members in roundKeys.items():
+      profileNum = len(members)
+      qualify = rng.randrange(1, 1 << profileNum)
+      sf.profileQualify(roundKey, qualify, {'from': app})
+      exclude = 0
+      if profileNum > 1 and rng.random() < 0.5:
+        exclude = 1 << rng.randrange(profileNum)
+        sf.profileExclude(roundKey, exclude, {'from': app})
+      words[roundKey] = qualify | (exclude << EXCLUDE_OFFSET)
+
+    wait_until(schedule.settle_time(roundId) + 1)
+    for roundKey, members in roundKeys.items():
+      winners = [i for i in range(len(members)) if is_winner(words[roundKey], len(members), i)]
+      # the last winner leaves its reward unclaimed
+      for profileIndex in winners[:-1]:
+        stakedId, wallet = members[profileIndex]
+        sf.profileClaim(roundKey, profileIndex, stakedId, {'from': wallet})
+      played[roundKey] = [stakedId for stakedId, wallet in members]
+    if n % 2 == 0:
+      for roundKey in roundKeys:
+        sf.withdrawRoundFee(roundKey, {'from': owner})
+  return played
@@ -0,0 +1,54 @@
+# Minimal Prometheus text-format metrics, no client library needed.
+
+
+class Metric:
+
+  def __init__(self, name, help, kind):
+    self.name = name
+    self.help = help
+    self.kind = kind
+    # sorted label items => value
+    self.values = {}
+
+  def inc(self, amount=1, **labels):
+    key = tuple(sorted(labels.items()))
+    self.values[key] = self.values.get(key, 0) + amount
+
+  def set(self, value, **labels):
+    self.values[tuple(sorted(labels.items()))] = value
+
+  def get(self, **labels):
+    return self.values.get(tuple(sorted(labels.items())), 0)
+
+  def remove(self, **labels):
+    self.values.pop(tuple(sorted(labels.items())), None)
+
+  def render(self):
+    lines = ['# HELP {} {}'.format(self.name, self.help), '# TYPE {} {}'.format(self.name, self.kind)]
+    for key, value in sorted(self.values.items()):
+      labels = ','.join('{}="{}"'.format(k, v) for k, v in key)
+      lines.append('{}{} {}'.format(self.name, '{' + labels + '}' if labels else '', value))
+    return '\n'.join(lines)
+
+
+class Registry:
+
+  def __init__(self):
+    self.metrics = {}
+
+  def _metric(self, name, help, kind):
+    if name not in self.metrics:
+      self.metrics[name] = Metric(name, help, kind)
+    return self.metrics[name]
+
+  def counter(self, name, help):
+    return self._metric(name, help, 'counter')
+
+  def gauge(self, name, help):
+    return self._metric(name, help, 'gauge')
+
+  def render(self):
+    return '\n'.join(metric.render() for metric in self.metrics.values()) + '\n'
+
+
+REGISTRY = Registry()
@@ -0,0 +1,336 @@
+# Pre-flight revert prediction for Stake2Follow transactions.
+# Every `require` on the path of profileStake, profileClaim, profileQualify and
+# profileExclude is evaluated locally, in contract order, from a snapshot read
+# in one JSON-RPC batch through the async client. A transaction is only worth
+# signing when the check returns no reasons. `simulate` asks the node instead,
+# with a single eth_call.
+
+import asyncio
+from collections import namedtuple
+
+from scripts.client import ContractFunction, JsonRpcError, _decode
+from scripts.rounds import (
+  RoundSchedule,
+  config_dict,
+  is_claimable,
+  is_claimed,
+  is_excluded,
+  shard_of,
+)
+
+Reason = namedtuple('Reason', ['code', 'message'])
+
+# code => revert string of Stake2Follow.sol, kept identical to the contract
+CONTRACT_REASONS = {
+  'STOPPED': 'Emergency stop is active, function execution is prevented.',
+  'ONLY_APP': 'Only App can call this function.',
+  'NOT_PROFILE_OWNER': 'Sender is not the profile owner',
+  'INVALID_PROFILE_ADDRESS': 'Invalid profile address',
+  'INVALID_ROUND': 'Invalid round',
+  'ROUND_NOT_OPEN': 'Round is not in open stage',
+  'ALREADY_PARTICIPANT': 'profile already paticipant',
+  'NOT_LENS_OWNER': 'Not the Lens profile owner',
+  'PROFILE_REGISTERED': 'Profile already registered',
+  'MAX_PROFILES': 'Maximum profile limit reached',
+  'ROUND_NOT_SETTLE': 'Round is not settle',
+  'REVEAL_PENDING': 'Qualify not revealed',
+  'INDEX_OUT_OF_BOUND': 'index out of bound',
+  'PROFILE_INVALID': 'Profile invalid',
+  'ADDRESS_NOT_MATCH': 'Address not match profile',
+  'NOT_QUALIFIED': 'Profile not qualify to claimed',
+  'EXCLUDED': 'Profile is excluded',
+  'ALREADY_CLAIMED': 'Profile already claimed',
+  'ROUND_OPEN': 'Round is open',
+  'ROUND_SETTLE': 'Round is settle',
+  'ZERO_QUALIFY': 'qualify should not be zero',
+  'PROFILES_EMPTY': 'profiles is empty',
+  'INVALID_STAKE_VALUE': 'Invalid stake value',
+  'INVALID_AMOUNT': 'Invalid amount',
+  'NATIVE_TRANSFER_FAILED': 'Native transfer failed',
+}
+
+# transferFrom of the currency, the revert string depends on the token
+CURRENCY_REASONS = {
+  'INSUFFICIENT_ALLOWANCE': 'ERC20: insufficient allowance',
+  'INSUFFICIENT_BALANCE': 'ERC20: transfer amount exceeds balance',
+}
+
+REASONS = dict(CONTRACT_REASONS, **CURRENCY_REASONS)
+
+
+def reason(code):
+  return Reason(code, REASONS[code])
+
+
+def reason_of(message):
+  # revert string => Reason, UNKNOWN for strings not listed above
+  for code, text in REASONS.items():
+    if text == message:
+      return Reason(code, text)
+  return Reason('UNKNOWN', message)
+
+
+def stake_cost(config, profileNum):
+  # stake plus fee of the profile joining at `profileNum`, same as stake()
+  if profileNum < config['firstNFree']:
+    return config['stakeValue']
+  return config['stakeValue'] + config['stakeValue'] // 1000 * config['gasFee']
+
+
+def check_stake(state, roundId, profileId, profileAddress, sender, value=0):
+  # state: now, config, stopped, maxShards, shard (last opened), shardProfiles
+  # (of that shard, pending subscribers included), lastRound (getProfileLastRound),
+  # boundAddress, lensOwner (None without a Lens Hub), native (currency is
+  # address(0)), and optionally allowance/balance of profileAddress.
+  # `value` is the call value
+  reasons = []
+  schedule = RoundSchedule.from_config(state['config'])
+  if state['stopped']:
+    reasons.append(reason('STOPPED'))
+  if sender.lower() != profileAddress.lower():
+    reasons.append(reason('NOT_PROFILE_OWNER'))
+  if int(profileAddress, 16) == 0:
+    reasons.append(reason('INVALID_PROFILE_ADDRESS'))
+  if shard_of(roundId) != 0:
+    reasons.append(reason('INVALID_ROUND'))
+    return reasons
+  if not schedule.is_open(roundId, state['now']):
+    reasons.append(reason('ROUND_NOT_OPEN'))
+  joined, lastRound = state['lastRound']
+  # a pending subscriber joins when the stake materializes the round
+  if (joined and lastRound == roundId) or profileId in state['shardProfiles']:
+    reasons.append(reason('ALREADY_PARTICIPANT'))
+
+  profileNum = len(state['shardProfiles'])
+  if profileNum >= state['config']['maxProfiles'] and state['shard'] + 1 < state['maxShards']:
+    # spills over into a new shard
+    profileNum = 0
+  if profileNum >= state['config']['maxProfiles']:
+    reasons.append(reason('MAX_PROFILES'))
+    return reasons
+  if state['boundAddress'].lower() != profileAddress.lower():
+    if state['lensOwner'] is not None:
+      if state['lensOwner'].lower() != profileAddress.lower():
+        reasons.append(reason('NOT_LENS_OWNER'))
+    elif int(state['boundAddress'], 16) != 0:
+      # without a Lens Hub a profile stays with its first address
+      reasons.append(reason('PROFILE_REGISTERED'))
+
+  cost = stake_cost(state['config'], profileNum)
+  # a native pool takes exactly the stake and fee with the call, an ERC20 pool no value
+  if value != (cost if state.get('native') else 0):
+    reasons.append(reason('INVALID_STAKE_VALUE'))
+  if state.get('allowance') is not None and state['allowance'] < cost:
+    reasons.append(reason('INSUFFICIENT_ALLOWANCE'))
+  if state.get('balance') is not None and state['balance'] < cost:
+    reasons.append(reason('INSUFFICIENT_BALANCE'))
+  return reasons
+
+
+def check_claim(state, roundId, profileIndex, profileId, sender):
+  # state: now, config, stopped, qualify, profiles (of the round key), profileAddress,
+  # commitment and deadline of getQualifyCommit
+  reasons = []
+  schedule = RoundSchedule.from_config(state['config'])
+  if state['stopped']:
+    reasons.append(reason('STOPPED'))
+  if not schedule.is_settle(roundId, state['now']):
+    reasons.append(reason('ROUND_NOT_SETTLE'))
+  if int.from_bytes(state['commitment'], 'big') != 0 and state['now'] <= state['deadline']:
+    reasons.append(reason('REVEAL_PENDING'))
+  profiles = state['profiles']
+  if profileIndex >= len(profiles):
+    reasons.append(reason('INDEX_OUT_OF_BOUND'))
+    return reasons
+  if profiles[profileIndex] != profileId:
+    reasons.append(reason('PROFILE_INVALID'))
+  if sender.lower() != state['profileAddress'].lower():
+    reasons.append(reason('ADDRESS_NOT_MATCH'))
+  if not is_claimable(state['qualify'], len(profiles), profileIndex):
+    reasons.append(reason('NOT_QUALIFIED'))
+  if is_excluded(state['qualify'], len(profiles), profileIndex):
+    reasons.append(reason('EXCLUDED'))
+  if is_claimed(state['qualify'], profileIndex):
+    reasons.append(reason('ALREADY_CLAIMED'))
+  return reasons
+
+
+def check_qualify(state, roundId, qualify, sender):
+  # state: now, config, stopped, app, profiles (pending subscribers included)
+  reasons = []
+  schedule = RoundSchedule.from_config(state['config'])
+  if state['stopped']:
+    reasons.append(reason('STOPPED'))
+  if sender.lower() != state['app'].lower():
+    reasons.append(reason('ONLY_APP'))
+  if schedule.is_open(roundId, state['now']):
+    reasons.append(reason('ROUND_OPEN'))
+  if schedule.is_settle(roundId, state['now']):
+    reasons.append(reason('ROUND_SETTLE'))
+  if qualify == 0:
+    reasons.append(reason('ZERO_QUALIFY'))
+  if not state['profiles']:
+    reasons.append(reason('PROFILES_EMPTY'))
+  return reasons
+
+
+def check_exclude(state, roundId, illegals, sender):
+  reasons = []
+  schedule = RoundSchedule.from_config(state['config'])
+  if state['stopped']:
+    reasons.append(reason('STOPPED'))
+  if sender.lower() != state['app'].lower():
+    reasons.append(reason('ONLY_APP'))
+  if schedule.is_settle(roundId, state['now']):
+    reasons.append(reason('ROUND_SETTLE'))
+  if illegals == 0:
+    reasons.append(reason('ZERO_QUALIFY'))
+  if not state['profiles']:
+    reasons.append(reason('PROFILES_EMPTY'))
+  return reasons
+
+
+# currency reads and the Lens Hub ownerOf
+TOKEN_ABI = [
+  {
+    'type': 'function',
+    'name': 'allowance',
+    'stateMutability': 'view',
+    'inputs': [{'name': 'owner', 'type': 'address'}, {'name': 'spender', 'type': 'address'}],
+    'outputs': [{'name': '', 'type': 'uint256'}],
+  },
+  {
+    'type': 'function',
+    'name': 'balanceOf',
+    'stateMutability': 'view',
+    'inputs': [{'name': 'account', 'type': 'address'}],
+    'outputs': [{'name': '', 'type': 'uint256'}],
+  },
+  {
+    'type': 'function',
+    'name': 'ownerOf',
+    'stateMutability': 'view',
+    'inputs': [{'name': 'tokenId', 'type': 'uint256'}],
+    'outputs': [{'name': '', 'type': 'address'}],
+  },
+]
+
+
+class Preflight:
+  # reads go through the client, so they share its batch, TTL cache and coalescing
+
+  def __init__(self, client):
+    self.client = client
+    self.tokens = {item['name']: ContractFunction(client, item) for item in TOKEN_ABI}
+
+  async def now(self):
+    # the transaction lands in a later block, the latest timestamp is the lower bound
+    block = await self.client.rpc('eth_getBlockByNumber', 'latest', False)
+    return int(block['timestamp'], 16)
+
+  async def token_call(self, token, name, *args):
+    fn = self.tokens[name]
+    data = await self.client.rpc('eth_call', {'to': token, 'data': fn.encode(args)}, 'latest')
+    return fn.decode(data)
+
+  async def common(self):
+    now, config, stopped = await asyncio.gather(self.now(), self.client.getConfig(), self.client.getStopped())
+    return {'now': now, 'config': config_dict(config), 'stopped': stopped}
+
+  async def stake(self, roundId, profileId, profileAddress, refId, sender, value=0):
+    common, maxShards, shards, lastRound, boundAddress, lensHub, currency = await asyncio.gather(
+      self.common(),
+      self.client.getMaxShards(),
+      self.client.getRoundShards(roundId),
+      self.client.getProfileLastRound(profileId),
+      self.client.getProfileAddress(profileId),
+      self.client.lensHub(),
+      self.client.currency(),
+    )
+    shardKey, qualify, shardProfiles = await self.client.getRoundShardData(roundId, shards - 1)
+    lensOwner = None
+    if int(lensHub, 16) != 0 and boundAddress.lower() != profileAddress.lower():
+      lensOwner = await self.token_call(lensHub, 'ownerOf', profileId)
+    native = int(currency, 16) == 0
+    if native:
+      # native pool, the stake is the call value and needs no allowance
+      allowance = None
+      balance = int(await self.client.rpc('eth_getBalance', profileAddress, 'latest'), 16)
+    else:
+      allowance, balance = await asyncio.gather(
+        self.token_call(currency, 'allowance', profileAddress, self.client.address),
+        self.token_call(currency, 'balanceOf', profileAddress),
+      )
+    state = dict(
+      common,
+      maxShards=maxShards,
+      shard=shards - 1,
+      shardProfiles=list(shardProfiles),
+      lastRound=lastRound,
+      boundAddress=boundAddress,
+      lensOwner=lensOwner,
+      native=native,
+      allowance=allowance,
+      balance=balance,
+    )
+    return check_stake(state, roundId, profileId, profileAddress, sender, value)
+
+  async def claim(self, roundId, profileIndex, profileId, sender):
+    common, (qualify, profiles), profileAddress, (commitment, deadline) = await asyncio.gather(
+      self.common(),
+      self.client.getRoundData(roundId),
+      self.client.getProfileAddress(profileId),
+      self.client.getQualifyCommit(roundId),
+    )
+    state = dict(
+      common,
+      qualify=qualify,
+      profiles=list(profiles),
+      profileAddress=profileAddress,
+      commitment=commitment,
+      deadline=deadline,
+    )
+    return check_claim(state, roundId, profileIndex, profileId, sender)
+
+  async def qualify(self, roundId, qualify, sender):
+    common, app, (word, profiles) = await asyncio.gather(
+      self.common(),
+      self.client.getApp(),
+      self.client.getRoundData(roundId),
+    )
+    return check_qualify(dict(common, app=app, profiles=list(profiles)), roundId, qualify, sender)
+
+  async def exclude(self, roundId, illegals, sender):
+    common, app, (word, profiles) = await asyncio.gather(
+      self.common(),
+      self.client.getApp(),
+      self.client.getRoundData(roundId),
+    )
+    return check_exclude(dict(common, app=app, profiles=list(profiles)), roundId, illegals, sender)
+
+  async def simulate(self, name, args, sender, value=0):
+    # [] when the node accepts the call, else the reason it reverts with
+    fn = self.client.functions[name]
+    try:
+      await self.client.rpc('eth_call', {'from': sender, 'to': self.client.address, 'data': fn.encode(args), 'value': hex(value)}, 'latest')
+    except JsonRpcError as e:
+      return [reason_of(revert_reason(e))]
+    return []
+
+
+# Error(string) selector
+ERROR_SELECTOR = '08c379a0'
+
+
+def revert_reason(error):
+  # revert string of a failed eth_call, from the ABI encoded error data
+  # (geth, ganache 7) or the message text (ganache 6)
+  data = error.data
+  if isinstance(data, dict):
+    data = data.get('data') or next((v.get('return') for v in data.values() if isinstance(v, dict)), None)
+  if isinstance(data, str) and data[2:10] == ERROR_SELECTOR:
+    return _decode(['string'], bytes.fromhex(data[10:]))[0]
+  message = str(error)
+  if 'revert ' in message:
+    return message.split('revert ', 1)[1]
+  return message
@@ -0,0 +1,93 @@
+# Relayer for gasless staking and claiming.
+# Profiles sign EIP-712 Stake/Claim intents (plus an EIP-2612 permit of the
+# currency instead of an approve) and the relayer submits them in batches,
+# one transaction for many profiles.
+
+import eth_abi
+from eth_keys import keys
+from eth_utils import keccak
+
+_encode = getattr(eth_abi, 'encode', None) or eth_abi.encode_abi
+
+STAKE_TYPEHASH = keccak(text='Stake(uint256 roundId,uint256 profileId,address profileAddress,uint256 refId,uint256 nonce,uint256 deadline)')
+CLAIM_TYPEHASH = keccak(text='Claim(uint256 roundId,uint256 profileIndex,uint256 profileId,uint256 nonce,uint256 deadline)')
+PERMIT_TYPEHASH = keccak(text='Permit(address owner,address spender,uint256 value,uint256 nonce,uint256 deadline)')
+
+# Permit tuple that skips the permit
+NO_PERMIT = (0, 0, 0, b'\x00' * 32, b'\x00' * 32)
+
+
+def _digest(domainSeparator, types, values):
+  structHash = keccak(_encode(types, values))
+  return keccak(b'\x19\x01' + bytes(domainSeparator) + structHash)
+
+
+def _sign(account, digest):
+  # brownie LocalAccount, created by accounts.add()
+  signature = keys.PrivateKey(bytes.fromhex(account.private_key[2:])).sign_msg_hash(digest)
+  return signature.r, signature.s, signature.v + 27
+
+
+def sign_stake(account, sf, roundId, profileId, refId, deadline, nonce=None):
+  if nonce is None:
+    nonce = sf.getNonce(account.address)
+  digest = _digest(
+    sf.getDomainSeparator(),
+    ['bytes32', 'uint256', 'uint256', 'address', 'uint256', 'uint256', 'uint256'],
+    [STAKE_TYPEHASH, roundId, profileId, account.address, refId, nonce, deadline]
+  )
+  r, s, v = _sign(account, digest)
+  return r.to_bytes(32, 'big') + s.to_bytes(32, 'big') + bytes([v])
+
+
+def sign_claim(account, sf, roundId, profileIndex, profileId, deadline, nonce=None):
+  if nonce is None:
+    nonce = sf.getNonce(account.address)
+  return claim_signature(account, sf.getDomainSeparator(), roundId, profileIndex, profileId, nonce, deadline)
+
+
+def claim_signature(account, domainSeparator, roundId, profileIndex, profileId, nonce, deadline):
+  # without contract reads, for signers that track their nonce locally
+  digest = _digest(
+    domainSeparator,
+    ['bytes32', 'uint256', 'uint256', 'uint256', 'uint256', 'uint256'],
+    [CLAIM_TYPEHASH, roundId, profileIndex, profileId, nonce, deadline]
+  )
+  r, s, v = _sign(account, digest)
+  return r.to_bytes(32, 'big') + s.to_bytes(32, 'big') + bytes([v])
+
+
+def sign_permit(account, token, spender, value, deadline):
+  digest = _digest(
+    token.DOMAIN_SEPARATOR(),
+    ['bytes32', 'address', 'address', 'uint256', 'uint256', 'uint256'],
+    [PERMIT_TYPEHASH, account.address, str(spender), value, token.nonces(account.address), deadline]
+  )
+  r, s, v = _sign(account, digest)
+  return (value, deadline, v, r.to_bytes(32, 'big'), s.to_bytes(32, 'big'))
+
+
+class Relayer:
+
+  def __init__(self, sf, sender, batchSize=20):
+    self.sf = sf
+    self.sender = sender
+    self.batchSize = batchSize
+    self.stakes = []
+    self.claims = []
+
+  def add_stake(self, roundId, profileId, profileAddress, refId, deadline, signature, permit=NO_PERMIT):
+    self.stakes.append((roundId, profileId, str(profileAddress), refId, deadline, permit, signature))
+
+  def add_claim(self, roundId, profileIndex, profileId, deadline, signature):
+    self.claims.append((roundId, profileIndex, profileId, deadline, signature))
+
+  def flush(self):
+    txs = []
+    while self.stakes:
+      batch, self.stakes = self.stakes[:self.batchSize], self.stakes[self.batchSize:]
+      txs.append(self.sf.relayStakes(batch, {'from': self.sender}))
+    while self.claims:
+      batch, self.claims = self.claims[:self.batchSize], self.claims[self.batchSize:]
+      txs.append(self.sf.relayClaims(batch, {'from': self.sender}))
+    return txs
@@ -0,0 +1,257 @@
+# Deterministic replay of Stake2Follow from its event log.
+# Rebuilds every round, subscription and fee with the contract semantics and
+# computes what the contract owes at a point in time, e.g. the emergency stop,
+# as a refund list with a Merkle root so refunds after `withdraw` can be proven.
+
+import json
+
+import eth_abi
+from eth_utils import keccak, to_checksum_address
+
+from brownie import chain, web3, stake2Follow
+from scripts.indexer import RoundIndexer, fetch_events
+from scripts.rounds import ARCHIVED_BIT, FEE_WITHDRAWN_BIT, base_round, claim_value, round_fee
+
+_encode = getattr(eth_abi, 'encode', None) or eth_abi.encode_abi
+
+ERC20_BALANCE_ABI = [{
+  'type': 'function',
+  'name': 'balanceOf',
+  'stateMutability': 'view',
+  'inputs': [{'name': 'account', 'type': 'address'}],
+  'outputs': [{'name': '', 'type': 'uint256'}],
+}]
+
+
+class Subscription:
+
+  def __init__(self, profileAddress):
+    self.profileAddress = profileAddress
+    self.rounds = 0
+    self.rollover = False
+    self.balance = 0
+
+
+class ReplayState(RoundIndexer):
+
+  def __init__(self, config):
+    super().__init__(config)
+    # profileId => address, same as profileToAddress
+    self.addresses = {}
+    # roundId => [(profileId, profileAddress, stake, fees)] in stake order
+    self.stakes = {}
+    # profileId => Subscription
+    self.subscriptions = {}
+    self.stopped = False
+    # block of the last CircuitBreak
+    self.stopBlock = None
+
+  def apply_logs(self, logs):
+    for log in logs:
+      self.apply(log['event'], dict(log['args']))
+      if log['event'] == 'CircuitBreak':
+        self.stopBlock = log['blockNumber']
+
+  def _on_ProfileStake(self, args):
+    super()._on_ProfileStake(args)
+    self.addresses[args['profileId']] = args['profileAddress']
+    self.stakes.setdefault(args['roundId'], []).append(
+      (args['profileId'], args['profileAddress'], args['stake'], args['fees'])
+    )
+
+  def _on_ProfileRegister(self, args):
+    # rebinding moves the unclaimed rewards of earlier rounds to the new address
+    self.addresses[args['profileId']] = args['profileAddress']
+
+  def _on_ProfileClaim(self, args):
+    super()._on_ProfileClaim(args)
+    sub = self.subscriptions.get(args['profileId'])
+    if sub is not None and sub.rollover and sub.rounds > 0 and sub.profileAddress == args['profileAddress']:
+      sub.balance += args['fund']
+
+  def _on_SubscriptionsMaterialize(self, args):
+    super()._on_SubscriptionsMaterialize(args)
+    # the joined subscribers are the last stakes emitted before this event
+    stakes = self.stakes.get(args['roundId'], [])
+    if args['profiles'] == 0:
+      return
+    for profileId, profileAddress, stake, fees in stakes[len(stakes) - args['profiles']:]:
+      sub = self.subscriptions[profileId]
+      sub.balance -= stake + fees
+      sub.rounds -= 1
+
+  def _on_Subscribe(self, args):
+    sub = self.subscriptions.setdefault(args['profileId'], Subscription(args['profileAddress']))
+    sub.profileAddress = args['profileAddress']
+    sub.rounds += args['rounds']
+    sub.rollover = args['rollover']
+    sub.balance += args['amount']
+    self.addresses[args['profileId']] = args['profileAddress']
+
+  def _on_SubscriptionRefund(self, args):
+    self.subscriptions[args['profileId']].balance -= args['refund']
+
+  def _on_Unsubscribe(self, args):
+    self.subscriptions.pop(args['profileId'], None)
+
+  def _on_CircuitBreak(self, args):
+    self.stopped = args['stop']
+
+  def fee_due(self, roundId, now):
+    # platform fee of a settled round not withdrawn yet
+    state = self.rounds[roundId]
+    if not self.schedule.is_settle(roundId, now) or base_round(roundId) < self.nextFeeRound:
+      return 0
+    if (state.qualify >> FEE_WITHDRAWN_BIT) & 1:
+      return 0
+    return round_fee(self.config, len(state.profiles), state.qualifyNum)
+
+  def liabilities(self, now):
+    # address => amount owed at `now`:
+    # unclaimed rewards of settled rounds, stakes of unsettled rounds and
+    # subscription balances. Platform fees are returned separately.
+    owed = {}
+
+    def add(address, amount):
+      if amount > 0:
+        owed[address] = owed.get(address, 0) + amount
+
+    fees = 0
+    for roundId, state in self.rounds.items():
+      if (state.qualify >> ARCHIVED_BIT) & 1:
+        continue
+      if self.schedule.is_settle(roundId, now):
+        for profileIndex, profileId in enumerate(state.profiles):
+          if roundId in self.pending.get(profileId, {}):
+            add(self.addresses[profileId], claim_value(
+              self.config,
+              len(state.profiles),
+              state.qualifyNum,
+              state.shares,
+              state.invites.get(profileId, 0)
+            ))
+        fees += self.fee_due(roundId, now)
+      else:
+        # the round never settles after the stop, the stake goes back
+        for profileId, profileAddress, stake, stakeFee in self.stakes.get(roundId, []):
+          add(profileAddress, stake)
+
+    for sub in self.subscriptions.values():
+      add(sub.profileAddress, sub.balance)
+    return owed, fees
+
+
+def pool_balance(address, currency):
+  # currency held by the contract, native when currency is address(0)
+  if int(currency, 16) == 0:
+    return web3.eth.get_balance(address)
+  return web3.eth.contract(address=currency, abi=ERC20_BALANCE_ABI).functions.balanceOf(address).call()
+
+
+def replay(sf, fromBlock=0, toBlock='latest', step=None):
+  state = ReplayState.from_contract(sf)
+  state.apply_logs(fetch_events(sf, fromBlock, toBlock, step=step))
+  return state
+
+
+def stop_time(state):
+  # liabilities are taken at the emergency stop, or now when running
+  if state.stopped and state.stopBlock is not None:
+    return web3.eth.get_block(state.stopBlock)['timestamp']
+  return chain.time()
+
+
+def verify(sf, state):
+  # [(roundId, field, replayed, onchain)] where the replay disagrees with the chain
+  mismatches = []
+  for roundId in sorted(state.rounds):
+    replayed = state.rounds[roundId]
+    qualify, profiles = sf.getRoundData(roundId)
+    if qualify != replayed.qualify:
+      mismatches.append((roundId, 'qualify', replayed.qualify, qualify))
+    if (replayed.qualify >> ARCHIVED_BIT) & 1:
+      continue
+    # unsettled rounds also list subscribers that have not joined yet
+    if list(profiles[:len(replayed.profiles)]) != replayed.profiles:
+      mismatches.append((roundId, 'profiles', replayed.profiles, list(profiles)))
+    for profileId, invites in replayed.invites.items():
+      if profileId in replayed.profiles and sf.getProfileInvites(roundId, profileId) != invites:
+        mismatches.append((roundId, 'invites', invites, sf.getProfileInvites(roundId, profileId)))
+  for profileId, sub in state.subscriptions.items():
+    profileAddress, rounds, balance, rollover = sf.getSubscription(profileId)
+    if (rounds, balance) != (sub.rounds, sub.balance):
+      mismatches.append((profileId, 'subscription', (sub.rounds, sub.balance), (rounds, balance)))
+  return mismatches
+
+
+# Merkle tree verifiable with OpenZeppelin MerkleProof.verify:
+# leaf = keccak256(keccak256(abi.encode(address, uint256))), pairs hashed sorted,
+# an odd node is carried up unchanged
+
+def merkle_leaf(address, amount):
+  return keccak(keccak(_encode(['address', 'uint256'], [to_checksum_address(address), amount])))
+
+
+def _hash_pair(a, b):
+  return keccak(a + b) if a < b else keccak(b + a)
+
+
+def merkle_tree(leaves):
+  # levels from the sorted leaves up to the root
+  levels = [sorted(leaves)]
+  while len(levels[-1]) > 1:
+    level = levels[-1]
+    parents = [_hash_pair(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2 == 1:
+      parents.append(level[-1])
+    levels.append(parents)
+  return levels
+
+
+def merkle_proof(levels, leaf):
+  proof = []
+  index = levels[0].index(leaf)
+  for level in levels[:-1]:
+    sibling = index ^ 1
+    if sibling < len(level):
+      proof.append(level[sibling])
+    index //= 2
+  return proof
+
+
+def verify_proof(root, leaf, proof):
+  node = leaf
+  for sibling in proof:
+    node = _hash_pair(node, sibling)
+  return node == root
+
+
+def refund_list(owed):
+  # {'root', 'total', 'refunds': {address: {'amount', 'proof'}}}
+  leaves = {address: merkle_leaf(address, amount) for address, amount in owed.items()}
+  if not leaves:
+    return {'root': '0x' + bytes(32).hex(), 'total': 0, 'refunds': {}}
+  levels = merkle_tree(list(leaves.values()))
+  refunds = {}
+  for address in sorted(owed):
+    refunds[address] = {
+      'amount': owed[address],
+      'proof': ['0x' + node.hex() for node in merkle_proof(levels, leaves[address])],
+    }
+  return {'root': '0x' + levels[-1][0].hex(), 'total': sum(owed.values()), 'refunds': refunds}
+
+
+def main():
+  sf = stake2Follow[-1]
+  state = replay(sf, step=5000)
+  for mismatch in verify(sf, state):
+    print('mismatch: {}'.format(mismatch))
+
+  owed, fees = state.liabilities(stop_time(state))
+  refunds = refund_list(owed)
+  balance = pool_balance(sf.address, sf.currency())
+  print('owed {} to {} addresses, platform fees {}, contract balance {}'.format(refunds['total'], len(owed), fees, balance))
+  with open('refunds.json', 'w') as f:
+    json.dump(refunds, f, indent=2)
+  print('merkle root {} written to refunds.json'.format(refunds['root']))
+
@@ -0,0 +1,164 @@
+# Off-chain mirror of the Stake2Follow round logic.
+# Everything here must follow the contract semantics exactly, any change to
+# the contract math or schedule should be reflected here.
+
+# field order of getConfig()
+CONFIG_FIELDS = (
+  'stakeValue',
+  'gasFee',
+  'rewardFee',
+  'maxProfiles',
+  'genesis',
+  'ROUND_OPEN_LENGTH',
+  'ROUND_FREEZE_LENGTH',
+  'ROUND_GAP_LENGTH',
+  'firstNFree',
+  'inviteFee',
+  'roundCompensate',
+)
+
+# qualify-bits   exclude-bits   claimed bits
+#  [0 --- 49]    [50------99]  [100------149]
+EXCLUDE_OFFSET = 50
+CLAIMED_OFFSET = 100
+# round flags above the claimed bits
+MATERIALIZED_BIT = 150
+FEE_WITHDRAWN_BIT = 151
+ARCHIVED_BIT = 152
+
+NEGATIVE_BIT = 1 << 255
+
+# shard s of round r is keyed r | s << 128, shard 0 is the round itself
+SHARD_OFFSET = 128
+
+
+def config_dict(config):
+  # tuple returned by getConfig() -> dict
+  return dict(zip(CONFIG_FIELDS, [int(v) for v in config]))
+
+
+def round_key(roundId, shard=0):
+  return roundId | (shard << SHARD_OFFSET)
+
+
+def base_round(roundKey):
+  return roundKey & ((1 << SHARD_OFFSET) - 1)
+
+
+def shard_of(roundKey):
+  return roundKey >> SHARD_OFFSET
+
+
+class RoundSchedule:
+  # takes round keys, every shard follows the schedule of its round
+
+  def __init__(self, genesis, openLength, freezeLength, gapLength, roundCompensate=0, revealLength=0):
+    self.genesis = genesis
+    self.openLength = openLength
+    self.freezeLength = freezeLength
+    self.gapLength = gapLength
+    self.roundCompensate = roundCompensate
+    self.revealLength = revealLength
+    # round r starts at origin + r * gapLength, same as packRoundTiming
+    compensate = roundCompensate & (NEGATIVE_BIT - 1)
+    self.origin = genesis - compensate * gapLength if roundCompensate & NEGATIVE_BIT else genesis + compensate * gapLength
+
+  @classmethod
+  def from_config(cls, config):
+    if not isinstance(config, dict):
+      config = config_dict(config)
+    return cls(
+      config['genesis'],
+      config['ROUND_OPEN_LENGTH'],
+      config['ROUND_FREEZE_LENGTH'],
+      config['ROUND_GAP_LENGTH'],
+      config['roundCompensate'],
+      config.get('ROUND_REVEAL_LENGTH', 0),
+    )
+
+  @classmethod
+  def from_timing(cls, timing, revealLength=0):
+    # from getRoundTiming(), origin stands in for a genesis without compensation
+    origin, gapLength, openLength, freezeLength = timing
+    return cls(origin, openLength, freezeLength, gapLength, 0, revealLength)
+
+  def timing(self):
+    # same fields as getRoundTiming()
+    return (self.origin, self.gapLength, self.openLength, self.freezeLength)
+
+  def start_time(self, roundId):
+    return self.origin + base_round(roundId) * self.gapLength
+
+  def freeze_time(self, roundId):
+    return self.start_time(roundId) + self.openLength
+
+  def settle_time(self, roundId):
+    return self.start_time(roundId) + self.openLength + self.freezeLength
+
+  def is_open(self, roundId, now):
+    startTime = self.start_time(roundId)
+    return now > startTime and now < startTime + self.openLength
+
+  def is_settle(self, roundId, now):
+    return now > self.settle_time(roundId)
+
+  def reveal_deadline(self, roundId):
+    return self.settle_time(roundId) + self.revealLength
+
+  def current_round(self, now):
+    roundId = (now - self.origin) // self.gapLength
+    return roundId, self.start_time(roundId)
+
+
+def is_claimable(qualify, profileNum, profileIndex):
+  if profileNum == 1 and profileIndex == 0:
+    # only one person scenario
+    return True
+  return (qualify >> profileIndex) & 1 == 1
+
+
+def is_excluded(qualify, profileNum, profileIndex):
+  if profileNum == 1 and profileIndex == 0:
+    # only one person scenario
+    return False
+  return (qualify >> (profileIndex + EXCLUDE_OFFSET)) & 1 == 1
+
+
+def is_claimed(qualify, profileIndex):
+  return (qualify >> (profileIndex + CLAIMED_OFFSET)) & 1 == 1
+
+
+def is_winner(qualify, profileNum, profileIndex):
+  return is_claimable(qualify, profileNum, profileIndex) and not is_excluded(qualify, profileNum, profileIndex)
+
+
+def round_summary(qualify, profiles, invites):
+  # (qualifyNum, shares) as stored by updateSettlement for the claims
+  profileNum = len(profiles)
+  qualifyNum = 0
+  shares = 0
+  for i in range(profileNum):
+    if is_winner(qualify, profileNum, i):
+      qualifyNum += 1
+      shares += invites.get(profiles[i], 0)
+  return qualifyNum, shares
+
+
+def claim_value(config, profileNum, qualifyNum, shares, profileInvites):
+  # reward of one winner, same integer math as profileClaim
+  stakeValue = config['stakeValue']
+  reward = stakeValue * (profileNum - qualifyNum)
+  platformReward = reward * config['rewardFee'] // 1000
+  inviteReward = 0
+  if shares > 0:
+    inviteReward = reward * config['inviteFee'] // 1000
+  claimValue = stakeValue + (reward - platformReward - inviteReward) // qualifyNum
+  if shares > 0 and profileInvites > 0:
+    claimValue += inviteReward * profileInvites // shares
+  return claimValue
+
+
+def round_fee(config, profileNum, qualifyNum):
+  # platform fee as computed by withdrawRoundFee
+  reward = config['stakeValue'] * (profileNum - qualifyNum)
+  return (reward // 1000) * config['rewardFee']
@@ -0,0 +1,244 @@
+# Round scenarios for tests, benchmarks and the load generator.
+# A Scenario declares one round: who stakes (and whom they were invited by),
+# the qualify and exclude masks, the claims, and the phase to end in. It
+# compiles to the shortest transaction plan: the masks go out in one
+# profileQualify and one profileExclude, and each phase change is one sleep and
+# one mined block computed from the local schedule, so no round views are read.
+#
+# ScenarioRunner plays plans and takes an evm snapshot at the end of every
+# phase. Every play of a memoizing runner starts from the state the runner
+# first played on, so a plan sharing a prefix with an earlier one reverts to
+# its snapshot instead of sending the transactions again. The node drops every
+# snapshot taken after the one reverted to, and brownie's per-test isolation
+# drops them all, so a runner shares prefixes between the plays of one test or
+# benchmark. The load generator plays rounds one after the other, without it.
+#
+#   base = Scenario().stakers(accounts[1], accounts[2], accounts[3])
+#   played = runner.play(base.qualify(0b011).advance('settle'))
+
+from brownie import accounts, chain, web3
+from scripts.indexer import contract_config
+from scripts.rounds import RoundSchedule
+
+PHASES = ('open', 'freeze', 'settle', 'next')
+
+# seconds of the open window needed to stake a round
+STAKE_MARGIN = 60
+
+
+def wait_until(timestamp):
+  now = chain.time()
+  if timestamp > now:
+    chain.sleep(timestamp - now)
+  chain.mine(1)
+
+
+class Scenario:
+  # immutable, every builder returns a new scenario
+
+  def __init__(self, stakes=(), qualifyMask=0, excludeMask=0, phase='open', claims=(), fee=False):
+    # (profileId, address, refId) in stake order
+    self.stakes = tuple(stakes)
+    self.qualifyMask = qualifyMask
+    self.excludeMask = excludeMask
+    self.phase = phase
+    # profile indexes claiming after settle
+    self.claims = tuple(claims)
+    self.fee = fee
+
+  def _replace(self, **fields):
+    values = dict(
+      stakes=self.stakes,
+      qualifyMask=self.qualifyMask,
+      excludeMask=self.excludeMask,
+      phase=self.phase,
+      claims=self.claims,
+      fee=self.fee,
+    )
+    values.update(fields)
+    return Scenario(**values)
+
+  def stake(self, account, profileId=None, refId=0):
+    if profileId is None:
+      profileId = max([s[0] for s in self.stakes], default=0) + 1
+    return self._replace(stakes=self.stakes + ((profileId, str(account), refId),))
+
+  def stakers(self, *stakers):
+    # profile ids follow the last one staked, starting at 1
+    scenario = self
+    for account in stakers:
+      scenario = scenario.stake(account)
+    return scenario
+
+  def invite(self, refId, *invited):
+    scenario = self
+    for account in invited:
+      scenario = scenario.stake(account, refId=refId)
+    return scenario
+
+  def qualify(self, mask):
+    return self._replace(qualifyMask=self.qualifyMask | mask)
+
+  def exclude(self, mask):
+    return self._replace(excludeMask=self.excludeMask | mask)
+
+  def advance(self, phase):
+    if PHASES.index(phase) < PHASES.index(self.phase):
+      raise ValueError('scenario is already past {}'.format(phase))
+    return self._replace(phase=phase)
+
+  def claim(self, *profileIndexes):
+    return self._replace(claims=self.claims + profileIndexes)
+
+  def withdraw_fee(self):
+    return self._replace(fee=True)
+
+  def plan(self):
+    # the steps to send, phase changes included
+    phase = PHASES.index(self.phase)
+    if self.claims or self.fee:
+      phase = max(phase, PHASES.index('settle'))
+    steps = [('round',)]
+    steps += [('stake',) + stake for stake in self.stakes]
+    if self.qualifyMask or self.excludeMask or phase >= PHASES.index('freeze'):
+      steps.append(('advance', 'freeze'))
+    if self.qualifyMask:
+      steps.append(('qualify', self.qualifyMask))
+    if self.excludeMask:
+      steps.append(('exclude', self.excludeMask))
+    if phase >= PHASES.index('settle'):
+      steps.append(('advance', 'settle'))
+      steps += [('claim', profileIndex) for profileIndex in self.claims]
+      if self.fee:
+        steps.append(('fee',))
+    if phase >= PHASES.index('next'):
+      steps.append(('advance', 'next'))
+    return tuple(steps)
+
+
+class Played:
+
+  def __init__(self, scenario, roundId, schedule):
+    self.scenario = scenario
+    self.roundId = roundId
+    self.schedule = schedule
+    self.profiles = [profileId for profileId, address, refId in scenario.stakes]
+    # step => transaction, kept from the first play of a shared prefix
+    self.txs = {}
+
+  def tx(self, *step):
+    return self.txs[step]
+
+  @property
+  def startTime(self):
+    return self.schedule.start_time(self.roundId)
+
+
+class ScenarioRunner:
+  # with memoize, every play starts from the state of the first one
+
+  def __init__(self, sf, app, owner=None, memoize=True, margin=STAKE_MARGIN):
+    self.sf = sf
+    self.app = app
+    self.owner = owner
+    self.memoize = memoize
+    self.margin = margin
+    self.schedule = RoundSchedule.from_config(contract_config(sf))
+    # plan prefix => (snapshot id, block number, block hash, round id, txs),
+    # the empty prefix is the state plays start from
+    self.snapshots = {}
+
+  def play(self, scenario):
+    steps = scenario.plan()
+    played = Played(scenario, None, self.schedule)
+    done = 0
+    if self.memoize:
+      done = self._restore(steps, played)
+
+    for i in range(done, len(steps)):
+      self._run(played, steps[i])
+      phaseEnd = i + 1 == len(steps) or steps[i + 1][0] == 'advance'
+      if self.memoize and phaseEnd:
+        self.snapshots[steps[:i + 1]] = self._snapshot(played)
+    return played
+
+  def advance(self, played, phase):
+    # move a played round on to `phase`, keeping what was sent since the play
+    self._run(played, ('advance', phase))
+
+  def _snapshot(self, played):
+    block = web3.eth.get_block('latest')
+    snapshotId = web3.provider.make_request('evm_snapshot', [])['result']
+    return (snapshotId, block['number'], block['hash'], played.roundId, dict(played.txs))
+
+  def _valid(self, entry):
+    # a revert below the snapshot by anyone else replaced its block,
+    # and the node may have handed its id to a newer snapshot
+    number, blockHash = entry[1:3]
+    return number <= web3.eth.block_number and web3.eth.get_block(number)['hash'] == blockHash
+
+  def _restore(self, steps, played):
+    # revert to the longest snapshotted prefix of `steps`, returns its length
+    base = self.snapshots.get(())
+    if base is None or not self._valid(base):
+      self.snapshots = {(): self._snapshot(played)}
+    for n in range(len(steps), -1, -1):
+      entry = self.snapshots.get(steps[:n])
+      if entry is None or not self._valid(entry):
+        continue
+      if web3.eth.get_block('latest')['hash'] != entry[2]:
+        self._revert(steps[:n], entry)
+      played.roundId = entry[3]
+      played.txs.update(entry[4])
+      return n
+    return 0
+
+  def _revert(self, prefix, entry):
+    snapshotId = entry[0]
+    web3.provider.make_request('evm_revert', [snapshotId])
+    # the node forgets the snapshot and every later one
+    for other, otherEntry in list(self.snapshots.items()):
+      if int(otherEntry[0], 16) >= int(snapshotId, 16):
+        del self.snapshots[other]
+    self.snapshots[prefix] = (web3.provider.make_request('evm_snapshot', [])['result'],) + entry[1:]
+    # put brownie's clock back in step with the node
+    chain.sleep(0)
+
+  def _run(self, played, step):
+    sf = self.sf
+    kind = step[0]
+    if kind == 'round':
+      # the current round if it stays open long enough to stake, else the next one
+      now = chain.time()
+      roundId, startTime = self.schedule.current_round(now)
+      if not self.schedule.is_open(roundId, now + self.margin):
+        roundId += 1
+      if not self.schedule.is_open(roundId, chain.time()):
+        wait_until(self.schedule.start_time(roundId) + 1)
+      played.roundId = roundId
+      return
+    if kind == 'advance':
+      phase = step[1]
+      if phase == 'freeze':
+        wait_until(self.schedule.freeze_time(played.roundId))
+      elif phase == 'settle':
+        wait_until(self.schedule.settle_time(played.roundId) + 1)
+      else:
+        wait_until(self.schedule.start_time(played.roundId + 1) + 1)
+      return
+
+    if kind == 'stake':
+      profileId, address, refId = step[1:]
+      tx = sf.profileStake(played.roundId, profileId, address, refId, {'from': accounts.at(address)})
+    elif kind == 'qualify':
+      tx = sf.profileQualify(played.roundId, step[1], {'from': self.app})
+    elif kind == 'exclude':
+      tx = sf.profileExclude(played.roundId, step[1], {'from': self.app})
+    elif kind == 'claim':
+      profileId, address, refId = played.scenario.stakes[step[1]]
+      tx = sf.profileClaim(played.roundId, step[1], profileId, {'from': accounts.at(address)})
+    elif kind == 'fee':
+      tx = sf.withdrawRoundFee(played.roundId, {'from': self.owner})
+    else:
+      raise ValueError('unknown step {}'.format(step))
+    played.txs[step] = tx
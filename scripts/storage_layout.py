@@ -0,0 +1,208 @@
+# Storage layout checks for upgrading the Stake2Follow proxy.
+# The layout of the new build comes from the hardhat build-info (the upgrades
+# plugin compiles with storageLayout, brownie artifacts do not have it). It is
+# diffed against the deployed implementation's layout in the OpenZeppelin
+# manifest. The upgrade is then rehearsed on a fork: rounds are played with the
+# load generator, the views are read, the proxy is upgraded to the brownie
+# build and the views must read the same.
+#
+#   STAKE2FOLLOW_PROXY=0x... brownie run storage_layout --network polygon-main-fork
+
+import glob
+import json
+import os
+
+from brownie import Contract, accounts, web3, stake2Follow
+from scripts.loadgen import fund_wrapped, generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# EIP-1967 slots
+IMPLEMENTATION_SLOT = 0x360894a13ba1a3210667c828492db98dca3e2076cc3735a920a3ca505d382bbc
+ADMIN_SLOT = 0xb53127684a568b3173ae13b9f8a6016e243e63b6e8ee1178d6a717850b5d6103
+
+# OpenZeppelin manifest file per chain id
+MANIFEST_NAMES = {
+  137: 'polygon.json',
+  80001: 'polygon-mumbai.json',
+}
+
+PROXY_ADMIN_ABI = [
+  {
+    'type': 'function',
+    'name': 'owner',
+    'stateMutability': 'view',
+    'inputs': [],
+    'outputs': [{'name': '', 'type': 'address'}],
+  },
+  {
+    'type': 'function',
+    'name': 'upgrade',
+    'stateMutability': 'nonpayable',
+    'inputs': [{'name': 'proxy', 'type': 'address'}, {'name': 'implementation', 'type': 'address'}],
+    'outputs': [],
+  },
+]
+
+
+def build_layout(contract='Stake2Follow', source='contracts/Stake2Follow.sol'):
+  # storage layout of the latest hardhat build
+  paths = sorted(glob.glob(os.path.join(ROOT, 'artifacts', 'build-info', '*.json')), key=os.path.getmtime, reverse=True)
+  for path in paths:
+    with open(path) as f:
+      output = json.load(f)['output']
+    layout = output['contracts'].get(source, {}).get(contract, {}).get('storageLayout')
+    if layout:
+      return layout
+  raise ValueError('no storage layout of {} in artifacts/build-info, run npx hardhat compile'.format(contract))
+
+
+def manifest_path(chainId):
+  return os.path.join(ROOT, '.openzeppelin', MANIFEST_NAMES.get(chainId, 'unknown-{}.json'.format(chainId)))
+
+
+def manifest_layout(path, implementation):
+  # layout the manifest recorded for the implementation address
+  with open(path) as f:
+    manifest = json.load(f)
+  for impl in manifest['impls'].values():
+    addresses = [impl['address']] + impl.get('allAddresses', [])
+    if implementation.lower() in [a.lower() for a in addresses]:
+      return impl['layout']
+  raise KeyError('implementation {} not in {}'.format(implementation, path))
+
+
+def type_label(layout, typeId):
+  return layout['types'].get(typeId, {}).get('label', typeId)
+
+
+def variables(layout):
+  # [(label, slot, offset, type label, bytes)] in declaration order
+  return [
+    (
+      v['label'],
+      int(v['slot']),
+      v['offset'],
+      type_label(layout, v['type']),
+      int(layout['types'].get(v['type'], {}).get('numberOfBytes', 32)),
+    )
+    for v in layout['storage']
+  ]
+
+
+def struct_members(layout):
+  # struct label => [(member, slot, offset, type label)]
+  structs = {}
+  for t in layout['types'].values():
+    if t.get('members'):
+      structs[t['label']] = [
+        (m['label'], int(m.get('slot', 0)), m.get('offset', 0), type_label(layout, m['type']))
+        for m in t['members']
+      ]
+  return structs
+
+
+def diff_layouts(old, new):
+  # (errors, warnings) of upgrading a proxy holding `old` to `new`
+  errors = []
+  warnings = []
+  oldVars = variables(old)
+  newVars = variables(new)
+  for i, (label, slot, offset, typeLabel, size) in enumerate(oldVars):
+    if i >= len(newVars):
+      errors.append('{} (slot {}) deleted'.format(label, slot))
+      continue
+    newLabel, newSlot, newOffset, newType, newSize = newVars[i]
+    if (slot, offset) != (newSlot, newOffset):
+      errors.append('{} moved from slot {}+{} to {}+{}'.format(label, slot, offset, newSlot, newOffset))
+    elif typeLabel != newType:
+      errors.append('{} (slot {}) type changed from {} to {}'.format(label, slot, typeLabel, newType))
+    elif label != newLabel:
+      warnings.append('{} (slot {}) renamed to {}'.format(label, slot, newLabel))
+
+  # appended variables start after the last old one
+  end = max((slot + (offset + size + 31) // 32 for label, slot, offset, typeLabel, size in oldVars), default=0)
+  for label, slot, offset, typeLabel, size in newVars[len(oldVars):]:
+    if slot < end:
+      errors.append('{} appended in slot {}, used by the old layout'.format(label, slot))
+
+  # struct values live in mappings and arrays, members may only be appended
+  newStructs = struct_members(new)
+  for label, members in struct_members(old).items():
+    newMembers = newStructs.get(label)
+    if newMembers is None:
+      continue
+    if newMembers[:len(members)] != members:
+      errors.append('{} members changed'.format(label))
+    elif len(newMembers) > len(members):
+      warnings.append('{} members appended, safe only where it is not stored inline'.format(label))
+  return errors, warnings
+
+
+def storage_address(address, slot):
+  return web3.toChecksumAddress('0x' + web3.eth.get_storage_at(address, slot).hex()[-40:])
+
+
+def normalize(value):
+  if isinstance(value, (list, tuple)):
+    return [normalize(v) for v in value]
+  return value
+
+
+def read_views(sf, roundIds, profileIds):
+  # view name => result, read through the proxy
+  views = {'getConfig': normalize(sf.getConfig())}
+  for roundId in roundIds:
+    qualify, profiles = sf.getRoundData(roundId)
+    views['getRoundData({})'.format(roundId)] = [qualify, list(profiles)]
+    for profileId in profiles:
+      views['getProfileInvites({},{})'.format(roundId, profileId)] = sf.getProfileInvites(roundId, profileId)
+  for profileId in profileIds:
+    views['getProfileAddress({})'.format(profileId)] = sf.getProfileAddress(profileId)
+  return views
+
+
+def rehearse_upgrade(proxy, rounds=3, recentRounds=24, fund=10 ** 18):
+  # [(view, before, after)] that the upgrade to the brownie build changes
+  sf = Contract.from_abi('Stake2Follow', proxy, stake2Follow.abi)
+  admin = Contract.from_abi('ProxyAdmin', storage_address(proxy, ADMIN_SLOT), PROXY_ADMIN_ABI)
+  adminOwner = accounts.at(admin.owner(), force=True)
+  owner = accounts.at(sf.owner(), force=True)
+  app = accounts.at(sf.getApp(), force=True)
+  for account in (adminOwner, owner, app):
+    accounts[0].transfer(account, '1 ether')
+  wallets = accounts[1:6]
+  fund_wrapped(sf.currency(), wallets, proxy, fund)
+
+  played = generate(sf, app, owner, wallets, rounds)
+  roundId, startTime = sf.getCurrentRound()
+  roundIds = sorted(set(played) | set(range(max(0, roundId - recentRounds), roundId + 1)))
+  profileIds = sorted({profileId for profiles in played.values() for profileId in profiles})
+  before = read_views(sf, roundIds, profileIds)
+
+  implementation = stake2Follow.deploy({'from': accounts[0]})
+  admin.upgrade(proxy, implementation, {'from': adminOwner})
+  after = read_views(sf, roundIds, profileIds)
+
+  # the upgraded contract keeps playing rounds on the old state
+  generate(sf, app, owner, wallets, 1, firstProfileId=max(profileIds, default=10 ** 9) + 1)
+  return [(view, before[view], after.get(view)) for view in before if before[view] != after.get(view)]
+
+
+def main():
+  proxy = os.environ['STAKE2FOLLOW_PROXY']
+  path = os.environ.get('STORAGE_MANIFEST') or manifest_path(web3.eth.chain_id)
+  implementation = storage_address(proxy, IMPLEMENTATION_SLOT)
+  errors, warnings = diff_layouts(manifest_layout(path, implementation), build_layout())
+  for warning in warnings:
+    print('warning: ' + warning)
+  for error in errors:
+    print('error: ' + error)
+  if errors:
+    print('storage layout is not upgrade safe, not rehearsing the upgrade')
+    return
+
+  mismatches = rehearse_upgrade(proxy)
+  for view, before, after in mismatches:
+    print('{} changed: {} -> {}'.format(view, before, after))
+  print('upgrade of {} {}'.format(proxy, 'changes views' if mismatches else 'keeps every view'))
@@ -1,8 +1,9 @@
 #!/usr/bin/python3
 
 import pytest
-from brownie import stake2Follow
+from brownie import stake2Follow, PermitToken
 from brownie_tokens import ERC20
+from scripts.scenario import ScenarioRunner
 
 @pytest.fixture(scope="function", autouse=True)
 def isolate(fn_isolation):
@@ -39,3 +40,52 @@ def contracts(stake2Follow, accounts):
     currency.approve(sf.address, 100000, {'from': accounts[i]})
 
   return sf, currency
+
+
+@pytest.fixture(scope="module")
+def permit_contracts(stake2Follow, PermitToken, accounts):
+  currency = PermitToken.deploy('Permit Token', 'PMT', 1e8, {'from': accounts[0]})
+
+  sf = stake2Follow.deploy(
+    1000,
+    50,
+    100,
+    5,
+    currency.address,
+    accounts[8], # app
+    accounts[9],  # wallet
+    {'from': accounts[0]}
+  )
+
+  return sf, currency
+
+
+@pytest.fixture(scope="module")
+def native_contracts(stake2Follow, accounts):
+  # currency address(0) stakes the native currency
+  sf = stake2Follow.deploy(
+    1000,
+    50,
+    100,
+    5,
+    '0x0000000000000000000000000000000000000000',
+    accounts[8], # app
+    accounts[9],  # wallet
+    {'from': accounts[0]}
+  )
+
+  return sf
+
+
+@pytest.fixture
+def scenarios(contracts, accounts):
+  # a single play gains nothing from snapshots, they only add calls
+  sf, currency = contracts
+  return ScenarioRunner(sf, accounts[8], accounts[0], memoize=False)
+
+
+@pytest.fixture
+def replay_scenarios(contracts, accounts):
+  # for tests replaying a prefix, snapshots do not outlive the test
+  sf, currency = contracts
+  return ScenarioRunner(sf, accounts[8], accounts[0])
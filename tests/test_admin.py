@@ -169,4 +169,107 @@ def test_withdraw(accounts, contracts):
   stake2follow.withdraw({'from': accounts[0]})
 
   afterBalance = currency.balanceOf(accounts[0])
-  assert afterBalance == beforeBalance + contractBalance
\ No newline at end of file
+  assert afterBalance == beforeBalance + contractBalance
+
+def test_withdraw_round_fee_twice_should_fail(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  chain.mine(1)
+  stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+  stake2follow.profileStake(roundId, 2, accounts[2], 0, {'from': accounts[2]})
+
+  chain.sleep(config[5])
+  chain.mine(1)
+  stake2follow.profileQualify(roundId, 1, {'from': accounts[8]})
+  chain.sleep(config[6])
+  chain.mine(1)
+
+  stake2follow.withdrawRoundFee(roundId)
+  with brownie.reverts("Fee already withdrawn"):
+    stake2follow.withdrawRoundFee(roundId)
+  with brownie.reverts("Fee already withdrawn"):
+    stake2follow.withdrawFeesUpTo(roundId)
+
+
+def test_withdraw_fees_up_to_sweeps_settled_rounds(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  stakeValue = config[0]
+  rewardFee = config[2]
+  roundOpenDur = config[5]
+  roundFreezeDur = config[6]
+  roundGap = config[7]
+
+  rounds = []
+  for i in range(3):
+    roundId, roundStartTime = stake2follow.getCurrentRound()
+    chain.mine(1)
+    stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+    stake2follow.profileStake(roundId, 2, accounts[2], 0, {'from': accounts[2]})
+    stake2follow.profileStake(roundId, 3, accounts[3], 0, {'from': accounts[3]})
+    chain.sleep(roundOpenDur)
+    chain.mine(1)
+    stake2follow.profileQualify(roundId, 1, {'from': accounts[8]})
+    chain.sleep(roundGap - roundOpenDur)
+    chain.mine(1)
+    rounds.append(roundId)
+
+  # one round withdrawn on its own is skipped by the sweep
+  stake2follow.withdrawRoundFee(rounds[1])
+
+  beforeBalance = currency.balanceOf(accounts[9])
+  tx = stake2follow.withdrawFeesUpTo(rounds[2])
+  afterBalance = currency.balanceOf(accounts[9])
+
+  fee = 2 * stakeValue / 1000 * rewardFee
+  assert afterBalance == beforeBalance + 2 * fee
+  assert tx.events['WithdrawFees'][0]['fee'] == 2 * fee
+  assert stake2follow.getNextFeeRound() == rounds[2] + 1
+
+  with brownie.reverts("Fee already withdrawn"):
+    stake2follow.withdrawFeesUpTo(rounds[2])
+  with brownie.reverts("Fee already withdrawn"):
+    stake2follow.withdrawRoundFee(rounds[0])
+
+
+def test_set_next_fee_round_skips_paid_rounds(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  stakeValue = config[0]
+  rewardFee = config[2]
+  roundOpenDur = config[5]
+  roundGap = config[7]
+
+  rounds = []
+  for i in range(3):
+    roundId, roundStartTime = stake2follow.getCurrentRound()
+    chain.mine(1)
+    stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+    stake2follow.profileStake(roundId, 2, accounts[2], 0, {'from': accounts[2]})
+    stake2follow.profileStake(roundId, 3, accounts[3], 0, {'from': accounts[3]})
+    chain.sleep(roundOpenDur)
+    chain.mine(1)
+    stake2follow.profileQualify(roundId, 1, {'from': accounts[8]})
+    chain.sleep(roundGap - roundOpenDur)
+    chain.mine(1)
+    rounds.append(roundId)
+
+  # the fees of the first two rounds were paid before the cursor existed
+  with brownie.reverts("Only the owner can call this function."):
+    stake2follow.setNextFeeRound(rounds[2], {'from': accounts[1]})
+  tx = stake2follow.setNextFeeRound(rounds[2], {'from': accounts[0]})
+  assert tx.events['SetNextFeeRound'][0]['roundId'] == rounds[2]
+  assert stake2follow.getNextFeeRound() == rounds[2]
+  with brownie.reverts("Fee round only moves forward"):
+    stake2follow.setNextFeeRound(rounds[1], {'from': accounts[0]})
+  with brownie.reverts("Fee already withdrawn"):
+    stake2follow.withdrawRoundFee(rounds[1])
+
+  beforeBalance = currency.balanceOf(accounts[9])
+  tx = stake2follow.withdrawFeesUpTo(rounds[2])
+  fee = 2 * stakeValue / 1000 * rewardFee
+  assert currency.balanceOf(accounts[9]) == beforeBalance + fee
+  assert tx.events['WithdrawFees'][0]['fromRound'] == rounds[2]
+  assert tx.events['WithdrawFees'][0]['fee'] == fee
@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+import brownie
+from brownie import *
+from scripts.archive import RoundArchive, payouts, profile_bits, unpack_masks
+
+def play_round(stake2follow, accounts, config, qualify):
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  chain.mine(1)
+  stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+  stake2follow.profileStake(roundId, 2, accounts[2], 1, {'from': accounts[2]})
+  stake2follow.profileStake(roundId, 3, accounts[3], 0, {'from': accounts[3]})
+  chain.sleep(config[5])
+  chain.mine(1)
+  stake2follow.profileQualify(roundId, qualify, {'from': accounts[8]})
+  chain.sleep(config[7] - config[5])
+  chain.mine(1)
+  return roundId
+
+def test_archive_export_and_incremental_append(accounts, contracts, tmp_path):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  archive = RoundArchive(str(tmp_path), partitionSize=2)
+
+  first = play_round(stake2follow, accounts, config, 0b011)
+  tx = stake2follow.profileClaim(first, 0, 1, {'from': accounts[1]})
+  second = play_round(stake2follow, accounts, config, 0b110)
+  assert archive.export(stake2follow) == [0]
+
+  rounds, profiles = next(archive.scan())
+  assert list(rounds['roundId']) == [first, second]
+  assert list(rounds['profileNum']) == [3, 3]
+  assert unpack_masks(rounds['qualify'])[:, :3].tolist() == [[True, True, False], [False, True, True]]
+  assert profile_bits(rounds, profiles, 'qualify').tolist() == [True, True, False, False, True, True]
+  assert profile_bits(rounds, profiles, 'claimed').tolist() == [True, False, False, False, False, False]
+  assert payouts(profiles)[0] == tx.events['ProfileClaim'][0]['fund']
+  assert list(profiles['invites']) == [1, 0, 0, 1, 0, 0]
+
+  # a new round only rewrites its own partition
+  third = play_round(stake2follow, accounts, config, 0b001)
+  assert archive.export(stake2follow) == [2]
+  assert [list(r['roundId']) for r, p in RoundArchive(str(tmp_path)).scan()] == [[first, second], [third]]
+
+  # a late claim rewrites the partition of the claimed round
+  stake2follow.profileClaim(second, 1, 2, {'from': accounts[2]})
+  assert archive.export(stake2follow) == [0]
+  rounds, profiles = archive.load(0)
+  assert unpack_masks(rounds['claimed'])[1, 1]
+
+def test_archive_keeps_payouts_above_64_bits(tmp_path):
+  # odd and above 2**64, float64 would round it
+  payout = 3 * 10 ** 20 + 7
+  state = SimpleNamespace(profiles=[5, 6], qualify=0b11, invites={}, payouts={5: payout, 6: 1000})
+  archive = RoundArchive(str(tmp_path))
+  archive.write_partition(SimpleNamespace(rounds={9: state}), 0)
+  rounds, profiles = archive.load(0)
+  assert list(payouts(profiles)) == [payout, 1000]
@@ -0,0 +1,68 @@
+import brownie
+from brownie import *
+from scripts.indexer import RoundIndexer, fetch_events
+
+def settled_round(stake2follow, accounts, config):
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  chain.mine(1)
+  stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+  stake2follow.profileStake(roundId, 2, accounts[2], 1, {'from': accounts[2]})
+  stake2follow.profileStake(roundId, 3, accounts[3], 1, {'from': accounts[3]})
+  chain.sleep(config[5])
+  chain.mine(1)
+  stake2follow.profileQualify(roundId, 0b011, {'from': accounts[8]})
+  stake2follow.profileExclude(roundId, 0b010, {'from': accounts[8]})
+  chain.sleep(config[6])
+  chain.mine(1)
+  return roundId
+
+def test_archive_round(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  roundId = settled_round(stake2follow, accounts, config)
+  qualify, profiles = stake2follow.getRoundData(roundId)
+
+  with brownie.reverts("Fee not withdrawn"):
+    stake2follow.archiveRound(roundId, {'from': accounts[5]})
+  stake2follow.withdrawRoundFee(roundId)
+  with brownie.reverts("Round has unclaimed rewards"):
+    stake2follow.archiveRound(roundId, {'from': accounts[5]})
+  stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+
+  # anyone can archive
+  tx = stake2follow.archiveRound(roundId, {'from': accounts[5]})
+  event = tx.events['RoundArchived'][0]
+  assert list(event['profiles']) == list(profiles)
+  assert list(event['invites']) == [2, 0, 0]
+  assert (event['qualify'] >> 152) & 1 == 1
+  assert stake2follow.getRoundSummary(roundId) == (event['summary'], True)
+
+  # storage is gone, the round word with the archived flag stays
+  assert stake2follow.getRoundData(roundId) == (event['qualify'], [])
+  assert stake2follow.getProfileInvites(roundId, 1) == 0
+  with brownie.reverts("index out of bound"):
+    stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+  with brownie.reverts("Round already archived"):
+    stake2follow.archiveRound(roundId, {'from': accounts[5]})
+  with brownie.reverts("Fee already withdrawn"):
+    stake2follow.withdrawRoundFee(roundId)
+
+def test_archive_round_after_fee_sweep(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  roundId = settled_round(stake2follow, accounts, config)
+  indexer = RoundIndexer.from_contract(stake2follow)
+
+  with brownie.reverts("Round is not settle"):
+    stake2follow.archiveRound(roundId + 1, {'from': accounts[5]})
+
+  stake2follow.withdrawFeesUpTo(roundId)
+  stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+  indexer.apply_logs(fetch_events(stake2follow))
+  assert indexer.archivable_rounds(chain.time()) == [roundId]
+
+  tx = stake2follow.archiveRound(roundId, {'from': accounts[5]})
+  indexer.apply_tx(tx)
+  assert indexer.archivable_rounds(chain.time()) == []
+  # the indexer still has the round from the events
+  assert indexer.rounds[roundId].profiles == [1, 2, 3]
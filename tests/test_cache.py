@@ -0,0 +1,69 @@
+import brownie
+from brownie import *
+from scripts.cache import ContractCache
+from scripts.metrics import Registry
+
+def test_cache_invalidates_only_affected_entries(accounts, contracts):
+  stake2follow, currency = contracts
+  registry = Registry()
+  cache = ContractCache(stake2follow, registry=registry)
+  config = cache.get_config()
+
+  chain.sleep(3)
+  chain.mine(1)
+  rounds = []
+  for i in range(2):
+    roundId, roundStartTime = stake2follow.getCurrentRound()
+    stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+    stake2follow.profileStake(roundId, 2, accounts[2], 0, {'from': accounts[2]})
+    chain.sleep(config[5])
+    chain.mine(1)
+    stake2follow.profileQualify(roundId, 0b11, {'from': accounts[8]})
+    chain.sleep(config[7] - config[5])
+    chain.mine(1)
+    rounds.append(roundId)
+
+  for roundId in rounds:
+    cache.get_round_data(roundId, chain.time())
+    cache.get_round_data(roundId, chain.time())
+  hits = registry.metrics['stake2follow_cache_hits_total']
+  misses = registry.metrics['stake2follow_cache_misses_total']
+  assert hits.get(cache='round') == 2
+  assert misses.get(cache='round') == 2
+
+  # a claim in the first round only evicts that round
+  cache.apply_tx(stake2follow.profileClaim(rounds[0], 0, 1, {'from': accounts[1]}))
+  qualify, profiles = cache.get_round_data(rounds[0], chain.time())
+  assert (qualify >> 100) & 1 == 1
+  cache.get_round_data(rounds[1], chain.time())
+  assert misses.get(cache='round') == 3
+  assert hits.get(cache='round') == 3
+
+  # config events only evict config
+  cache.apply_tx(stake2follow.setStakeValue(7, {'from': accounts[0]}))
+  assert cache.get_config()[0] == 7
+  assert misses.get(cache='config') == 2
+  cache.get_round_data(rounds[1], chain.time())
+  assert hits.get(cache='round') == 4
+
+  assert 'stake2follow_cache_hits_total{cache="round"} 4' in registry.render()
+
+  # withdrawing one round's fee sets its flag in that round's word
+  cache.apply_tx(stake2follow.withdrawRoundFee(rounds[1], {'from': accounts[0]}))
+  qualify, profiles = cache.get_round_data(rounds[1], chain.time())
+  assert (qualify >> 151) & 1 == 1
+  assert misses.get(cache='round') == 4
+
+def test_cache_is_bounded(accounts, contracts):
+  stake2follow, currency = contracts
+  registry = Registry()
+  cache = ContractCache(stake2follow, maxRounds=2, registry=registry)
+  config = cache.get_config()
+
+  chain.sleep(4 * config[7])
+  chain.mine(1)
+  for roundId in range(3):
+    cache.get_round_data(roundId, chain.time())
+
+  assert list(cache.rounds.entries) == [1, 2]
+  assert registry.metrics['stake2follow_cache_evictions_total'].get(cache='round') == 1
@@ -0,0 +1,69 @@
+import brownie
+from brownie import *
+from scripts.capacity import CapacityController, DemandForecast, DemandIndexer, Round, backtest, demand, read_history, submit
+from scripts.rounds import RoundSchedule
+from scripts.scenario import Scenario
+
+def test_controller_moves_within_bounds():
+  controller = CapacityController(alpha=0.5, margin=0, step=5, freeShare=0.2, maximal=50)
+  # a round that filled in a tenth of its open window wanted ten times its stakes
+  full = Round(1, 10, 2, 1, 1000, 10, 3, 100)
+  assert demand(full) == 100
+  controller.observe(full)
+  assert controller.propose(10, 2) == (15, 0)
+  assert controller.propose(48, 2) == (50, 0)
+
+  # a half empty round gives back slots, and free ones while it has room
+  controller = CapacityController(alpha=0.5, margin=0, step=5, freeShare=0.2, maximal=50)
+  controller.observe(Round(1, 20, 0, 1, 1000, 8, 0, None))
+  assert controller.propose(20, 0) == (15, 3)
+  # without a margin the forecast fills the round, so no free slots
+  assert controller.propose(10, 0) == (8, 0)
+
+  forecast = DemandForecast(alpha=0.5)
+  for value in (10, 20, 10):
+    forecast.update(value)
+  assert forecast.forecast() == 12.5
+  assert forecast.forecast(1) == 12.5 + 5
+
+def test_backtest_serves_more_than_a_fixed_cap():
+  history = [Round(r, 10, 3, 1, 1000, 10, 5, 250) for r in range(20)]
+  reports = backtest(history, {'ewma': dict(alpha=0.5, margin=1, step=5)})
+  assert reports['historical']['served'] == 200
+  assert reports['historical']['turnedAway'] == 20 * 30
+  assert reports['ewma']['served'] > 200
+  assert reports['ewma']['turnedAway'] < reports['historical']['turnedAway']
+
+def test_indexer_counts_relay_stakes_skipped_when_full():
+  indexer = DemandIndexer(RoundSchedule(0, 1000, 100, 2000), 2, 0, 1)
+  full = {'roundId': 3, 'profileId': 9, 'index': 0, 'reason': 'Maximum profile limit reached'}
+  indexer.apply('ProfileStake', {'roundId': 3}, 6010)
+  # not full yet, and other skips are not refusals
+  indexer.apply('RelaySkip', full, 6020)
+  indexer.apply('ProfileStake', {'roundId': 3}, 6030)
+  indexer.apply('RelaySkip', full, 6040)
+  indexer.apply('RelaySkip', dict(full, reason='Signature expired'), 6050)
+  # the open window is over
+  indexer.apply('RelaySkip', full, 7000)
+  assert (indexer.rounds[3].staked, indexer.rounds[3].refused, indexer.rounds[3].fillTime) == (2, 1, 30)
+
+def test_history_counts_refused_stakes(accounts, contracts, scenarios):
+  stake2follow, currency = contracts
+  fromBlock = web3.eth.block_number + 1
+  played = scenarios.play(Scenario().stakers(*accounts[1:6]))
+  with brownie.reverts('Maximum profile limit reached'):
+    stake2follow.profileStake(played.roundId, 6, accounts[6], 0, {'from': accounts[6], 'gas_limit': 500000, 'allow_revert': True})
+  scenarios.advance(played, 'freeze')
+
+  indexer, lastBlock = read_history(stake2follow, fromBlock)
+  [r] = indexer.history(chain.time())
+  assert (r.roundId, r.maxProfiles, r.firstNFree, r.maxShards, r.staked, r.refused) == (played.roundId, 5, 3, 1, 5, 1)
+  assert 0 <= r.fillTime < r.openLength
+
+  controller = CapacityController(step=2, maximal=stake2follow.MAXIMAL_PROFILES())
+  controller.observe(r)
+  maxProfiles, firstNFree = controller.propose(5, 3)
+  assert (maxProfiles, firstNFree) == (7, 1)
+  submit(stake2follow, accounts[0], maxProfiles, firstNFree)
+  assert stake2follow.maxProfiles() == 7
+  assert stake2follow.firstNFree() == 1
@@ -4,129 +4,72 @@ from brownie_tokens import ERC20
 from datetime import datetime, timedelta
 import time
 import math
+from scripts.scenario import Scenario
 
-def stake(stake2follow, accounts):
-  chain.sleep(3)
-  chain.mine(1)
-  config = stake2follow.getConfig()
-  stakeValue = config[0]
-  stakeFee = config[1]
-
-  roundId, roundStartTime = stake2follow.getCurrentRound()
-
-  # 3 paticipants
-  stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
-  stake2follow.profileStake(roundId, 2, accounts[2], 0, {'from': accounts[2]})
-  stake2follow.profileStake(roundId, 3, accounts[3], 0, {'from': accounts[3]})
-
-  return roundId, config[5], config[6], config[7]
-
-def stake_one(stake2follow, accounts):
-  chain.mine(1)
-  config = stake2follow.getConfig()
-  stakeValue = config[0]
-  stakeFee = config[1]
-
-  roundId, roundStartTime = stake2follow.getCurrentRound()
-
-  # 1 paticipants
-  stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
-
-  return roundId, config[5], config[6], config[7]
-
-def test_claim_at_open_time_should_fail(accounts, contracts):
+def test_claim_at_open_time_should_fail(accounts, contracts, scenarios):
   stake2follow, currency = contracts
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake(stake2follow, accounts)
+  played = scenarios.play(Scenario().stakers(accounts[1], accounts[2], accounts[3]))
+  roundId = played.roundId
 
   with brownie.reverts():
     stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
 
 
-def test_claim_at_freeze_time_should_fail(accounts, contracts):
+def test_claim_at_freeze_time_should_fail(accounts, contracts, scenarios):
   stake2follow, currency = contracts
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake(stake2follow, accounts)
+  played = scenarios.play(Scenario().stakers(accounts[1], accounts[2], accounts[3]).advance('freeze'))
+  roundId = played.roundId
 
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
   with brownie.reverts():
     stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
 
-def test_claim_with_no_qualify_should_fail(accounts, contracts):
+def test_claim_with_no_qualify_should_fail(accounts, contracts, scenarios):
   stake2follow, currency = contracts
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake(stake2follow, accounts)
+  played = scenarios.play(Scenario().stakers(accounts[1], accounts[2], accounts[3]).advance('settle'))
+  roundId = played.roundId
 
-  chain.sleep(roundOpenDur + roundFreezeDur)
-  chain.mine(1)
   with brownie.reverts():
     stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
 
-def test_claim_with_no_qualify_but_only_one_player_should_success(accounts, contracts):
+def test_claim_with_no_qualify_but_only_one_player_should_success(accounts, contracts, scenarios):
   stake2follow, currency = contracts
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake_one(stake2follow, accounts)
+  played = scenarios.play(Scenario().stake(accounts[1]).advance('settle'))
+  roundId = played.roundId
 
-  chain.sleep(roundOpenDur + roundFreezeDur)
-  chain.mine(1)
   stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
 
-def test_claim_with_qualify_but_exclude_should_fail(accounts, contracts):
+def test_claim_with_qualify_but_exclude_should_fail(accounts, contracts, scenarios):
   stake2follow, currency = contracts
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake(stake2follow, accounts)
-
-  chain.sleep(roundOpenDur) 
-  chain.mine(1)
-  stake2follow.profileQualify(roundId, 1, {'from': accounts[8]})
-  stake2follow.profileExclude(roundId, 1, {'from': accounts[8]})
-  stake2follow.profileQualify(roundId, 0b010, {'from': accounts[8]})
-  stake2follow.profileExclude(roundId, 0b010, {'from': accounts[8]})
-  chain.sleep(roundFreezeDur)
-  chain.mine(1)
+  played = scenarios.play(Scenario().stakers(accounts[1], accounts[2], accounts[3]).qualify(0b011).exclude(0b011).advance('settle'))
+  roundId = played.roundId
   with brownie.reverts():
     stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
 
   with brownie.reverts():
     stake2follow.profileClaim(roundId, 1, 2, {'from': accounts[2]})
 
-def test_claim_with_not_matched_profile_index_should_fail(accounts, contracts):
+def test_claim_with_not_matched_profile_index_should_fail(accounts, contracts, scenarios):
   stake2follow, currency = contracts
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake(stake2follow, accounts)
-
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
-
-  stake2follow.profileQualify(roundId, 1, {'from': accounts[8]})
-
-  chain.sleep(roundFreezeDur)
-  chain.mine(1)
+  played = scenarios.play(Scenario().stakers(accounts[1], accounts[2], accounts[3]).qualify(1).advance('settle'))
+  roundId = played.roundId
   with brownie.reverts():
     stake2follow.profileClaim(roundId, 0, 2, {'from': accounts[1]})
 
-def test_claim_with_not_matched_wallet_address_should_fail(accounts, contracts):
+def test_claim_with_not_matched_wallet_address_should_fail(accounts, contracts, scenarios):
   stake2follow, currency = contracts
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake(stake2follow, accounts)
-
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
-
-  stake2follow.profileQualify(roundId, 1, {'from': accounts[8]})
-  chain.sleep(roundFreezeDur)
-  chain.mine(1)
+  played = scenarios.play(Scenario().stakers(accounts[1], accounts[2], accounts[3]).qualify(1).advance('settle'))
+  roundId = played.roundId
   with brownie.reverts():
     stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[2]})
 
 
-def test_claim_balance_should_change_as_expected_if_claim_success(accounts, contracts):
+def test_claim_balance_should_change_as_expected_if_claim_success(accounts, contracts, scenarios):
   stake2follow, currency = contracts
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake(stake2follow, accounts)
-
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
-
-  stake2follow.profileQualify(roundId, 1, {'from': accounts[8]})
+  played = scenarios.play(Scenario().stakers(accounts[1], accounts[2], accounts[3]).qualify(1).advance('settle'))
+  roundId = played.roundId
   roundData = stake2follow.getRoundData(roundId, {'from': accounts[8]})
   print('round data: ', roundData)
 
-  chain.sleep(roundFreezeDur)
-
   config = stake2follow.getConfig()
   stakeValue = config[0]
   stakeFee = config[1]
@@ -154,34 +97,20 @@ def test_claim_balance_should_change_as_expected_if_claim_success(accounts, cont
 
 
 
-def test_claim_repeat_claim_should_fail(accounts, contracts):
+def test_claim_repeat_claim_should_fail(accounts, contracts, scenarios):
   stake2follow, currency = contracts
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake(stake2follow, accounts)
-
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
-
-  stake2follow.profileQualify(roundId, 1, {'from': accounts[8]})
-
-  chain.sleep(roundFreezeDur)
+  played = scenarios.play(Scenario().stakers(accounts[1], accounts[2], accounts[3]).qualify(1).advance('settle'))
+  roundId = played.roundId
 
   stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
   with brownie.reverts():
     stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
 
 
-def test_claim_all_profiles_claimable_balance_should_change_as_expected(accounts, contracts):
+def test_claim_all_profiles_claimable_balance_should_change_as_expected(accounts, contracts, scenarios):
   stake2follow, currency = contracts
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake(stake2follow, accounts)
-
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
-
-  stake2follow.profileQualify(roundId, 1, {'from': accounts[8]})
-  stake2follow.profileQualify(roundId, 2, {'from': accounts[8]})
-  stake2follow.profileQualify(roundId, 4, {'from': accounts[8]})
-
-  chain.sleep(roundFreezeDur)
+  played = scenarios.play(Scenario().stakers(accounts[1], accounts[2], accounts[3]).qualify(0b111).advance('settle'))
+  roundId = played.roundId
 
   config = stake2follow.getConfig()
   stakeValue = config[0]
@@ -207,17 +136,12 @@ def test_claim_all_profiles_claimable_balance_should_change_as_expected(accounts
   assert balanceAftereClaim3 == balanceBeforeClaim3 + stakeValue
   assert walletbalanceAfterClaim == walletbalanceBeforeClaim - 3 * stakeValue
 
-def test_claim_no_profiles_claimable_balance_should_change_as_expected(accounts, contracts):
+def test_claim_no_profiles_claimable_balance_should_change_as_expected(accounts, contracts, scenarios):
   stake2follow, currency = contracts
 
   beforeValue = currency.balanceOf(stake2follow.address)
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake(stake2follow, accounts)
-
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
-
-
-  chain.sleep(roundFreezeDur)
+  played = scenarios.play(Scenario().stakers(accounts[1], accounts[2], accounts[3]).advance('settle'))
+  roundId = played.roundId
 
   config = stake2follow.getConfig()
   stakeValue = config[0]
@@ -231,24 +155,18 @@ def test_claim_no_profiles_claimable_balance_should_change_as_expected(accounts,
 
   assert afterValue == beforeValue + 3 * stakeValue 
 
-def test_claim_only_one_profile_paticipant(accounts, contracts):
+def test_claim_only_one_profile_paticipant(accounts, contracts, scenarios):
   stake2follow, currency = contracts
   stake2follow.setFirstNFree(0)
 
   beforeValue = currency.balanceOf(accounts[9])
   beforeValueProfile = currency.balanceOf(accounts[1])
 
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake_one(stake2follow, accounts)
-
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
-
-  stake2follow.profileQualify(roundId, 1, {'from': accounts[8]})
+  played = scenarios.play(Scenario().stake(accounts[1]).qualify(1).advance('settle'))
+  roundId = played.roundId
   roundData = stake2follow.getRoundData(roundId, {'from': accounts[8]})
   print('x round data: {0:b}'.format(roundData[0]))
 
-  chain.sleep(roundFreezeDur)
-
   config = stake2follow.getConfig()
   stakeValue = config[0]
   stakeFee = config[1]
@@ -262,22 +180,19 @@ def test_claim_only_one_profile_paticipant(accounts, contracts):
   assert afterValueProfile == beforeValueProfile - stakeValue * stakeFee / 1000
   assert beforeValue == afterValue - stakeValue * stakeFee / 1000
 
-def test_claim_only_one_profile_paticipant_not_do_qualify(accounts, contracts):
+def test_claim_only_one_profile_paticipant_not_do_qualify(accounts, contracts, scenarios):
   stake2follow, currency = contracts
   stake2follow.setFirstNFree(0)
 
   beforeValue = currency.balanceOf(accounts[9])
   beforeValueProfile = currency.balanceOf(accounts[1])
 
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake_one(stake2follow, accounts)
-
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
-
+  played = scenarios.play(Scenario().stake(accounts[1]).advance('freeze'))
+  roundId = played.roundId
   roundData = stake2follow.getRoundData(roundId, {'from': accounts[8]})
   print('x round data: {0:b}'.format(roundData[0]))
 
-  chain.sleep(roundFreezeDur)
+  scenarios.advance(played, 'settle')
 
   config = stake2follow.getConfig()
   stakeValue = config[0]
@@ -292,31 +207,24 @@ def test_claim_only_one_profile_paticipant_not_do_qualify(accounts, contracts):
   assert afterValueProfile == beforeValueProfile - stakeValue * stakeFee / 1000
   assert beforeValue == afterValue - stakeValue * stakeFee / 1000
 
-def test_claim_with_invites_only_one_profile_invite(accounts, contracts):
+def test_claim_with_invites_only_one_profile_invite(accounts, contracts, replay_scenarios):
   stake2follow, currency = contracts
   stake2follow.setFirstNFree(0)
 
   beforeValueProfile1 = currency.balanceOf(accounts[1])
   beforeValueProfile2 = currency.balanceOf(accounts[2])
 
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake_one(stake2follow, accounts)
-  stake2follow.profileStake(roundId, 2, accounts[2], 1, {'from': accounts[2]})
-  stake2follow.profileStake(roundId, 3, accounts[3], 1, {'from': accounts[3]})
+  invited = Scenario().stake(accounts[1]).invite(1, accounts[2], accounts[3])
+  roundId = replay_scenarios.play(invited).roundId
 
   assert stake2follow.getProfileInvites(roundId, 1) == 2
   assert stake2follow.getProfileInvites(roundId, 2) == 0
 
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
-
-  stake2follow.profileQualify(roundId, 1, {'from': accounts[8]})
-  stake2follow.profileQualify(roundId, 2, {'from': accounts[8]})
-
+  # goes on from the snapshot taken after the stakes
+  replay_scenarios.play(invited.qualify(0b11).advance('settle'))
   roundData = stake2follow.getRoundData(roundId, {'from': accounts[8]})
   print('x round data: {0:b}'.format(roundData[0]))
 
-  chain.sleep(roundFreezeDur)
-
   config = stake2follow.getConfig()
   stakeValue = config[0]
   stakeFee = config[1]
@@ -340,31 +248,24 @@ def test_claim_with_invites_only_one_profile_invite(accounts, contracts):
 
 
 
-def test_claim_with_invites_more_than_one_profile_invite(accounts, contracts):
+def test_claim_with_invites_more_than_one_profile_invite(accounts, contracts, replay_scenarios):
   stake2follow, currency = contracts
   stake2follow.setFirstNFree(0)
 
   beforeValueProfile1 = currency.balanceOf(accounts[1])
   beforeValueProfile2 = currency.balanceOf(accounts[2])
 
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake_one(stake2follow, accounts)
-  stake2follow.profileStake(roundId, 2, accounts[2], 1, {'from': accounts[2]})
-  stake2follow.profileStake(roundId, 3, accounts[3], 2, {'from': accounts[3]})
+  invited = Scenario().stake(accounts[1]).invite(1, accounts[2]).invite(2, accounts[3])
+  roundId = replay_scenarios.play(invited).roundId
 
   assert stake2follow.getProfileInvites(roundId, 1) == 1
   assert stake2follow.getProfileInvites(roundId, 2) == 1
 
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
-
-  stake2follow.profileQualify(roundId, 1, {'from': accounts[8]})
-  stake2follow.profileQualify(roundId, 2, {'from': accounts[8]})
-
+  # goes on from the snapshot taken after the stakes
+  replay_scenarios.play(invited.qualify(0b11).advance('settle'))
   roundData = stake2follow.getRoundData(roundId, {'from': accounts[8]})
   print('x round data: {0:b}'.format(roundData[0]))
 
-  chain.sleep(roundFreezeDur)
-
   config = stake2follow.getConfig()
   stakeValue = config[0]
   stakeFee = config[1]
@@ -388,33 +289,24 @@ def test_claim_with_invites_more_than_one_profile_invite(accounts, contracts):
 
 
 
-def test_claim_with_invites_more_than_one_profile_invite_different_invites(accounts, contracts):
+def test_claim_with_invites_more_than_one_profile_invite_different_invites(accounts, contracts, replay_scenarios):
   stake2follow, currency = contracts
   stake2follow.setFirstNFree(0)
 
   beforeValueProfile1 = currency.balanceOf(accounts[1])
   beforeValueProfile2 = currency.balanceOf(accounts[2])
 
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake_one(stake2follow, accounts)
-  stake2follow.profileStake(roundId, 2, accounts[2], 1, {'from': accounts[2]})
-  stake2follow.profileStake(roundId, 3, accounts[3], 2, {'from': accounts[3]})
-  stake2follow.profileStake(roundId, 4, accounts[4], 2, {'from': accounts[4]})
+  invited = Scenario().stake(accounts[1]).invite(1, accounts[2]).invite(2, accounts[3], accounts[4])
+  roundId = replay_scenarios.play(invited).roundId
 
   assert stake2follow.getProfileInvites(roundId, 1) == 1
   assert stake2follow.getProfileInvites(roundId, 2) == 2
 
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
-
-  stake2follow.profileQualify(roundId, 1, {'from': accounts[8]})
-  stake2follow.profileQualify(roundId, 2, {'from': accounts[8]})
-  stake2follow.profileQualify(roundId, 4, {'from': accounts[8]})
-
+  # goes on from the snapshot taken after the stakes
+  replay_scenarios.play(invited.qualify(0b111).advance('settle'))
   roundData = stake2follow.getRoundData(roundId, {'from': accounts[8]})
   print('x round data: {0:b}'.format(roundData[0]))
 
-  chain.sleep(roundFreezeDur)
-
   config = stake2follow.getConfig()
   stakeValue = config[0]
   stakeFee = config[1]
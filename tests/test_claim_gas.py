@@ -0,0 +1,58 @@
+import brownie
+from brownie import *
+from scripts.rounds import claim_value, config_dict
+from scripts.scenario import Scenario, ScenarioRunner
+
+ROUND_SIZES = [1, 2, 10, 25, 50]
+
+def play_round(runner, accounts, profileNum, firstProfileId):
+  # stake `profileNum` profiles from accounts 1-7 and qualify all of them
+  scenario = Scenario()
+  for i in range(profileNum):
+    scenario = scenario.stake(accounts[1 + i % 7], firstProfileId + i)
+  qualify = (1 << profileNum) - 1
+  played = runner.play(scenario.qualify(qualify).advance('settle'))
+  return played.roundId, played.tx('qualify', qualify)
+
+def test_claim_gas_is_flat(accounts, contracts):
+  stake2follow, currency = contracts
+  stake2follow.setMaxProfiles(50, {'from': accounts[0]})
+  # rounds follow each other, nothing to share
+  runner = ScenarioRunner(stake2follow, accounts[8], accounts[0], memoize=False)
+
+  claims = []
+  fees = []
+  for n, profileNum in enumerate(ROUND_SIZES):
+    firstProfileId = 1000 * (n + 1)
+    roundId, qualify = play_round(runner, accounts, profileNum, firstProfileId)
+    assert qualify.events['RoundSettlement'][0]['qualifyNum'] == profileNum
+    assert stake2follow.getRoundSettlement(roundId) == (True, profileNum, 0)
+
+    claims.append(stake2follow.profileClaim(roundId, 0, firstProfileId, {'from': accounts[1]}).gas_used)
+    fees.append(stake2follow.withdrawRoundFee(roundId, {'from': accounts[0]}).gas_used)
+
+  # only calldata may differ between round sizes
+  assert max(claims) - min(claims) < 500
+  assert max(fees) - min(fees) < 500
+
+def test_settlement_follows_late_stakes(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+  # exclude is allowed while open, the stake after it makes the summary stale
+  stake2follow.profileExclude(roundId, 0b10, {'from': accounts[8]})
+  assert stake2follow.getRoundSettlement(roundId) == (True, 1, 0)
+  stake2follow.profileStake(roundId, 2, accounts[2], 1, {'from': accounts[2]})
+  assert stake2follow.getRoundSettlement(roundId) == (False, 0, 0)
+
+  chain.sleep(config[5])
+  chain.mine(1)
+  stake2follow.profileQualify(roundId, 0b01, {'from': accounts[8]})
+  assert stake2follow.getRoundSettlement(roundId) == (True, 1, 1)
+  chain.sleep(config[6])
+  chain.mine(1)
+  tx = stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+  assert tx.events['ProfileClaim'][0]['fund'] == claim_value(config_dict(config), 2, 1, 1, 1)
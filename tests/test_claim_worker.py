@@ -0,0 +1,139 @@
+import asyncio
+from types import SimpleNamespace
+import brownie
+import pytest
+from brownie import *
+from eth_account import Account
+from scripts.claim_worker import ClaimWorker
+from scripts.client import HttpTransport, Stake2FollowClient
+from scripts.indexer import contract_config
+from scripts.metrics import Registry
+
+def test_worker_notifies_and_relays_after_settle(accounts, permit_contracts):
+  stake2follow, currency = permit_contracts
+  config = stake2follow.getConfig()
+  stakers = [accounts.add() for i in range(3)]
+  for staker in stakers:
+    accounts[0].transfer(staker, '1 ether')
+    currency.transfer(staker, 1e5, {'from': accounts[0]})
+    currency.approve(stake2follow, 1e5, {'from': staker})
+  relayer = accounts.add()
+  accounts[0].transfer(relayer, '1 ether')
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  for i, staker in enumerate(stakers):
+    stake2follow.profileStake(roundId, i + 1, staker, 0, {'from': staker})
+  stake2follow.profileStake(roundId, 4, accounts[4], 0, {'from': accounts[4]})
+
+  notified = []
+
+  async def notify(claim):
+    notified.append(claim)
+
+  async def run():
+    client = Stake2FollowClient(HttpTransport(web3.provider.endpoint_uri), stake2follow.address, stake2follow.abi)
+    worker = await ClaimWorker.from_client(
+      client,
+      relayer=Account.from_key(relayer.private_key),
+      notifiers=[notify],
+      batchSize=1,
+      concurrency=2,
+      registry=Registry(),
+    )
+    worker.opt_in(1, stakers[0])
+    worker.opt_in(2, stakers[1])
+    try:
+      assert await worker.tick() == ([], [])
+      chain.sleep(config[5])
+      chain.mine(1)
+      stake2follow.profileQualify(roundId, 0b1011, {'from': accounts[8]})
+      assert await worker.tick() == ([], [])
+
+      chain.sleep(config[6])
+      chain.mine(1)
+      balances = [currency.balanceOf(staker) for staker in stakers]
+      ethers = [staker.balance() for staker in stakers]
+      claims, receipts = await worker.tick()
+      assert [(c.profileId, c.auto) for c in claims] == [(1, True), (2, True), (4, False)]
+      assert notified == claims
+
+      # one batch per claim, relayer nonces taken in order
+      assert [int(r['status'], 16) for r in receipts] == [1, 1]
+      assert [int(web3.eth.get_transaction(r['transactionHash'])['nonce']) for r in receipts] == [0, 1]
+      for i in range(2):
+        assert currency.balanceOf(stakers[i]) == balances[i] + claims[i].amount
+        assert stakers[i].balance() == ethers[i]
+        assert stake2follow.getNonce(stakers[i]) == 1
+      assert currency.balanceOf(stakers[2]) == balances[2]
+
+      # winners are notified once, the relayed claims leave the pending view
+      assert await worker.tick() == ([], [])
+      assert worker.pending_claims(1, chain.time()) == []
+      assert worker.pending_claims(4, chain.time()) == [(roundId, 3, claims[2].amount)]
+      assert worker.relayed.get() == 2
+    finally:
+      await client.close()
+
+  asyncio.run(run())
+
+def test_worker_waits_for_reveal(accounts, contracts):
+  stake2follow, currency = contracts
+  config = contract_config(stake2follow)
+  config['ROUND_REVEAL_LENGTH'] = 100
+  worker = ClaimWorker(SimpleNamespace(abi=stake2follow.abi), config, registry=Registry())
+  settleTime = worker.schedule.settle_time(7)
+
+  worker.apply('ProfileStake', {'roundId': 7, 'profileId': 1, 'refId': 0})
+  worker.apply('QualifyCommit', {'roundId': 7, 'commitment': b'\x01' * 32})
+  assert worker.due_rounds(settleTime) == []
+  assert worker.due_rounds(settleTime + 1) == []
+  worker.apply('QualifyReveal', {'roundId': 7, 'qualify': 1, 'exclude': 0})
+  worker.apply('ProfileQualify', {'roundId': 7, 'qualify': 1})
+  assert worker.due_rounds(settleTime + 1) == [7]
+  assert [c.profileId for c in worker.winners(7)] == [1]
+  assert worker.due_rounds(worker.schedule.reveal_deadline(7) + 1) == []
+
+def test_worker_survives_failing_notifiers_and_ticks(accounts, contracts):
+  stake2follow, currency = contracts
+  config = contract_config(stake2follow)
+  config['ROUND_REVEAL_LENGTH'] = 100
+  notified = []
+
+  async def notify(claim):
+    notified.append(claim.profileId)
+
+  async def down(claim):
+    if claim.profileId == 1:
+      raise ConnectionError('webhook down')
+
+  worker = ClaimWorker(SimpleNamespace(abi=stake2follow.abi), config, notifiers=[down, notify], maxAttempts=2, registry=Registry())
+  worker.apply('ProfileStake', {'roundId': 7, 'profileId': 1, 'refId': 0})
+  worker.apply('ProfileStake', {'roundId': 7, 'profileId': 2, 'refId': 0})
+  worker.apply('ProfileQualify', {'roundId': 7, 'qualify': 0b11})
+  claims = worker.winners(7)
+
+  # the other notifier and the other claim still go out
+  asyncio.run(worker.notify(claims))
+  assert notified == [1, 2]
+  assert worker.notifyFailures.get(auto='false') == 1
+  assert worker.notifications.get(auto='false') == 3
+  # retried once more, then dropped
+  asyncio.run(worker.notify([]))
+  asyncio.run(worker.notify([]))
+  assert worker.notifyFailures.get(auto='false') == 2
+  assert worker.unnotified == []
+
+  ticks = []
+
+  async def tick():
+    ticks.append(1)
+    if len(ticks) == 3:
+      raise asyncio.CancelledError()
+    raise ConnectionError('node down')
+
+  worker.tick = tick
+  with pytest.raises(asyncio.CancelledError):
+    asyncio.run(worker.run(0))
+  assert worker.errors.get() == 2
@@ -0,0 +1,136 @@
+import asyncio
+import brownie
+import pytest
+from brownie import *
+from aiohttp import web
+from eth_account import Account
+from scripts.client import HttpTransport, JsonRpcError, Stake2FollowClient, _encode
+
+async def mock_rpc(handler):
+  # local JSON-RPC server, returns (url, list of received POST bodies)
+  posts = []
+
+  def respond(req):
+    # a handler that raises answers with a JSON-RPC error
+    try:
+      return {'jsonrpc': '2.0', 'id': req['id'], 'result': handler(req)}
+    except Exception as e:
+      return {'jsonrpc': '2.0', 'id': req['id'], 'error': {'code': -32000, 'message': str(e)}}
+
+  async def rpc(request):
+    body = await request.json()
+    posts.append(body)
+    batch = body if isinstance(body, list) else [body]
+    responses = [respond(req) for req in batch]
+    return web.json_response(responses if isinstance(body, list) else responses[0])
+
+  app = web.Application()
+  app.router.add_post('/', rpc)
+  runner = web.AppRunner(app)
+  await runner.setup()
+  site = web.TCPSite(runner, '127.0.0.1', 0)
+  await site.start()
+  port = site._server.sockets[0].getsockname()[1]
+  return runner, 'http://127.0.0.1:{}/'.format(port), posts
+
+def test_client_batches_and_coalesces_reads(contracts):
+  stake2follow, currency = contracts
+  config = tuple(stake2follow.getConfig())
+
+  async def run():
+    client = Stake2FollowClient(None, stake2follow.address, stake2follow.abi)
+    getConfig = client.functions['getConfig']
+    getStakeValue = client.functions['getStakeValue']
+    results = {
+      getConfig.selector.hex(): '0x' + _encode(getConfig.outputs, list(config)).hex(),
+      getStakeValue.selector.hex(): '0x' + _encode(getStakeValue.outputs, [config[0]]).hex(),
+    }
+
+    runner, url, posts = await mock_rpc(lambda req: results[req['params'][0]['data'][2:10]])
+    client.transport = HttpTransport(url)
+    try:
+      values = await asyncio.gather(
+        client.getConfig(),
+        client.getConfig(),
+        client.getStakeValue(),
+        client.getStakeValue(),
+      )
+      # one HTTP request carrying one eth_call per distinct read
+      assert len(posts) == 1
+      assert len(posts[0]) == 2
+      assert values[0] == config
+      assert values[1] == config
+      assert values[2] == config[0]
+
+      # getConfig is served from the ttl cache
+      await client.getConfig()
+      assert len(posts) == 1
+      await client.getStakeValue()
+      assert len(posts) == 2
+    finally:
+      await client.close()
+      await runner.cleanup()
+
+  asyncio.run(run())
+
+def test_client_reads_and_writes_on_local_node(accounts, contracts):
+  stake2follow, currency = contracts
+  chain.sleep(3)
+  chain.mine(1)
+
+  async def run():
+    client = Stake2FollowClient(HttpTransport(web3.provider.endpoint_uri), stake2follow.address, stake2follow.abi)
+    try:
+      assert await client.getConfig() == tuple(stake2follow.getConfig())
+      roundId, startTime = await client.getCurrentRound()
+
+      txHash = await client.profileStake(roundId, 1, accounts[1].address, 0, sender=accounts[1].address)
+      receipt = await client.wait_for_receipt(txHash)
+      assert int(receipt['status'], 16) == 1
+
+      qualify, profiles = await client.getRoundData(roundId)
+      assert list(profiles) == [1]
+    finally:
+      await client.close()
+
+  asyncio.run(run())
+
+def test_client_releases_nonce_of_failed_send(contracts):
+  stake2follow, currency = contracts
+  account = Account.create()
+  sent = []
+
+  def handler(req):
+    if req['method'] == 'eth_sendRawTransaction':
+      sent.append(req['params'][0])
+      if len(sent) == 1:
+        raise ValueError('nonce too low')
+      return '0x' + '11' * 32
+    return {
+      'eth_getTransactionCount': '0x7',
+      'eth_gasPrice': '0x1',
+      'eth_chainId': '0x1',
+    }[req['method']]
+
+  async def run():
+    client = Stake2FollowClient(None, stake2follow.address, stake2follow.abi)
+    runner, url, posts = await mock_rpc(handler)
+    client.transport = HttpTransport(url)
+    fn = client.functions['profileStake']
+    try:
+      with pytest.raises(JsonRpcError):
+        await client.transact(fn, [1, 1, account.address, 0], account=account, gas=300000)
+      assert client.nonces[account.address] == 7
+
+      await client.transact(fn, [1, 1, account.address, 0], account=account, gas=300000)
+      assert client.nonces[account.address] == 8
+      # the retry signed the same nonce again
+      assert Account.recover_transaction(sent[1]) == account.address
+      assert sent[0] == sent[1]
+      # nodes only take 0x prefixed data, recover_transaction accepts both
+      assert sent[0].startswith('0x')
+    finally:
+      await client.close()
+      await runner.cleanup()
+
+  asyncio.run(run())
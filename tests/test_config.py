@@ -3,6 +3,7 @@ from brownie import *
 from datetime import datetime, timedelta
 import time
 import math
+from scripts.rounds import RoundSchedule
 
 def test_get_config(accounts, contracts):
   stake2follow, currency = contracts
@@ -46,6 +47,29 @@ def test_get_curent_round(accounts, contracts):
     assert roundId == roundData[0]
 
 
+def test_round_timing_follows_duration_reset(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  assert stake2follow.getRoundTiming() == RoundSchedule.from_config(config).timing()
+
+  stake2follow.circuitBreaker({'from': accounts[0]})
+  # shorter rounds compensate forward, longer ones backward
+  for factor in (2, 1):
+    chain.sleep(20 * config[7])
+    chain.mine(1)
+    roundId = stake2follow.getCurrentRound()[0]
+    stake2follow.resetRoundDuration(config[5] // factor, config[6] // factor, config[7] // factor, {'from': accounts[0]})
+    schedule = RoundSchedule.from_config(stake2follow.getConfig())
+    assert stake2follow.getRoundTiming() == schedule.timing()
+
+    nextRoundId, startTime = stake2follow.getCurrentRound()
+    assert nextRoundId == roundId + 1
+    assert startTime == schedule.start_time(nextRoundId)
+    assert RoundSchedule.from_timing(stake2follow.getRoundTiming()).settle_time(nextRoundId) == schedule.settle_time(nextRoundId)
+
+  with brownie.reverts("Invalid round duration"):
+    stake2follow.resetRoundDuration(1, 1, 1 << 32, {'from': accounts[0]})
+
 def test_get_round_data(accounts, contracts):
   stake2follow, currency = contracts
   config = stake2follow.getConfig()
@@ -0,0 +1,69 @@
+import glob
+import os
+import pytest
+from scripts.differential import GANACHE_CMD, BrownieStack, load_scenario, normalize, report, resolve
+
+SCENARIOS = sorted(glob.glob(os.path.join(os.path.dirname(__file__), 'scenarios', '*')))
+
+@pytest.fixture(scope='module')
+def brownie_stack():
+  # its own ganache with the brownie build, as a differential worker runs it
+  stack = BrownieStack('brownie', os.environ.get('DIFFERENTIAL_GANACHE', GANACHE_CMD))
+  yield stack
+  stack.stop()
+
+@pytest.mark.parametrize('path', SCENARIOS)
+def test_scenarios_load(path):
+  scenario = load_scenario(path)
+  assert scenario['deploy']['app'] == 8
+  for step in scenario['steps']:
+    if 'revert' in step:
+      assert 'call' in step
+
+def test_report_compares_stacks():
+  labels = {'0xaa': 'account1', '0xbb': 'sf'}
+  names = {'account1': '0xAA', 'round': 7}
+  assert resolve(['$round', 1, '$account1'], names) == [7, 1, '0xAA']
+  assert normalize(('0xAA', b'\x01', {'to': '0xBB'}), labels) == ['account1', '0x01', {'to': 'sf'}]
+
+  scenario = {'name': 'claim', 'steps': [
+    {'call': 'profileClaim'},
+    {'call': 'profileClaim', 'revert': 'Round is not settle'},
+    {'view': 'getCurrentRound', 'ignore': ['result']},
+  ]}
+  outcomes = {
+    'brownie': [
+      {'status': 'ok', 'balances': {'account1': 1050}, 'gas': 60000},
+      {'status': 'revert', 'reason': 'Round is not settle'},
+      {'result': [7, 100]},
+    ],
+    'hardhat': [
+      {'status': 'ok', 'balances': {'account1': 1000}, 'gas': 63000},
+      {'status': 'revert', 'reason': 'Round is not settle'},
+      {'result': [7, 101]},
+    ],
+  }
+  r = report(scenario, outcomes)
+  assert not r['ok']
+  assert [s['diff'] for s in r['steps']] == [['balances'], [], []]
+  assert r['steps'][0]['gas'] == {'brownie': 60000, 'hardhat': 63000}
+
+@pytest.mark.parametrize('path', SCENARIOS)
+def test_scenarios_run_on_brownie_stack(path, brownie_stack):
+  scenario = load_scenario(path)
+  outcomes = brownie_stack.run(scenario)
+  for step, outcome in zip(scenario['steps'], outcomes):
+    if 'call' not in step:
+      continue
+    if 'revert' in step:
+      assert (outcome['status'], outcome['reason']) == ('revert', step['revert']), step
+    else:
+      assert outcome['status'] == 'ok', (step, outcome.get('reason'))
+
+def test_reveal_scenario_claims_on_brownie_stack(brownie_stack):
+  scenario = load_scenario(os.path.join(os.path.dirname(__file__), 'scenarios', 'commit_reveal_happy.yaml'))
+  outcomes = brownie_stack.run(scenario)
+  events = [e[1] for o in outcomes for e in o.get('events', [])]
+  assert events.count('QualifyReveal') == 1
+  claims = [e for o in outcomes for e in o.get('events', []) if e[1] == 'ProfileClaim']
+  assert len(claims) == 1 and claims[0][2]['profileAddress'] == 'account1'
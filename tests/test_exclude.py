@@ -4,40 +4,19 @@ from brownie_tokens import ERC20
 from datetime import datetime, timedelta
 import time
 import math
+from scripts.scenario import Scenario
 
-def stake(stake2follow, accounts):
-  chain.sleep(3)
-  chain.mine(1)
-  config = stake2follow.getConfig()
-  stakeValue = config[0]
-  stakeFee = config[1]
-
-  roundId, roundStartTime = stake2follow.getCurrentRound()
-
-  # 3 paticipants
-  stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
-  stake2follow.profileStake(roundId, 2, accounts[2], 0, {'from': accounts[2]})
-  stake2follow.profileStake(roundId, 3, accounts[3], 0, {'from': accounts[3]})
-
-  return roundId, config[5], config[6], config[7]
-
-def test_exclude_at_settle_time_should_fail(accounts, contracts):
+def test_exclude_at_settle_time_should_fail(accounts, contracts, scenarios):
   stake2follow, currency = contracts
   chain.mine(5)
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake(stake2follow, accounts)
-
-  chain.sleep(roundOpenDur + roundFreezeDur)
-  chain.mine(1)
+  roundId = scenarios.play(Scenario().stakers(accounts[1], accounts[2], accounts[3]).advance('settle')).roundId
   with brownie.reverts():
     stake2follow.profileExclude(roundId, 1, {'from': accounts[8]})
 
-def test_exclude_at_freeze_time_success(accounts, contracts):
+def test_exclude_at_freeze_time_success(accounts, contracts, scenarios):
   stake2follow, currency = contracts
   chain.mine(1)
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake(stake2follow, accounts)
-
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
+  roundId = scenarios.play(Scenario().stakers(accounts[1], accounts[2], accounts[3]).advance('freeze')).roundId
   stake2follow.profileExclude(roundId, 1, {'from': accounts[8]})
 
   # check bit is set
@@ -56,12 +35,9 @@ def test_exclude_at_freeze_time_success(accounts, contracts):
   assert len(profiles) == 3
 
 
-def test_exclude_with_zero_should_fail(accounts, contracts):
+def test_exclude_with_zero_should_fail(accounts, contracts, scenarios):
   stake2follow, currency = contracts
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake(stake2follow, accounts)
-
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
+  roundId = scenarios.play(Scenario().stakers(accounts[1], accounts[2], accounts[3]).advance('freeze')).roundId
 
   with brownie.reverts():
     stake2follow.profileExclude(roundId, 0, {'from': accounts[8]})
@@ -76,12 +52,9 @@ def test_exclude_with_no_paticipants_should_fail(accounts, contracts):
   with brownie.reverts():
     stake2follow.profileExclude(roundId, 1, {'from': accounts[8]})
 
-def test_exclude_using_not_app_address_should_fail(accounts, contracts):
+def test_exclude_using_not_app_address_should_fail(accounts, contracts, scenarios):
   stake2follow, currency = contracts
-  roundId, roundOpenDur, roundFreezeDur, roundGap = stake(stake2follow, accounts)
-
-  chain.sleep(roundOpenDur)
-  chain.mine(1)
+  roundId = scenarios.play(Scenario().stakers(accounts[1], accounts[2], accounts[3]).advance('freeze')).roundId
   with brownie.reverts():
     stake2follow.profileExclude(roundId, 1, {'from': accounts[0]})
     stake2follow.profileExclude(roundId, 1, {'from': accounts[1]})
@@ -0,0 +1,62 @@
+import brownie
+from brownie import *
+from scripts.exporter import Exporter
+from scripts.metrics import Registry
+
+def test_exporter_tracks_rounds_incrementally(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  stakeValue = config[0]
+  maxProfiles = config[3]
+  registry = Registry()
+  exporter = Exporter(stake2follow, registry=registry)
+  metrics = registry.metrics
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  stakes = []
+  for i in range(1, 5):
+    stakes.append(stake2follow.profileStake(roundId, i, accounts[i], 0, {'from': accounts[i]}))
+  chain.sleep(config[5])
+  chain.mine(1)
+  stake2follow.profileQualify(roundId, 0b0011, {'from': accounts[8]})
+  chain.sleep(config[6])
+  chain.mine(1)
+  claim = stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+  fund = claim.events['ProfileClaim'][0]['fund']
+
+  exporter.poll()
+  assert metrics['stake2follow_round_stakes'].get(round=roundId, shard=0) == 4
+  assert metrics['stake2follow_round_fill_ratio'].get(round=roundId, shard=0) == 4 / maxProfiles
+  assert metrics['stake2follow_round_qualify_rate'].get(round=roundId, shard=0) == 0.5
+  assert metrics['stake2follow_claims_total'].get() == 1
+  assert metrics['stake2follow_claim_latency_seconds_count'].get() == 1
+  assert metrics['stake2follow_claim_latency_seconds_sum'].get() == claim.timestamp - (roundStartTime + config[5] + config[6])
+  # profile 2 won the same amount and has not claimed
+  assert metrics['stake2follow_unclaimed_liability'].get() == fund
+  assert metrics['stake2follow_stake_fees_total'].get() == stakeValue // 1000 * config[1]
+  assert metrics['stake2follow_gas_used_total'].get(function='profileStake') == sum(tx.gas_used for tx in stakes)
+  assert metrics['stake2follow_transactions_total'].get(function='profileClaim') == 1
+  assert metrics['stake2follow_contract_balance'].get() == currency.balanceOf(stake2follow)
+
+  # the next poll only applies new blocks
+  lastBlock = exporter.lastBlock
+  stake2follow.profileClaim(roundId, 1, 2, {'from': accounts[2]})
+  exporter.poll()
+  assert exporter.lastBlock == lastBlock + 1
+  assert metrics['stake2follow_claims_total'].get() == 2
+  assert metrics['stake2follow_unclaimed_liability'].get() == 0
+  assert metrics['stake2follow_transactions_total'].get(function='profileStake') == 4
+
+  stake2follow.withdrawRoundFee(roundId)
+  exporter.poll()
+  assert metrics['stake2follow_platform_fees_total'].get() == 2 * stakeValue / 1000 * config[2]
+
+  # old rounds leave the per-round series
+  chain.sleep(config[7] * 3)
+  chain.mine(1)
+  exporter.window = 1
+  exporter.poll()
+  assert metrics['stake2follow_round_stakes'].values == {}
+  assert 'stake2follow_stakes_total 4' in registry.render()
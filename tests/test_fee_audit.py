@@ -0,0 +1,36 @@
+import brownie
+from brownie import *
+from scripts.fee_audit import Case, audit_case, random_cases, screen, spot_check
+
+def test_audit_case_finds_stranded_fees():
+  # withdrawRoundFee truncates the reward to whole thousands, the claims do not
+  flows = audit_case(Case(1999, 50, 100, 0, 0, 2, 1, ()))
+  assert flows.claims == (1999 + 1999 - 199,)
+  assert flows.roundFee == 100
+  assert flows.feeGap == 99
+  assert flows.stranded == 99
+  assert flows.feeShortfall == 2 * (99 - 50)
+
+  # a 6 decimal stake only loses the division among the winners
+  flows = audit_case(Case(2 * 10 ** 6, 50, 100, 200, 3, 5, 3, (2,)))
+  assert flows.feeGap == 0
+  assert flows.feeShortfall == 0
+  assert flows.stranded == 1
+
+def test_screen_reports_worst_cases():
+  report = screen(random_cases(2000, seed=1), top=3)
+  assert report['cases'] == 2000
+  assert report['negative'] == []
+  assert 0 < report['stranding'] <= 2000
+  assert len(report['worst']) == 3
+  shares = [share for share, stranded, case in report['worst']]
+  assert shares == sorted(shares, reverse=True)
+  assert report['worst'][0][1] == audit_case(report['worst'][0][2]).stranded
+
+def test_spot_check_matches_contract(accounts, contracts):
+  stake2follow, currency = contracts
+  firstProfileId = 1
+  for case in (Case(1999, 50, 100, 0, 0, 2, 1, ()), Case(999, 30, 100, 200, 1, 5, 2, (2,))):
+    flows, left = spot_check(stake2follow, accounts[0], accounts[8], accounts[1:8], case, firstProfileId)
+    assert left == flows.stranded
+    firstProfileId += case.profileNum
@@ -0,0 +1,96 @@
+import brownie
+from brownie import *
+from scripts.indexer import (
+  RoundIndexer,
+  fetch_address_events,
+  fetch_events,
+  fetch_profile_events,
+  fetch_round_events,
+)
+
+def test_pending_claims_match_claimed_fund(accounts, contracts):
+  stake2follow, currency = contracts
+  indexer = RoundIndexer.from_contract(stake2follow)
+  config = stake2follow.getConfig()
+  roundOpenDur = config[5]
+  roundFreezeDur = config[6]
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  indexer.apply_tx(stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]}))
+  indexer.apply_tx(stake2follow.profileStake(roundId, 2, accounts[2], 1, {'from': accounts[2]}))
+  indexer.apply_tx(stake2follow.profileStake(roundId, 3, accounts[3], 1, {'from': accounts[3]}))
+
+  chain.sleep(roundOpenDur)
+  chain.mine(1)
+  indexer.apply_tx(stake2follow.profileQualify(roundId, 0b011, {'from': accounts[8]}))
+  indexer.apply_tx(stake2follow.profileExclude(roundId, 0b010, {'from': accounts[8]}))
+
+  # not settled yet
+  assert indexer.pending_claims(1, chain.time()) == []
+
+  chain.sleep(roundFreezeDur)
+  chain.mine(1)
+  assert indexer.pending_claims(2, chain.time()) == []
+  assert indexer.pending_claims(3, chain.time()) == []
+  claims = indexer.pending_claims(1, chain.time())
+  assert len(claims) == 1
+  assert claims[0][:2] == (roundId, 0)
+
+  tx = stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+  assert tx.events['ProfileClaim'][0]['fund'] == claims[0][2]
+
+  indexer.apply_tx(tx)
+  assert indexer.pending_claims(1, chain.time()) == []
+
+def test_pending_claims_only_one_profile_without_qualify(accounts, contracts):
+  stake2follow, currency = contracts
+  indexer = RoundIndexer.from_contract(stake2follow)
+  config = stake2follow.getConfig()
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  indexer.apply_tx(stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]}))
+
+  chain.sleep(config[5] + config[6])
+  chain.mine(1)
+  assert indexer.pending_claims(1, chain.time()) == [(roundId, 0, config[0])]
+
+def test_fetch_events_filtered_by_topic(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+  stake2follow.profileStake(roundId, 2, accounts[2], 1, {'from': accounts[2]})
+
+  chain.sleep(config[5])
+  chain.mine(1)
+  stake2follow.profileQualify(roundId, 0b01, {'from': accounts[8]})
+
+  chain.sleep(config[6])
+  chain.mine(1)
+  stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+
+  events = fetch_profile_events(stake2follow, 1)
+  assert [e['event'] for e in events] == ['ProfileStake', 'ProfileClaim']
+  assert all(e['args']['profileId'] == 1 for e in events)
+
+  events = fetch_address_events(stake2follow, accounts[2].address)
+  assert [e['event'] for e in events] == ['ProfileStake']
+  assert events[0]['args']['refId'] == 1
+
+  events = fetch_round_events(stake2follow, roundId)
+  assert [e['event'] for e in events] == ['ProfileStake', 'ProfileStake', 'ProfileQualify', 'ProfileClaim']
+  assert fetch_round_events(stake2follow, roundId + 1) == []
+
+  # the indexer rebuilt from logs agrees with the chain
+  indexer = RoundIndexer.from_contract(stake2follow)
+  indexer.apply_logs(fetch_events(stake2follow))
+  qualify, profiles = stake2follow.getRoundData(roundId)
+  assert indexer.rounds[roundId].profiles == list(profiles)
+  assert indexer.rounds[roundId].qualify == qualify
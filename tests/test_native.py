@@ -0,0 +1,78 @@
+import brownie
+from brownie import *
+from scripts.preflight import stake_cost
+from scripts.relayer import NO_PERMIT, sign_stake
+from scripts.rounds import config_dict
+
+def test_native_stake_and_claim(accounts, native_contracts):
+  stake2follow = native_contracts
+  config = config_dict(stake2follow.getConfig())
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+
+  with brownie.reverts("Invalid stake value"):
+    stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1], 'value': config['stakeValue'] - 1})
+
+  wallet = accounts[9].balance()
+  fees = 0
+  for i in range(4):
+    cost = stake_cost(config, i)
+    fees += cost - config['stakeValue']
+    stake2follow.profileStake(roundId, i + 1, accounts[i + 1], 0, {'from': accounts[i + 1], 'value': cost})
+  # the fee goes on to the wallet, the stakes stay in the pool
+  assert fees > 0
+  assert accounts[9].balance() == wallet + fees
+  assert stake2follow.balance() == 4 * config['stakeValue']
+
+  chain.sleep(config['ROUND_OPEN_LENGTH'])
+  chain.mine(1)
+  stake2follow.profileQualify(roundId, 0b0011, {'from': accounts[8]})
+  chain.sleep(config['ROUND_FREEZE_LENGTH'])
+  chain.mine(1)
+
+  balance = accounts[1].balance()
+  tx = stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+  fund = tx.events['ProfileClaim'][0]['fund']
+  assert fund > config['stakeValue']
+  assert accounts[1].balance() == balance + fund - tx.gas_used * tx.gas_price
+  with brownie.reverts("Profile already claimed"):
+    stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+
+  balance = accounts[9].balance()
+  tx = stake2follow.withdrawRoundFee(roundId, {'from': accounts[0]})
+  assert accounts[9].balance() == balance + tx.events['WithdrawRoundFee'][0]['fee']
+
+def test_native_pool_needs_the_value_with_the_call(accounts, native_contracts):
+  stake2follow = native_contracts
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  staker = accounts.add()
+  accounts[0].transfer(staker, '1 ether')
+  deadline = chain.time() + 3600
+
+  # a relayer can not pay the stake of the signer
+  signature = sign_stake(staker, stake2follow, roundId, 1, 0, deadline)
+  tx = stake2follow.relayStakes([(roundId, 1, staker, 0, deadline, NO_PERMIT, signature)], {'from': accounts[0]})
+  assert tx.events['RelaySkip'][0]['reason'] == "Invalid stake value"
+
+  # subscriptions are prefunded with the call too, the fee is charged up front
+  config = config_dict(stake2follow.getConfig())
+  amount = 2 * stake_cost(config, config['firstNFree'])
+  with brownie.reverts("Invalid stake value"):
+    stake2follow.subscribe(2, accounts[2], 2, 0, False, {'from': accounts[2]})
+  stake2follow.subscribe(2, accounts[2], 2, 0, False, {'from': accounts[2], 'value': amount})
+  balance = accounts[2].balance()
+  tx = stake2follow.unsubscribe(2, {'from': accounts[2]})
+  refund = tx.events['Unsubscribe'][0]['refund']
+  assert refund == amount
+  assert accounts[2].balance() == balance + refund - tx.gas_used * tx.gas_price
+
+def test_erc20_pool_rejects_value(accounts, contracts):
+  stake2follow, currency = contracts
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  with brownie.reverts("Invalid stake value"):
+    stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1], 'value': 1000})
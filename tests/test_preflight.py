@@ -0,0 +1,153 @@
+import asyncio
+import os
+import re
+import brownie
+from brownie import *
+from scripts.client import HttpTransport, Stake2FollowClient
+from scripts.preflight import CONTRACT_REASONS, Preflight, check_stake, stake_cost
+from scripts.rounds import config_dict
+
+SOURCE = os.path.join(os.path.dirname(__file__), '..', 'contracts', 'Stake2Follow.sol')
+
+def require_strings(source, name):
+  # revert strings of one function or modifier body
+  start = source.index(name)
+  end = source.index('\n    }\n', start)
+  return set(re.findall(r'require\(.*?, "(.*?)"\);', source[start:end]))
+
+def test_reasons_match_contract_revert_strings():
+  with open(SOURCE) as f:
+    source = f.read()
+  strings = set()
+  for name in (
+    'modifier stopInEmergency',
+    'modifier onlyApp',
+    'function stake(',
+    'function bindProfile(',
+    'function claim(',
+    'function profileQualify(',
+    'function profileExclude(',
+    'function pullCurrency(',
+    'function payCurrency(',
+  ):
+    strings |= require_strings(source, name)
+  assert set(CONTRACT_REASONS.values()) == strings
+
+def test_check_stake_follows_contract_order():
+  config = {
+    'stakeValue': 1000, 'gasFee': 50, 'rewardFee': 100, 'maxProfiles': 2, 'genesis': 0,
+    'ROUND_OPEN_LENGTH': 1000, 'ROUND_FREEZE_LENGTH': 100, 'ROUND_GAP_LENGTH': 2000,
+    'firstNFree': 0, 'inviteFee': 200, 'roundCompensate': 0,
+  }
+  owner = '0x' + '11' * 20
+  other = '0x' + '22' * 20
+  state = dict(
+    now=4010, config=config, stopped=False, maxShards=1, shard=0, shardProfiles=[1, 2],
+    lastRound=(False, 0), boundAddress='0x' + '00' * 20, lensOwner=owner, native=False,
+  )
+  # a full round reverts before the Lens owner is checked
+  assert [r.code for r in check_stake(state, 2, 3, other, other)] == ['MAX_PROFILES']
+  assert [r.code for r in check_stake(dict(state, shardProfiles=[1]), 2, 3, other, other)] == ['NOT_LENS_OWNER']
+  # without a Lens Hub a profile bound to another address is refused
+  assert [r.code for r in check_stake(dict(state, shardProfiles=[1], boundAddress=owner, lensOwner=None), 2, 3, other, other)] == ['PROFILE_REGISTERED']
+  # profile 1 is a pending subscriber, listed but not staked yet
+  assert [r.code for r in check_stake(dict(state, shardProfiles=[1]), 2, 1, owner, owner)] == ['ALREADY_PARTICIPANT']
+
+def test_preflight_predicts_reverts(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+  stake2follow.profileStake(roundId, 2, accounts[2], 0, {'from': accounts[2]})
+
+  async def run():
+    client = Stake2FollowClient(HttpTransport(web3.provider.endpoint_uri), stake2follow.address, stake2follow.abi)
+    preflight = Preflight(client)
+    try:
+      assert await preflight.stake(roundId, 3, accounts[3].address, 0, accounts[3].address) == []
+      # an ERC20 pool takes no value with the call
+      assert [r.code for r in await preflight.stake(roundId, 3, accounts[3].address, 0, accounts[3].address, 1)] == ['INVALID_STAKE_VALUE']
+      reasons = await preflight.stake(roundId, 1, accounts[1].address, 0, accounts[2].address)
+      assert [r.code for r in reasons] == ['NOT_PROFILE_OWNER', 'ALREADY_PARTICIPANT']
+      assert await preflight.simulate('profileStake', (roundId, 1, accounts[1].address, 0), accounts[2].address) == reasons[:1]
+
+      reasons = await preflight.claim(roundId, 0, 1, accounts[1].address)
+      assert [r.code for r in reasons] == ['ROUND_NOT_SETTLE', 'NOT_QUALIFIED']
+      assert [r.code for r in await preflight.claim(roundId, 5, 1, accounts[1].address)] == ['ROUND_NOT_SETTLE', 'INDEX_OUT_OF_BOUND']
+      assert [r.code for r in await preflight.qualify(roundId, 0b01, accounts[1].address)] == ['ONLY_APP', 'ROUND_OPEN']
+      assert await preflight.exclude(roundId, 0b10, accounts[8].address) == []
+      return reasons
+    finally:
+      await client.close()
+
+  reasons = asyncio.run(run())
+  with brownie.reverts(reasons[0].message):
+    stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+
+  chain.sleep(config[5] + config[6])
+  chain.mine(1)
+
+  async def settled():
+    client = Stake2FollowClient(HttpTransport(web3.provider.endpoint_uri), stake2follow.address, stake2follow.abi)
+    preflight = Preflight(client)
+    try:
+      assert [r.code for r in await preflight.stake(roundId, 3, accounts[3].address, 0, accounts[3].address)] == ['ROUND_NOT_OPEN']
+      assert [r.code for r in await preflight.claim(roundId, 1, 1, accounts[1].address)] == ['PROFILE_INVALID', 'NOT_QUALIFIED']
+      return await preflight.simulate('profileClaim', (roundId, 1, 1), accounts[1].address)
+    finally:
+      await client.close()
+
+  reasons = asyncio.run(settled())
+  assert [r.code for r in reasons] == ['PROFILE_INVALID']
+  with brownie.reverts(reasons[0].message):
+    stake2follow.profileClaim(roundId, 1, 1, {'from': accounts[1]})
+
+def test_preflight_checks_native_stake_value(accounts, native_contracts):
+  stake2follow = native_contracts
+  config = config_dict(stake2follow.getConfig())
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  cost = stake_cost(config, 0)
+  staker = accounts[1].address
+
+  async def run():
+    client = Stake2FollowClient(HttpTransport(web3.provider.endpoint_uri), stake2follow.address, stake2follow.abi)
+    preflight = Preflight(client)
+    try:
+      assert [r.code for r in await preflight.stake(roundId, 1, staker, 0, staker)] == ['INVALID_STAKE_VALUE']
+      assert [r.code for r in await preflight.stake(roundId, 1, staker, 0, staker, cost + 1)] == ['INVALID_STAKE_VALUE']
+      assert await preflight.stake(roundId, 1, staker, 0, staker, cost) == []
+      assert await preflight.simulate('profileStake', (roundId, 1, staker, 0), staker, cost) == []
+      return await preflight.simulate('profileStake', (roundId, 1, staker, 0), staker)
+    finally:
+      await client.close()
+
+  reasons = asyncio.run(run())
+  assert [r.code for r in reasons] == ['INVALID_STAKE_VALUE']
+  with brownie.reverts(reasons[0].message):
+    stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+
+def test_preflight_pending_subscriber_is_participant(accounts, contracts):
+  stake2follow, currency = contracts
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  stake2follow.subscribe(1, accounts[1], 1, 0, False, {'from': accounts[1]})
+
+  async def run():
+    client = Stake2FollowClient(HttpTransport(web3.provider.endpoint_uri), stake2follow.address, stake2follow.abi)
+    preflight = Preflight(client)
+    try:
+      reasons = await preflight.stake(roundId, 1, accounts[1].address, 0, accounts[1].address)
+      assert reasons == await preflight.simulate('profileStake', (roundId, 1, accounts[1].address, 0), accounts[1].address)
+      return reasons
+    finally:
+      await client.close()
+
+  reasons = asyncio.run(run())
+  assert [r.code for r in reasons] == ['ALREADY_PARTICIPANT']
+  with brownie.reverts(reasons[0].message):
+    stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
@@ -0,0 +1,88 @@
+import brownie
+from brownie import *
+from scripts.indexer import profile_rounds
+
+def test_register_checks_lens_owner(accounts, contracts, ProfileNFT):
+  stake2follow, currency = contracts
+  lensHub = ProfileNFT.deploy({'from': accounts[0]})
+  lensHub.mint(accounts[1], 1, {'from': accounts[0]})
+  lensHub.mint(accounts[2], 2, {'from': accounts[0]})
+  stake2follow.setLensHub(lensHub.address, {'from': accounts[0]})
+
+  with brownie.reverts("Not the Lens profile owner"):
+    stake2follow.registerProfile(1, accounts[2], {'from': accounts[2]})
+  with brownie.reverts("Sender is not the profile owner"):
+    stake2follow.registerProfile(1, accounts[1], {'from': accounts[2]})
+
+  tx = stake2follow.registerProfile(1, accounts[1], {'from': accounts[1]})
+  assert tx.events['ProfileRegister'][0]['profileAddress'] == accounts[1]
+  assert stake2follow.getProfileAddress(1) == accounts[1]
+  # already bound, nothing to write
+  tx = stake2follow.registerProfile(1, accounts[1], {'from': accounts[1]})
+  assert 'ProfileRegister' not in tx.events
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  with brownie.reverts("Not the Lens profile owner"):
+    stake2follow.profileStake(roundId, 2, accounts[3], 0, {'from': accounts[3]})
+  tx = stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+  assert 'ProfileRegister' not in tx.events
+  tx = stake2follow.profileStake(roundId, 2, accounts[2], 1, {'from': accounts[2]})
+  assert tx.events['ProfileRegister'][0]['profileId'] == 2
+
+def test_register_refuses_takeover(accounts, contracts, ProfileNFT):
+  stake2follow, currency = contracts
+  stake2follow.registerProfile(1, accounts[1], {'from': accounts[1]})
+
+  # without the Lens hub a bound profile can not be taken over, by any path
+  with brownie.reverts("Profile already registered"):
+    stake2follow.registerProfile(1, accounts[2], {'from': accounts[2]})
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  with brownie.reverts("Profile already registered"):
+    stake2follow.profileStake(roundId, 1, accounts[2], 0, {'from': accounts[2]})
+  with brownie.reverts("Profile already registered"):
+    stake2follow.subscribe(1, accounts[2], 1, 0, False, {'from': accounts[2]})
+  assert stake2follow.getProfileAddress(1) == accounts[1]
+
+  # with it, only the owner of the profile NFT can rebind
+  lensHub = ProfileNFT.deploy({'from': accounts[0]})
+  lensHub.mint(accounts[1], 1, {'from': accounts[0]})
+  stake2follow.setLensHub(lensHub.address, {'from': accounts[0]})
+  with brownie.reverts("Not the Lens profile owner"):
+    stake2follow.registerProfile(1, accounts[2], {'from': accounts[2]})
+  lensHub.transferFrom(accounts[1], accounts[2], 1, {'from': accounts[1]})
+  stake2follow.registerProfile(1, accounts[2], {'from': accounts[2]})
+  assert stake2follow.getProfileAddress(1) == accounts[2]
+
+def test_profile_history_disabled(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  roundGapDur = config[7]
+
+  assert stake2follow.getProfileLastRound(1) == (False, 0)
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+  stake2follow.setProfileHistory(False, {'from': accounts[0]})
+  stake2follow.profileStake(roundId, 2, accounts[2], 0, {'from': accounts[2]})
+
+  assert stake2follow.getProfileRounds(1) == [roundId]
+  assert stake2follow.getProfileRounds(2) == []
+  assert stake2follow.getProfileLastRound(2) == (True, roundId)
+  with brownie.reverts("profile already paticipant"):
+    stake2follow.profileStake(roundId, 2, accounts[2], 0, {'from': accounts[2]})
+  # stakes without a referrer leave refId 0 untouched
+  assert stake2follow.getProfileInvites(roundId, 0) == 0
+
+  chain.sleep(roundGapDur)
+  chain.mine(1)
+  nextRoundId, nextStartTime = stake2follow.getCurrentRound()
+  stake2follow.profileStake(nextRoundId, 1, accounts[1], 0, {'from': accounts[1]})
+  stake2follow.profileStake(nextRoundId, 2, accounts[2], 0, {'from': accounts[2]})
+  assert stake2follow.getProfileRounds(1) == [roundId]
+  assert stake2follow.getProfileLastRound(1) == (True, nextRoundId)
+  assert profile_rounds(stake2follow, 2) == [roundId, nextRoundId]
@@ -0,0 +1,149 @@
+import brownie
+from brownie import *
+from scripts.relayer import NO_PERMIT, Relayer, sign_claim, sign_permit, sign_stake
+
+def funded_stakers(currency, count):
+  stakers = [accounts.add() for i in range(count)]
+  for staker in stakers:
+    currency.transfer(staker, 1e5, {'from': accounts[0]})
+  return stakers
+
+def test_relayer_stakes_and_claims_in_one_transaction(accounts, permit_contracts):
+  stake2follow, currency = permit_contracts
+  config = stake2follow.getConfig()
+  stakers = funded_stakers(currency, 3)
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  deadline = chain.time() + 3600
+
+  relayer = Relayer(stake2follow, accounts[0])
+  for i, staker in enumerate(stakers):
+    permit = sign_permit(staker, currency, stake2follow.address, 2000, deadline)
+    signature = sign_stake(staker, stake2follow, roundId, i + 1, 0, deadline)
+    relayer.add_stake(roundId, i + 1, staker, 0, deadline, signature, permit)
+
+  txs = relayer.flush()
+  assert len(txs) == 1
+  qualify, profiles = stake2follow.getRoundData(roundId)
+  assert profiles == [1, 2, 3]
+  for staker in stakers:
+    # stakers never paid gas
+    assert staker.balance() == 0
+    assert stake2follow.getNonce(staker) == 1
+
+  # a signature can not be replayed
+  replay = sign_stake(stakers[0], stake2follow, roundId, 1, 0, deadline, 0)
+  tx = stake2follow.relayStakes([(roundId, 1, stakers[0], 0, deadline, NO_PERMIT, replay)], {'from': accounts[0]})
+  assert tx.events['RelaySkip'][0]['reason'] == "Sender is not the profile owner"
+  assert 'ProfileStake' not in tx.events
+
+  chain.sleep(config[5])
+  chain.mine(1)
+  stake2follow.profileQualify(roundId, 0b011, {'from': accounts[8]})
+  chain.sleep(config[6])
+  chain.mine(1)
+
+  balances = [currency.balanceOf(staker) for staker in stakers]
+  deadline = chain.time() + 3600
+  for i in range(2):
+    relayer.add_claim(roundId, i, i + 1, deadline, sign_claim(stakers[i], stake2follow, roundId, i, i + 1, deadline))
+  tx = relayer.flush()[0]
+
+  funds = [event['fund'] for event in tx.events['ProfileClaim']]
+  assert len(funds) == 2
+  assert currency.balanceOf(stakers[0]) == balances[0] + funds[0]
+  assert currency.balanceOf(stakers[1]) == balances[1] + funds[1]
+  assert currency.balanceOf(stakers[2]) == balances[2]
+
+def test_claim_intent_signed_by_other_address_should_fail(accounts, permit_contracts):
+  stake2follow, currency = permit_contracts
+  config = stake2follow.getConfig()
+  stakers = funded_stakers(currency, 2)
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  deadline = chain.time() + 3600
+  relayer = Relayer(stake2follow, accounts[0])
+  for i, staker in enumerate(stakers):
+    permit = sign_permit(staker, currency, stake2follow.address, 2000, deadline)
+    relayer.add_stake(roundId, i + 1, staker, 0, deadline, sign_stake(staker, stake2follow, roundId, i + 1, 0, deadline), permit)
+  relayer.flush()
+
+  chain.sleep(config[5])
+  chain.mine(1)
+  stake2follow.profileQualify(roundId, 0b01, {'from': accounts[8]})
+  chain.sleep(config[6])
+  chain.mine(1)
+
+  deadline = chain.time() + 3600
+  signature = sign_claim(stakers[1], stake2follow, roundId, 0, 1, deadline)
+  tx = stake2follow.relayClaims([(roundId, 0, 1, deadline, signature)], {'from': accounts[0]})
+  assert tx.events['RelaySkip'][0]['reason'] == "Address not match profile"
+  assert 'ProfileClaim' not in tx.events
+  # the skipped intent did not use the nonce
+  assert stake2follow.getNonce(stakers[1]) == 1
+
+  # expired intent
+  signature = sign_claim(stakers[0], stake2follow, roundId, 0, 1, chain.time() - 1)
+  tx = stake2follow.relayClaims([(roundId, 0, 1, chain.time() - 1, signature)], {'from': accounts[0]})
+  assert tx.events['RelaySkip'][0]['reason'] == "Signature expired"
+
+  # only the contract runs a single intent
+  with brownie.reverts("Only relay batch"):
+    stake2follow.relayClaim((roundId, 0, 1, deadline, signature), {'from': accounts[0]})
+
+def test_stale_claim_does_not_block_the_batch(accounts, permit_contracts):
+  stake2follow, currency = permit_contracts
+  config = stake2follow.getConfig()
+  stakers = funded_stakers(currency, 3)
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  deadline = chain.time() + 3600
+  relayer = Relayer(stake2follow, accounts[0])
+  for i, staker in enumerate(stakers):
+    permit = sign_permit(staker, currency, stake2follow.address, 2000, deadline)
+    relayer.add_stake(roundId, i + 1, staker, 0, deadline, sign_stake(staker, stake2follow, roundId, i + 1, 0, deadline), permit)
+  relayer.flush()
+
+  chain.sleep(config[5])
+  chain.mine(1)
+  stake2follow.profileQualify(roundId, 0b111, {'from': accounts[8]})
+  chain.sleep(config[6])
+  chain.mine(1)
+
+  deadline = chain.time() + 3600
+  signatures = [sign_claim(stakers[i], stake2follow, roundId, i, i + 1, deadline) for i in range(3)]
+  # the second profile claims itself before the batch lands
+  accounts[0].transfer(stakers[1], '1 ether')
+  stake2follow.profileClaim(roundId, 1, 2, {'from': stakers[1]})
+
+  balances = [currency.balanceOf(staker) for staker in stakers]
+  tx = stake2follow.relayClaims([(roundId, i, i + 1, deadline, signatures[i]) for i in range(3)], {'from': accounts[0]})
+  assert len(tx.events['RelaySkip']) == 1
+  assert tx.events['RelaySkip'][0]['index'] == 1
+  assert tx.events['RelaySkip'][0]['profileId'] == 2
+  assert tx.events['RelaySkip'][0]['reason'] == "Profile already claimed"
+  assert [event['profileId'] for event in tx.events['ProfileClaim']] == [1, 3]
+  assert currency.balanceOf(stakers[0]) > balances[0]
+  assert currency.balanceOf(stakers[1]) == balances[1]
+  assert currency.balanceOf(stakers[2]) > balances[2]
+
+def test_stake_with_permit_skips_approve(accounts, permit_contracts):
+  stake2follow, currency = permit_contracts
+  staker = funded_stakers(currency, 1)[0]
+  accounts[0].transfer(staker, '1 ether')
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  permit = sign_permit(staker, currency, stake2follow.address, 1000, chain.time() + 3600)
+  stake2follow.profileStakeWithPermit(roundId, 1, staker, 0, permit, {'from': staker})
+
+  qualify, profiles = stake2follow.getRoundData(roundId)
+  assert profiles == [1]
+  assert currency.balanceOf(staker) == 1e5 - 1000
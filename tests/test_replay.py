@@ -0,0 +1,97 @@
+import brownie
+from brownie import *
+from scripts.replay import merkle_leaf, refund_list, replay, stop_time, verify, verify_proof
+
+def test_replay_liabilities_at_emergency_stop(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  stakeValue = config[0]
+  roundOpenDur = config[5]
+  roundGap = config[7]
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  stake2follow.subscribe(5, accounts[5], 2, 0, False, {'from': accounts[5]})
+  stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+  stake2follow.profileStake(roundId, 2, accounts[2], 0, {'from': accounts[2]})
+  chain.sleep(roundOpenDur)
+  chain.mine(1)
+  stake2follow.profileQualify(roundId, 0b011, {'from': accounts[8]})
+  chain.sleep(roundGap - roundOpenDur)
+  chain.mine(1)
+  claim = stake2follow.profileClaim(roundId, 1, 1, {'from': accounts[1]}).events['ProfileClaim'][0]['fund']
+
+  # next round is open when the contract is stopped
+  nextRoundId, roundStartTime = stake2follow.getCurrentRound()
+  stake2follow.profileStake(nextRoundId, 3, accounts[3], 0, {'from': accounts[3]})
+  stake2follow.circuitBreaker({'from': accounts[0]})
+  chain.sleep(roundGap)
+  chain.mine(1)
+
+  state = replay(stake2follow)
+  assert verify(stake2follow, state) == []
+  assert state.stopped
+
+  owed, fees = state.liabilities(stop_time(state))
+  subscription = stake2follow.getSubscription(5)[2]
+  assert owed == {
+    accounts[5].address: claim + stakeValue + subscription,
+    accounts[3].address: stakeValue,
+  }
+  assert fees == stakeValue / 1000 * config[2]
+  # nothing is stranded in this scenario
+  assert sum(owed.values()) + fees == currency.balanceOf(stake2follow)
+
+  refunds = refund_list(owed)
+  root = bytes.fromhex(refunds['root'][2:])
+  for address, refund in refunds['refunds'].items():
+    proof = [bytes.fromhex(node[2:]) for node in refund['proof']]
+    assert verify_proof(root, merkle_leaf(address, refund['amount']), proof)
+  assert not verify_proof(root, merkle_leaf(accounts[3].address, stakeValue + 1), [bytes.fromhex(node[2:]) for node in refunds['refunds'][accounts[3].address]['proof']])
+
+def test_replay_detects_diverging_state(accounts, contracts):
+  stake2follow, currency = contracts
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+
+  state = replay(stake2follow, step=2)
+  assert verify(stake2follow, state) == []
+  state.rounds[roundId].profiles.append(2)
+  assert verify(stake2follow, state) == [(roundId, 'profiles', [1, 2], [1])]
+
+def test_replay_follows_rebinding_before_settle(accounts, contracts, ProfileNFT):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  roundOpenDur = config[5]
+  roundGap = config[7]
+  lensHub = ProfileNFT.deploy({'from': accounts[0]})
+  lensHub.mint(accounts[1], 1, {'from': accounts[0]})
+  stake2follow.setLensHub(lensHub.address, {'from': accounts[0]})
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+  stake2follow.profileStake(roundId, 2, accounts[2], 0, {'from': accounts[2]})
+
+  # the Lens profile changes hands and is bound to the new owner before settle
+  lensHub.transferFrom(accounts[1], accounts[6], 1, {'from': accounts[1]})
+  stake2follow.registerProfile(1, accounts[6], {'from': accounts[6]})
+
+  chain.sleep(roundOpenDur)
+  chain.mine(1)
+  stake2follow.profileQualify(roundId, 0b01, {'from': accounts[8]})
+  chain.sleep(roundGap - roundOpenDur)
+  chain.mine(1)
+
+  state = replay(stake2follow)
+  assert verify(stake2follow, state) == []
+  owed, fees = state.liabilities(chain.time())
+  assert accounts[1].address not in owed
+
+  # the reward is paid to the address bound at claim time
+  tx = stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[6]})
+  assert owed == {accounts[6].address: tx.events['ProfileClaim'][0]['fund']}
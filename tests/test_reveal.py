@@ -0,0 +1,79 @@
+import brownie
+from brownie import *
+from scripts.client import _encode
+from scripts.indexer import RoundIndexer, fetch_events
+
+def commitment(roundId, qualify, illegals, salt):
+  return web3.keccak(_encode(['uint256', 'uint256', 'uint256', 'bytes32'], [roundId, qualify, illegals, salt]))
+
+def test_commit_reveal_qualify(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  roundOpenDur = config[5]
+  roundFreezeDur = config[6]
+  salt = b'\x01' * 32
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  for i in range(1, 4):
+    stake2follow.profileStake(roundId, i, accounts[i], 0, {'from': accounts[i]})
+
+  with brownie.reverts("Only App can call this function."):
+    stake2follow.commitQualify(roundId, commitment(roundId, 0b011, 0b010, salt), {'from': accounts[1]})
+  stake2follow.commitQualify(roundId, commitment(roundId, 0b011, 0b010, salt), {'from': accounts[8]})
+  with brownie.reverts("Round is open"):
+    stake2follow.revealQualify(roundId, 0b011, 0b010, salt, {'from': accounts[8]})
+
+  # the freeze window passes without the qualify, claims wait for the reveal
+  chain.sleep(roundOpenDur + roundFreezeDur)
+  chain.mine(1)
+  with brownie.reverts("Qualify not revealed"):
+    stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+  with brownie.reverts("Qualify not revealed"):
+    stake2follow.withdrawRoundFee(roundId)
+  indexer = RoundIndexer.from_contract(stake2follow)
+  indexer.apply_logs(fetch_events(stake2follow))
+  assert indexer.pending_claims(1, chain.time()) == []
+
+  with brownie.reverts("Commit not match"):
+    stake2follow.revealQualify(roundId, 0b111, 0b010, salt, {'from': accounts[8]})
+  tx = stake2follow.revealQualify(roundId, 0b011, 0b010, salt, {'from': accounts[8]})
+  assert tx.events['QualifyReveal'][0]['qualify'] == 0b011
+  qualify, profiles = stake2follow.getRoundData(roundId)
+  assert qualify & ((1 << 150) - 1) == 0b011 | (0b010 << 50)
+
+  indexer.apply_tx(tx)
+  claims = indexer.pending_claims(1, chain.time())
+  tx = stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+  assert tx.events['ProfileClaim'][0]['fund'] == claims[0][2]
+  with brownie.reverts("Profile is excluded"):
+    stake2follow.profileClaim(roundId, 1, 2, {'from': accounts[2]})
+  with brownie.reverts("No qualify commit"):
+    stake2follow.revealQualify(roundId, 0b011, 0b010, salt, {'from': accounts[8]})
+
+def test_unrevealed_commit_expires(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  stakeValue = config[0]
+  salt = b'\x02' * 32
+
+  stake2follow.setRevealLength(600, {'from': accounts[0]})
+  with brownie.reverts("Invalid reveal length"):
+    stake2follow.setRevealLength(config[7] + 1, {'from': accounts[0]})
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+  stake2follow.commitQualify(roundId, commitment(roundId, 0b1, 0, salt), {'from': accounts[8]})
+  commit, deadline = stake2follow.getQualifyCommit(roundId)
+  assert deadline == roundStartTime + config[5] + config[6] + 600
+
+  chain.sleep(config[5] + config[6] + 601)
+  chain.mine(1)
+  with brownie.reverts("Reveal is over"):
+    stake2follow.revealQualify(roundId, 0b1, 0, salt, {'from': accounts[8]})
+  # past the deadline the round settles on the bits it has
+  tx = stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+  assert tx.events['ProfileClaim'][0]['fund'] == stakeValue
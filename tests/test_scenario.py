@@ -0,0 +1,42 @@
+import brownie
+import pytest
+from brownie import *
+from scripts.scenario import Scenario, ScenarioRunner
+
+def test_plan_is_minimal(accounts):
+  scenario = Scenario().stakers(accounts[1], accounts[2]).invite(1, accounts[3]).qualify(0b001).qualify(0b100).exclude(0b010)
+  assert scenario.plan() == (
+    ('round',),
+    ('stake', 1, accounts[1].address, 0),
+    ('stake', 2, accounts[2].address, 0),
+    ('stake', 3, accounts[3].address, 1),
+    ('advance', 'freeze'),
+    ('qualify', 0b101),
+    ('exclude', 0b010),
+  )
+  # claims need the settle phase
+  assert scenario.claim(0).plan()[-2:] == (('advance', 'settle'), ('claim', 0))
+  with pytest.raises(ValueError):
+    scenario.advance('settle').advance('freeze')
+
+def test_shared_prefix_is_played_once(accounts, contracts, replay_scenarios):
+  stake2follow, currency = contracts
+  staked = Scenario().stakers(accounts[1], accounts[2], accounts[3])
+  first = replay_scenarios.play(staked.qualify(0b011).advance('settle'))
+  blockNumber = web3.eth.block_number
+
+  second = replay_scenarios.play(staked.qualify(0b110).advance('settle'))
+  # the stakes come from the snapshot, only the qualify and the sleeps are sent
+  assert second.roundId == first.roundId
+  assert second.tx('stake', 1, accounts[1].address, 0) is first.tx('stake', 1, accounts[1].address, 0)
+  assert second.tx('qualify', 0b110) is not None
+  assert web3.eth.block_number == blockNumber
+  qualify, profiles = stake2follow.getRoundData(second.roundId, {'from': accounts[8]})
+  assert qualify & 0b111 == 0b110
+  assert len(profiles) == 3
+
+  # replaying a whole plan sends nothing
+  third = replay_scenarios.play(staked.qualify(0b110).advance('settle'))
+  assert third.tx('qualify', 0b110) is second.tx('qualify', 0b110)
+  assert web3.eth.block_number == blockNumber
+  stake2follow.profileClaim(third.roundId, 1, 2, {'from': accounts[2]})
@@ -0,0 +1,78 @@
+import brownie
+from brownie import *
+from scripts.rounds import round_key
+
+def test_full_round_spills_into_shard(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  stakeValue = config[0]
+  rewardFee = config[2]
+  roundOpenDur = config[5]
+  roundFreezeDur = config[6]
+
+  stake2follow.setMaxProfiles(3, {'from': accounts[0]})
+  stake2follow.setMaxShards(2, {'from': accounts[0]})
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  shardKey = round_key(roundId, 1)
+
+  for i in range(1, 4):
+    stake2follow.profileStake(roundId, i, accounts[i], 0, {'from': accounts[i]})
+  assert stake2follow.getCurrentShard() == (roundId, 1, shardKey, roundStartTime)
+
+  tx = stake2follow.profileStake(roundId, 4, accounts[4], 0, {'from': accounts[4]})
+  assert tx.events['RoundShardOpen'][0]['shard'] == 1
+  assert tx.events['ProfileStake'][0]['roundId'] == shardKey
+  # free slots count per shard
+  assert tx.events['ProfileStake'][0]['fees'] == 0
+  stake2follow.profileStake(roundId, 5, accounts[5], 0, {'from': accounts[5]})
+  stake2follow.profileStake(roundId, 6, accounts[6], 0, {'from': accounts[6]})
+
+  with brownie.reverts("Maximum profile limit reached"):
+    stake2follow.profileStake(roundId, 7, accounts[7], 0, {'from': accounts[7]})
+  with brownie.reverts("profile already paticipant"):
+    stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+  with brownie.reverts("Invalid round"):
+    stake2follow.profileStake(shardKey, 7, accounts[7], 0, {'from': accounts[7]})
+
+  assert stake2follow.getRoundShards(roundId) == 2
+  assert stake2follow.getRoundData(roundId)[1] == [1, 2, 3]
+  assert stake2follow.getRoundShardData(roundId, 1) == (shardKey, 0, [4, 5, 6])
+  assert stake2follow.getProfileRounds(4) == [shardKey]
+
+  # each shard is qualified on its own
+  chain.sleep(roundOpenDur)
+  chain.mine(1)
+  stake2follow.profileQualify(roundId, 0b111, {'from': accounts[8]})
+  stake2follow.profileQualify(shardKey, 0b001, {'from': accounts[8]})
+
+  chain.sleep(roundFreezeDur)
+  chain.mine(1)
+  with brownie.reverts("Profile not qualify to claimed"):
+    stake2follow.profileClaim(shardKey, 1, 5, {'from': accounts[5]})
+  tx = stake2follow.profileClaim(shardKey, 0, 4, {'from': accounts[4]})
+  reward = 2 * stakeValue
+  assert tx.events['ProfileClaim'][0]['fund'] == stakeValue + reward - reward * rewardFee / 1000
+  tx = stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+  assert tx.events['ProfileClaim'][0]['fund'] == stakeValue
+
+  # the sweep covers every shard
+  tx = stake2follow.withdrawFeesUpTo(roundId)
+  assert tx.events['WithdrawFees'][0]['fee'] == reward / 1000 * rewardFee
+  with brownie.reverts("Fee already withdrawn"):
+    stake2follow.withdrawRoundFee(shardKey)
+
+def test_no_spillover_by_default(accounts, contracts):
+  stake2follow, currency = contracts
+  stake2follow.setMaxProfiles(3, {'from': accounts[0]})
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  for i in range(1, 4):
+    stake2follow.profileStake(roundId, i, accounts[i], 0, {'from': accounts[i]})
+
+  assert stake2follow.getCurrentShard()[1] == 0
+  with brownie.reverts("Maximum profile limit reached"):
+    stake2follow.profileStake(roundId, 4, accounts[4], 0, {'from': accounts[4]})
+  assert stake2follow.getRoundShards(roundId) == 1
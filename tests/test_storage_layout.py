@@ -0,0 +1,58 @@
+import brownie
+from brownie import *
+from scripts.loadgen import generate
+from scripts.storage_layout import diff_layouts
+
+TYPES = {
+  't_uint256': {'label': 'uint256', 'numberOfBytes': '32'},
+  't_address': {'label': 'address', 'numberOfBytes': '20'},
+  't_bool': {'label': 'bool', 'numberOfBytes': '1'},
+  't_struct(Subscription)1_storage': {
+    'label': 'struct Stake2Follow.Subscription',
+    'numberOfBytes': '64',
+    'members': [
+      {'label': 'profileAddress', 'type': 't_address', 'slot': '0', 'offset': 0},
+      {'label': 'balance', 'type': 't_uint256', 'slot': '1', 'offset': 0},
+    ],
+  },
+}
+
+def layout(storage, types=TYPES):
+  return {
+    'storage': [{'label': label, 'slot': str(slot), 'offset': offset, 'type': t} for label, slot, offset, t in storage],
+    'types': types,
+  }
+
+def test_diff_layouts():
+  old = layout([('owner', 0, 0, 't_address'), ('stopped', 0, 20, 't_bool'), ('stakeValue', 1, 0, 't_uint256')])
+
+  appended = layout([
+    ('owner', 0, 0, 't_address'), ('stopped', 0, 20, 't_bool'), ('stakeValue', 1, 0, 't_uint256'), ('maxShards', 2, 0, 't_uint256'),
+  ])
+  assert diff_layouts(old, appended) == ([], [])
+  errors, warnings = diff_layouts(old, layout([('owner', 0, 0, 't_address'), ('stopped', 0, 20, 't_bool'), ('stakeValue', 1, 0, 't_uint256'), ('maxShards', 0, 21, 't_bool')]))
+  assert errors == ['maxShards appended in slot 0, used by the old layout']
+
+  errors, warnings = diff_layouts(old, layout([('owner', 0, 0, 't_address'), ('stakeValue', 1, 0, 't_uint256')]))
+  assert errors == ['stopped moved from slot 0+20 to 1+0', 'stakeValue (slot 1) deleted']
+
+  errors, warnings = diff_layouts(old, layout([('owner', 0, 0, 't_address'), ('paused', 0, 20, 't_bool'), ('stakeValue', 1, 0, 't_address')]))
+  assert errors == ['stakeValue (slot 1) type changed from uint256 to address']
+  assert warnings == ['stopped (slot 0) renamed to paused']
+
+  members = TYPES['t_struct(Subscription)1_storage']['members']
+  types = dict(TYPES, **{'t_struct(Subscription)1_storage': dict(TYPES['t_struct(Subscription)1_storage'], members=members[::-1])})
+  errors, warnings = diff_layouts(layout([]), layout([], types))
+  assert errors == ['struct Stake2Follow.Subscription members changed']
+
+def test_load_generator_plays_rounds(accounts, contracts):
+  stake2follow, currency = contracts
+  played = generate(stake2follow, accounts[8], accounts[0], accounts[1:6], rounds=2, profiles=4)
+
+  assert len(played) == 2
+  for roundId, profiles in played.items():
+    qualify, roundProfiles = stake2follow.getRoundData(roundId)
+    assert list(roundProfiles) == profiles
+    # the last winner leaves its reward unclaimed
+    assert qualify & ((1 << 50) - 1) != 0
+    assert stake2follow.getProfileAddress(profiles[0]) in accounts[1:6]
@@ -0,0 +1,138 @@
+import brownie
+from brownie import *
+
+def test_subscribe_joins_round_when_first_touched(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  stakeValue = config[0]
+  stakeFee = stakeValue / 1000 * config[1]
+  roundGap = config[7]
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+
+  balanceBefore = currency.balanceOf(accounts[1])
+  stake2follow.subscribe(1, accounts[1], 2, 0, False, {'from': accounts[1]})
+  assert currency.balanceOf(accounts[1]) == balanceBefore - 2 * (stakeValue + stakeFee)
+  assert stake2follow.getSubscribers() == [1]
+
+  # not joined yet, but visible to the app
+  qualify, profiles = stake2follow.getRoundData(roundId)
+  assert profiles == [1]
+
+  tx = stake2follow.profileStake(roundId, 2, accounts[2], 0, {'from': accounts[2]})
+  assert tx.events['SubscriptionsMaterialize'][0]['profiles'] == 1
+  assert tx.events['ProfileStake'][0]['profileId'] == 1
+  assert tx.events['ProfileStake'][0]['fees'] == 0
+  qualify, profiles = stake2follow.getRoundData(roundId)
+  assert profiles == [1, 2]
+
+  # first slot is free, the fee stays in the subscription
+  profileAddress, rounds, balance, rollover = stake2follow.getSubscription(1)
+  assert rounds == 1
+  assert balance == 2 * (stakeValue + stakeFee) - stakeValue
+
+  with brownie.reverts("profile already paticipant"):
+    stake2follow.profileStake(roundId, 1, accounts[1], 0, {'from': accounts[1]})
+
+  chain.sleep(roundGap)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  tx = stake2follow.profileStake(roundId, 3, accounts[3], 0, {'from': accounts[3]})
+  qualify, profiles = stake2follow.getRoundData(roundId)
+  assert profiles == [1, 3]
+
+  # all rounds joined, the unspent fees of the free slots come back
+  assert stake2follow.getSubscribers() == []
+  assert stake2follow.getSubscription(1)[1] == 0
+  assert tx.events['SubscriptionRefund'][0]['refund'] == 2 * stakeFee
+  assert stake2follow.getSubscription(1)[2] == 0
+  assert currency.balanceOf(accounts[1]) == balanceBefore - 2 * stakeValue
+  assert stake2follow.getProfileRounds(1) == [roundId - 1, roundId]
+
+def test_subscribe_respects_max_profiles(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  roundOpenDur = config[5]
+
+  stake2follow.setMaxProfiles(3, {'from': accounts[0]})
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  for i in range(1, 5):
+    stake2follow.subscribe(i, accounts[i], 1, 0, False, {'from': accounts[i]})
+
+  chain.sleep(roundOpenDur)
+  chain.mine(1)
+
+  # the app's qualify is the first touch of the round
+  stake2follow.profileQualify(roundId, 0b111, {'from': accounts[8]})
+  qualify, profiles = stake2follow.getRoundData(roundId)
+  assert profiles == [1, 2, 3]
+  assert qualify & 0b111 == 0b111
+
+  # no room for the last subscriber, it keeps its round
+  assert stake2follow.getSubscribers() == [4]
+  assert stake2follow.getSubscription(4)[1] == 1
+
+def test_subscribers_do_not_join_future_rounds(accounts, contracts):
+  stake2follow, currency = contracts
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  stake2follow.subscribe(1, accounts[1], 2, 0, False, {'from': accounts[1]})
+
+  # a round that has not started lists no subscribers and can not be touched
+  qualify, profiles = stake2follow.getRoundData(roundId + 1)
+  assert profiles == []
+  with brownie.reverts("profiles is empty"):
+    stake2follow.profileQualify(roundId + 1, 1, {'from': accounts[8]})
+  with brownie.reverts("profiles is empty"):
+    stake2follow.profileExclude(roundId + 1, 1, {'from': accounts[8]})
+  assert stake2follow.getSubscription(1)[1] == 2
+
+  # the current round is joined first
+  stake2follow.profileStake(roundId, 2, accounts[2], 0, {'from': accounts[2]})
+  assert stake2follow.getProfileRounds(1) == [roundId]
+
+def test_subscribe_rollover_credits_claim(accounts, contracts):
+  stake2follow, currency = contracts
+  config = stake2follow.getConfig()
+  stakeValue = config[0]
+  stakeFee = stakeValue / 1000 * config[1]
+  roundOpenDur = config[5]
+  roundFreezeDur = config[6]
+
+  chain.sleep(3)
+  chain.mine(1)
+  roundId, roundStartTime = stake2follow.getCurrentRound()
+  stake2follow.subscribe(1, accounts[1], 2, 0, True, {'from': accounts[1]})
+  stake2follow.profileStake(roundId, 2, accounts[2], 0, {'from': accounts[2]})
+
+  chain.sleep(roundOpenDur)
+  chain.mine(1)
+  stake2follow.profileQualify(roundId, 0b01, {'from': accounts[8]})
+
+  chain.sleep(roundFreezeDur)
+  chain.mine(1)
+  balanceBefore = currency.balanceOf(accounts[1])
+  subscriptionBefore = stake2follow.getSubscription(1)[2]
+  tx = stake2follow.profileClaim(roundId, 0, 1, {'from': accounts[1]})
+
+  assert currency.balanceOf(accounts[1]) == balanceBefore
+  assert stake2follow.getSubscription(1)[2] == subscriptionBefore + tx.events['ProfileClaim'][0]['fund']
+
+def test_unsubscribe_refunds_balance(accounts, contracts):
+  stake2follow, currency = contracts
+
+  balanceBefore = currency.balanceOf(accounts[1])
+  stake2follow.subscribe(1, accounts[1], 3, 0, False, {'from': accounts[1]})
+
+  with brownie.reverts("Address not match profile"):
+    stake2follow.unsubscribe(1, {'from': accounts[2]})
+
+  tx = stake2follow.unsubscribe(1, {'from': accounts[1]})
+  assert currency.balanceOf(accounts[1]) == balanceBefore
+  assert stake2follow.getSubscribers() == []
+  assert stake2follow.getSubscription(1)[2] == 0